@@ -0,0 +1,211 @@
+'''
+This module holds the background monitor
+that keeps the health of every collector.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* fastapi
+'''
+
+# Import system libs
+from fastapi.concurrency import run_in_threadpool
+from datetime import datetime
+import threading
+import asyncio
+
+# Import custom libs
+from . import schemas
+from .probe import probe_collectors
+from ..env import Enviroment as Env
+from ..database import SessionManager
+from ..crud import Tcollector
+
+#######################################
+
+# --------------------
+def parse_status(col, entry):
+    ''' Join a collector with its health.\n
+    `col` (models.Collector): The collector table item.\n
+    `entry` (healthEntry): The collector health.\n
+    return `status` (schemas.collectorStatus): The collector with its status.\n
+    '''
+    status = schemas.collectorStatus(
+        **Tcollector._parse_collector(col).__dict__,
+        status=schemas.connectionStatus(**entry.status),
+        checked_at=entry.checked_at,
+        last_seen=entry.last_seen
+    )
+    return(status)
+# --------------------
+
+class healthEntry:
+    ''' Last known health of a collector.\n
+    `status` (dict): The `schemas.connectionStatus` fields.\n
+    `checked_at` (datetime): When the ports were tested.\n
+    `last_seen` (datetime): Last time any port answered, `None` if never.\n
+    '''
+    def __init__(self, status:dict, checked_at:datetime, last_seen:datetime):
+        self.status = status
+        self.checked_at = checked_at
+        self.last_seen = last_seen
+
+class HealthMonitor:
+    ''' Test the collectors every `interval` seconds in background and
+    keep their last status in memory, so the status routes do not open
+    connections at each request. A non positive `interval` disables the
+    background tests and the collectors are only tested on demand.
+    Subscribers receive the `schemas.collectorStatus` of the collectors
+    whose ports changed reachability, in queues of up to `queue_size`
+    changes.\n
+    Each `forget` starts a new generation of the collector, so a test
+    that started before it does not bring back the old health.\n
+    '''
+    def __init__(self, interval:float, queue_size:int):
+        self.interval = interval
+        self.queue_size = queue_size
+        self._cache = {}
+        self._generation = {}
+        self._lock = threading.Lock()
+        self._task = None
+        self._listeners = set()
+
+    def get(self, id:int):
+        ''' Get the cached health of a collector.\n
+        `id` (int): The Collector ID.\n
+        return `entry` (healthEntry): The health, `None` if not tested yet.\n
+        '''
+        return(self._cache.get(id))
+
+    def forget(self, id:int):
+        ''' Drop the cached health of a collector, used when it is
+        changed or removed. Can be called from any thread.\n
+        `id` (int): The Collector ID.\n
+        '''
+        with self._lock:
+            self._generation[id] = self._generation.get(id, 0)+1
+            self._cache.pop(id, None)
+
+    def generations(self):
+        ''' Get the generation of every collector, to be given to `refresh`
+        when the collectors are read before the test.\n
+        return `since` (dict): The generation of each Collector ID.\n
+        '''
+        with self._lock:
+            return(dict(self._generation))
+
+    def subscribe(self):
+        ''' Start receiving the status changes.\n
+        return `queue` (asyncio.Queue): Where the changes are put.\n
+        '''
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._listeners.add(queue)
+        return(queue)
+
+    def unsubscribe(self, queue:asyncio.Queue):
+        ''' Stop receiving the status changes.\n
+        `queue` (asyncio.Queue): The queue returned by `subscribe`.\n
+        '''
+        self._listeners.discard(queue)
+
+    @staticmethod
+    def _publish(queue:asyncio.Queue, change:schemas.collectorStatus):
+        ''' Put a change in a subscriber queue. A slow subscriber with a full
+        queue only keeps the newest status of each collector, and then only
+        the newest changes.\n
+        `queue` (asyncio.Queue): The queue returned by `subscribe`.\n
+        `change` (schemas.collectorStatus): The new status of a collector.\n
+        '''
+        if (not queue.full()):
+            queue.put_nowait(change)
+            return
+
+        pending = {}
+        while (not queue.empty()):
+            old = queue.get_nowait()
+            pending.pop(old.id, None)
+            pending[old.id] = old
+        pending.pop(change.id, None)
+        pending[change.id] = change
+
+        kept = list(pending.values())[-queue.maxsize:]
+        for item in kept:
+            queue.put_nowait(item)
+
+    async def refresh(self, col_list:list, since:dict=None):
+        ''' Test the collectors now and update the cache.\n
+        `col_list` (list): Items with the collector `id`, `ip` and ports.\n
+        `since` (dict): The `generations` from before the collectors were
+        read, taken when the test starts if not informed.\n
+        return `entries` (list): The new `healthEntry` of each collector.\n
+        '''
+        if (since is None):
+            since = self.generations()
+        stat_list = await probe_collectors(col_list)
+        now = datetime.utcnow()
+
+        entries = []
+        for col, stat in zip(col_list, stat_list):
+            with self._lock:
+                # Not current if changed or removed while it was tested
+                current = self._generation.get(col.id, 0)==since.get(col.id, 0)
+                old = self._cache.get(col.id)
+                last_seen = old.last_seen if old is not None else None
+                if any(stat.values()):
+                    last_seen = now
+                entry = healthEntry(stat, now, last_seen)
+                if current:
+                    self._cache[col.id] = entry
+            entries.append(entry)
+
+            # Only reachability changes are published
+            if (current and len(self._listeners)>0 and (old is None or old.status!=stat)):
+                change = parse_status(col, entry)
+                for queue in self._listeners:
+                    HealthMonitor._publish(queue, change)
+
+        return(entries)
+
+    @staticmethod
+    def load_collectors():
+        ''' Read the collectors from database.\n
+        return `col_list` (list): The `schemas.collector` of each one.\n
+        '''
+        with SessionManager() as db:
+            col_list = [ Tcollector._parse_collector(col) for col in Tcollector.get_all(db) ]
+        return(col_list)
+
+    async def _run(self):
+        ''' Background loop, stops when cancelled.\n
+        '''
+        while True:
+            try:
+                since = self.generations()
+                col_list = await run_in_threadpool(HealthMonitor.load_collectors)
+                await self.refresh(col_list, since)
+                # Forget the collectors that were removed
+                ids = set([ col.id for col in col_list ])
+                for id in list(self._cache.keys()):
+                    if (id not in ids):
+                        self.forget(id)
+            except Exception as exc:
+                print(f"Health monitor error: {exc}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        ''' Start the background tests, call it from the running event loop.\n
+        '''
+        if (self.interval>0 and self._task is None):
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        ''' Stop the background tests.\n
+        '''
+        if (self._task is not None):
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+HEALTH_MONITOR = HealthMonitor(float(Env.MONITOR_INTERVAL), int(Env.MONITOR_QUEUE))
+'''`HEALTH_MONITOR` (HealthMonitor): The monitor shared by the whole application.'''
@@ -0,0 +1,74 @@
+'''
+This module holds the reachability tests
+of the collector ports.\n
+Copyright (c) 2017 Aimirim STI.\n
+'''
+
+# Import system libs
+import asyncio
+
+# Import custom libs
+from ..env import Enviroment as Env
+
+#######################################
+
+STATUS_PORTS = {
+    'ssh': 'ssh_port',
+    'opcua': 'opcua_port',
+    'health': 'health_port',
+}
+'''`STATUS_PORTS` (dict): The `schemas.connectionStatus` fields and the
+collector port tested for each of them.'''
+
+# --------------------
+async def _probe_port(ip:str, port:int, timeout:float):
+    ''' Test the connection to an IP/Port pair.\n
+    `ip` (str): The IP address\n
+    `port` (port): The port number\n
+    `timeout` (float): Seconds to wait for the connection.\n
+    return `acessible` (bool): A flag to indicate that the IP/Port pair exist.\n
+    '''
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        writer.close()
+        accessible = True
+    except Exception:
+        accessible = False
+
+    return(accessible)
+# --------------------
+
+# --------------------
+async def probe_collectors(col_list:list, timeout:float=None):
+    ''' Test every port of every collector at the same time. The whole
+    test takes at most `timeout` seconds, ports that did not answer by
+    then are reported as not accessible.\n
+    `col_list` (list): The `models.Collector` items to test.\n
+    `timeout` (float): Seconds to wait. Default `Env.PROBE_TIMEOUT`.\n
+    return `stat_list` (list): A dict with the `schemas.connectionStatus`
+    fields for each collector, in the same order of `col_list`.\n
+    '''
+    if (timeout is None):
+        timeout = float(Env.PROBE_TIMEOUT)
+
+    tasks = []
+    for col in col_list:
+        for field, port in STATUS_PORTS.items():
+            tasks.append( asyncio.ensure_future(_probe_port(col.ip, getattr(col,port), timeout)) )
+
+    if (len(tasks)>0):
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+    stat_list = []
+    results = iter(tasks)
+    for col in col_list:
+        stat = {}
+        for field in STATUS_PORTS.keys():
+            task = next(results)
+            stat[field] = task.done() and not task.cancelled() and task.result()
+        stat_list.append(stat)
+
+    return(stat_list)
+# --------------------
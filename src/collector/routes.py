@@ -8,17 +8,23 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from fastapi import Depends, HTTPException
+from fastapi import Depends, Header, HTTPException, WebSocket, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from paramiko import SSHClient, AutoAddPolicy
-import socket
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Union
+import asyncio
 
 # Import custom libs
 from . import schemas
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..crud import Tcollector
+from ..defaults_cache import DEFAULTS_CACHE
 from ..user_auth import routes as usr_routes
 from ..fboot_gen import routes as fb_routes
+from ..ssh_pool import SSH_POOL, collector_session, evict_collector
+from ..write_queue import run_write
+from .monitor import HEALTH_MONITOR, HealthMonitor, parse_status
 
 #######################################
 
@@ -28,24 +34,24 @@ from ..fboot_gen import routes as fb_routes
 #       user shoud pass, but it is handled internaly by FastAPI.
 
 # --------------------
-def get_collector_defaults(usr:str=Depends(usr_routes._check_valid_token)):
+async def get_collector_defaults(if_none_match:Union[str,None]=Header(default=None), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get the default values for a collector.\n
-    return `info` (JSONResponse): The `schemas.collectorCreate` automatically parsed into
-    a HTTP_OK response.\n
+    return `template` (Response): The `schemas.collectorInfo` already serialized,
+    or HTTP_304 if it matches `If-None-Match`.\n
     '''
-    template = Tcollector.get_defaults()
+    template = DEFAULTS_CACHE.response('collector', if_none_match)
 
     return(template)
 # --------------------
 
 # --------------------
-def get_collector(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def get_collector(id:int, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get the collector entry in database.\n
     `id` (int): The Collector ID.\n
     return `parsed_col` (JSONResponse): The saved `schemas.collector` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_col = Tcollector.get_by_id(db,id)
+    val_col = await Tcollector.aio.get_by_id(db,id)
     
     if (val_col is None):
         m_name = f"Collector data"
@@ -65,18 +71,26 @@ def update_collector(id:int,collector:schemas.collectorCreate, db:Session=Depend
     a HTTP_OK response.\n
     '''
     old_col =  Tcollector.get_by_id(db,id)
-    parsed_old = Tcollector._parse_collector(old_col)
+    if (old_col is None):
+        m_name = f"Collector data"
+        raise HTTPException(status_code=404, detail=f"Error updating {m_name}.")
 
-    val_col = Tcollector.update(db,id,collector)
-    parsed_col = Tcollector._parse_collector(val_col)
+    parsed_old = Tcollector._parse_collector(old_col)
+    old_access = (old_col.ip, old_col.ssh_port, old_col.ssh_user, old_col.ssh_pass)
 
-    if (val_col is None or old_col is None):
+    val_col = run_write(db, Tcollector.update, id, collector)
+    if (val_col is None):
         m_name = f"Collector data"
         raise HTTPException(status_code=404, detail=f"Error updating {m_name}.")
 
-    prom_conf = fb_routes._update_prometheus_conf(parsed_old,val_col)
+    parsed_col = Tcollector._parse_collector(val_col)
+    # The address or ports may have changed
+    HEALTH_MONITOR.forget(id)
+    if ((val_col.ip, val_col.ssh_port, val_col.ssh_user, val_col.ssh_pass)!=old_access):
+        SSH_POOL.evict(*old_access)
+
     try:
-        fb_routes._write_prometheus_file(val_col,prom_conf)
+        fb_routes._sync_prometheus_file(val_col, parsed_old)
     except:
         raise HTTPException(status_code=404, detail=f"Error updating Collector from Prometheus file.")
 
@@ -90,16 +104,15 @@ def new_collector(collector:schemas.collectorCreate, db:Session=Depends(get_db),
     return `parsed_col` (JSONResponse): Updated data of `schemas.collector` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_col = Tcollector.create(db,collector)
+    val_col = run_write(db, Tcollector.create, collector)
 
     if (val_col is None):
         m_name = f"Collector data"
         raise HTTPException(status_code=404, detail=f"Error Creating {m_name}.")
 
     parsed_col = Tcollector._parse_collector(val_col)
-    prom_conf = fb_routes._update_prometheus_conf(parsed_col,val_col)
     try:
-        fb_routes._write_prometheus_file(val_col,prom_conf)
+        fb_routes._sync_prometheus_file(val_col, parsed_col)
     except:
         raise HTTPException(status_code=404, detail=f"Error updating Collector from Prometheus file.")
 
@@ -107,12 +120,12 @@ def new_collector(collector:schemas.collectorCreate, db:Session=Depends(get_db),
 # --------------------
 
 # --------------------
-def get_all_collectors(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def get_all_collectors(db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all collector entries in database.\n
     return `parsed_col` (JSONResponse): The saved `schemas.collector` automatically parsed into
     a HTTP_OK response.\n
     '''
-    col_list = Tcollector.get_all(db)
+    col_list = await Tcollector.aio.get_all(db)
     
     if (col_list is None):
         m_name = f"Collectors"
@@ -137,119 +150,172 @@ def check_collector_access(id:int, db:Session=Depends(get_db), usr:str=Depends(u
         m_name = f"Collector"
         raise HTTPException(status_code=404, detail=f"Error searching for {m_name}.")
 
-    ssh = SSHClient()
-    ssh.set_missing_host_key_policy(AutoAddPolicy())
-    
+    # A pooled session may predate a password change on the collector,
+    # so the access is checked on a new connection
+    evict_collector(col)
     try:
-        ssh.connect(col.ip, username=col.ssh_user, password=col.ssh_pass, port=col.ssh_port, timeout=2)
-        col = Tcollector.validate(db,id,valid=True)
+        with collector_session(col):
+            pass
+        col = run_write(db, Tcollector.validate, id, valid=True)
     except Exception as ex:
-        col = Tcollector.validate(db,id,valid=False)
-        print(str(ex))
-    
-    ssh.close()
+        col = run_write(db, Tcollector.validate, id, valid=False)
+        print(f"Collector {id} access check failed: {ex}")
 
     parsed_col = Tcollector._parse_collector(col)
     return(parsed_col)
 # --------------------
 
 # --------------------
-def _test_ip_port(ip:str,port:int):
-    ''' Test the connection to an IP/Port pair.\n
-    `ip` (str): The IP address\n
-    `port` (port): The port number\n
-    return `acessible` (bool): A flag to indicate that the IP/Port pair exist.\n
-    '''
-    accessible = False
-    try:
-        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        test_socket.settimeout(0.2)
-        test_socket.connect((ip, port))
-        test_socket.close()
-        accessible = True
-    except Exception as ex:
-        print(str(ex))
-        accessible = False
-    
-    return(accessible)
-# --------------------
-
-# --------------------
-def check_collector_status(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
-    ''' Get overall connection status of the collector.\n
+async def check_collector_status(id:int, refresh:bool=False, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get overall connection status of the collector, as seen by the
+    last background test.\n
     `id` (int): The Collector ID.\n
+    `refresh` (bool): Test the collector now instead. Default `False`.\n
     return `status` (JSONResponse): The saved `schemas.collectorStatus` automatically parsed into
     a HTTP_OK response.\n
     '''
-    col = Tcollector.get_by_id(db,id)
+    col = await Tcollector.aio.get_by_id(db,id)
     if (col is None):
         m_name = f"Collector"
         raise HTTPException(status_code=404, detail=f"Error searching for {m_name}.")
 
-    stat = {
-        'ssh': _test_ip_port(col.ip,col.ssh_port),
-        'opcua': _test_ip_port(col.ip,col.opcua_port),
-        'health': _test_ip_port(col.ip,col.health_port),
-    }
+    entry = HEALTH_MONITOR.get(id)
+    if (refresh or entry is None):
+        entry = (await HEALTH_MONITOR.refresh([col]))[0]
 
-    status = schemas.collectorStatus(
-        **Tcollector._parse_collector(col).__dict__,
-        status=schemas.connectionStatus(**stat)
-    )
+    status = parse_status(col, entry)
     return(status)
 # --------------------
 
 # --------------------
-def check_collectors_status(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
-    ''' Get overall connection status of the collector.\n
-    `id` (int): The Collector ID.\n
+async def check_collectors_status(refresh:bool=False, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get overall connection status of all collectors, as seen by the
+    last background test.\n
+    `refresh` (bool): Test every collector now instead. Default `False`.\n
     return `status` (JSONResponse): The saved `schemas.collectorStatus` automatically parsed into
     a HTTP_OK response.\n
     '''
-    col_list = Tcollector.get_all(db)
+    col_list = await Tcollector.aio.get_all(db)
     if (col_list is None):
         m_name = f"Collectors"
         raise HTTPException(status_code=404, detail=f"Error searching for {m_name}.")
 
+    # Collectors without cached health are tested together
+    missing = [ col for col in col_list if refresh or HEALTH_MONITOR.get(col.id) is None ]
+    if (len(missing)>0):
+        await HEALTH_MONITOR.refresh(missing)
+
     status = []
     for col in col_list:
-        stat = {
-            'ssh': _test_ip_port(col.ip,col.ssh_port),
-            'opcua': _test_ip_port(col.ip,col.opcua_port),
-            'health': _test_ip_port(col.ip,col.health_port),
-        }
-
-        status.append( 
-            schemas.collectorStatus(
-                **Tcollector._parse_collector(col).__dict__,
-                status=schemas.connectionStatus(**stat)
-            )
-        )
+        status.append( parse_status(col, HEALTH_MONITOR.get(col.id)) )
     
     return(status)
 # --------------------
 
 # --------------------
-def del_collector(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
-    ''' Delete the specified entry from database.\n
+async def watch_collectors_status(websocket:WebSocket, token:str):
+    ''' WebSocket that sends the `schemas.collectorStatus` of every collector
+    when it opens, and then of each collector whose ports changed
+    reachability.\n
+    `token` (str): The access token, browsers can not send it as a header.\n
+    '''
+    try:
+        await usr_routes._get_principal(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    queue = HEALTH_MONITOR.subscribe()
+    receiver = None
+    sender = None
+    try:
+        # Start with the current status of every collector
+        col_list = await run_in_threadpool(HealthMonitor.load_collectors)
+        missing = [ col for col in col_list if HEALTH_MONITOR.get(col.id) is None ]
+        if (len(missing)>0):
+            await HEALTH_MONITOR.refresh(missing)
+        # The changes until now are already in the snapshot
+        while (not queue.empty()):
+            queue.get_nowait()
+        for col in col_list:
+            entry = HEALTH_MONITOR.get(col.id)
+            if (entry is not None):
+                await websocket.send_text( parse_status(col, entry).json() )
+
+        # Send the changes until the client leaves
+        receiver = asyncio.ensure_future(websocket.receive())
+        sender = asyncio.ensure_future(queue.get())
+        while True:
+            done, _ = await asyncio.wait([receiver, sender], return_when=asyncio.FIRST_COMPLETED)
+            if (sender in done):
+                await websocket.send_text( sender.result().json() )
+                sender = asyncio.ensure_future(queue.get())
+            if (receiver in done):
+                if (receiver.result()['type']=='websocket.disconnect'):
+                    break
+                # Client messages are ignored
+                receiver = asyncio.ensure_future(websocket.receive())
+    except Exception as exc:
+        print(f"Status WebSocket closed: {exc}")
+    finally:
+        HEALTH_MONITOR.unsubscribe(queue)
+        for task in [receiver, sender]:
+            if (task is not None and not task.done()):
+                task.cancel()
+# --------------------
+
+# --------------------
+def _remove_collector(db:Session, id:int):
+    ''' Delete the collector with its datasources and remove it from the
+    Prometheus file.\n
+    `db` (Session): Database access session.\n
     `id` (int): The Collector ID.\n
-    return `val_dp` (JSONResponse): A `schemas.dataPoint` automatically parsed into
-    a HTTP_OK response.\n
+    return `tree` (schemas.collectorRemoved): The rows deleted from each table.\n
     '''
     col = Tcollector.get_by_id(db,id)
     if (col is None):
         m_name = f"Collector"
         raise HTTPException(status_code=404, detail=f"Error on {m_name} deletion.")
 
-    ans = Tcollector.delete_collector(db,id)
+    tree = run_write(db, Tcollector.delete_collector_tree, id)
+    HEALTH_MONITOR.forget(id)
 
-    if (ans[id]):
-        parsed_col = Tcollector._parse_collector(col)
-        prom_conf = fb_routes._delete_prometheus_conf(col)
+    if (tree.removed.collector>0):
         try:
-            fb_routes._write_prometheus_file(col,prom_conf)
+            fb_routes._sync_prometheus_file(col, remove=True)
         except:
             raise HTTPException(status_code=404, detail=f"Error removing Collector from Prometheus file.")
+        finally:
+            # Also the session opened to write the file
+            evict_collector(col)
+
+    return(tree)
+# --------------------
+
+# --------------------
+def del_collector(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Delete the specified entry from database, with its datasources and
+    datapoints.\n
+    `id` (int): The Collector ID.\n
+    return `ans` (JSONResponse): A dictionary with the id removed and the status,
+    automatically parsed into a HTTP_OK response.\n
+    '''
+    tree = _remove_collector(db,id)
+    ans = { id: tree.removed.collector>0 }
 
     return(ans)
+# --------------------
+
+# --------------------
+def del_collector_tree(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Delete the specified entry from database, like `del_collector`, and
+    report the rows removed.\n
+    `id` (int): The Collector ID.\n
+    return `tree` (JSONResponse): A `schemas.collectorRemoved` with the number of
+    rows deleted from each table, automatically parsed into a HTTP_OK response.\n
+    '''
+    tree = _remove_collector(db,id)
+
+    return(tree)
 # --------------------
\ No newline at end of file
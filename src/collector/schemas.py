@@ -8,6 +8,8 @@ Copyright (c) 2017 Aimirim STI.\n
 
 # Import system libs
 from pydantic import BaseModel
+from typing import Union
+from datetime import datetime
 
 #######################################
 
@@ -35,4 +37,16 @@ class connectionStatus(BaseModel):
     health: bool
 
 class collectorStatus(collector):
-    status: connectionStatus
\ No newline at end of file
+    status: connectionStatus
+    checked_at: Union[datetime,None] = None
+    last_seen: Union[datetime,None] = None
+
+class collectorRows(BaseModel):
+    collector: int
+    datasources: int
+    protocols: int
+    datapoints: int
+
+class collectorRemoved(BaseModel):
+    id: int
+    removed: collectorRows
\ No newline at end of file
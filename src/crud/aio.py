@@ -0,0 +1,48 @@
+'''
+This module holds the async access
+to the table operations\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Import custom libs
+from ..write_queue import WRITE_QUEUE
+
+#######################################
+
+class AsyncTable:
+    ''' Async variants of the static methods of a table class. Declare it
+    in the class body as `aio = AsyncTable()` and call the methods with an
+    `AsyncSession` in place of the `Session`, e.g.
+    `await Tdatapoint.aio.get_datapoint_by_name(db, name)`.\n
+    The methods run as they are inside `AsyncSession.run_sync`, so the
+    database access does not block the event loop. The ones listed in
+    `writes` go through the single writer instead when it is in use, the
+    session passed to them is then not used.\n
+    '''
+    def __init__(self, writes:list=None):
+        self._writes = set(writes) if writes is not None else set()
+
+    def __set_name__(self, owner, name):
+        self._table = owner
+
+    def __get__(self, obj, owner):
+        return(self)
+
+    def __getattr__(self, name):
+        method = getattr(self._table, name)
+
+        if (WRITE_QUEUE is not None and name in self._writes):
+            async def call(db:AsyncSession, *args, **kwargs):
+                return(await WRITE_QUEUE.run(method, *args, **kwargs))
+        else:
+            async def call(db:AsyncSession, *args, **kwargs):
+                return(await db.run_sync(method, *args, **kwargs))
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return(call)
@@ -0,0 +1,70 @@
+'''
+This module holds the helpers for
+operations over batches of table items\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+from sqlalchemy.orm import Session
+
+#######################################
+
+BATCH_SIZE = 500
+'''`BATCH_SIZE` (int): Maximum number of keys sent in a single `IN` clause.
+Keeps the statements below the bound parameters limit of SQLite.'''
+
+# --------------------
+def chunks(items:list, size:int=BATCH_SIZE):
+    ''' Split a list in consecutive pieces.\n
+    `items` (list): Items to split.\n
+    `size` (int): Maximum length of each piece.\n
+    return (generator): Yields each piece of `items`.\n
+    '''
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+# --------------------
+
+# --------------------
+def find_existing(db:Session, key_col, keys):
+    ''' Search which keys already exist in a table.\n
+    `db` (Session): Database access session.\n
+    `key_col` (Column): Table column to search.\n
+    `keys` (iterable): Values to search for.\n
+    return `found` (set): The values of `keys` present in the table.\n
+    '''
+    found = set()
+    for piece in chunks(list(set(keys))):
+        for (key,) in db.query(key_col).filter(key_col.in_(piece)):
+            found.add(key)
+
+    return(found)
+# --------------------
+
+# --------------------
+def update_selected(db:Session, model, key_col, keys, conditions:list, values:dict):
+    ''' Update the selected items of a table with set based statements,
+    one for every `BATCH_SIZE` keys. Nothing is commited.\n
+    `db` (Session): Database access session.\n
+    `model` (Base): Table model to update.\n
+    `key_col` (Column): Key column of `model`.\n
+    `keys` (iterable): Values of `key_col` to update, `None` for all items
+    matching `conditions`.\n
+    `conditions` (list): Extra filters of the selection.\n
+    `values` (dict): The new values of the columns.\n
+    return `found` (set): The keys of the updated items.\n
+    '''
+    if (keys is None):
+        pieces = [ conditions ]
+    else:
+        pieces = [ [key_col.in_(piece)]+conditions for piece in chunks(list(set(keys))) ]
+
+    found = set()
+    for filters in pieces:
+        for (key,) in db.query(key_col).filter(*filters):
+            found.add(key)
+        db.query(model).filter(*filters).update(values, synchronize_session=False)
+
+    return(found)
+# --------------------
@@ -7,13 +7,14 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
+from datetime import datetime
 from sqlalchemy.orm import Session
 
 # Import custom libs
+from .aio import AsyncTable
 from ..env import Enviroment as Env
 from .. import models
 from ..collector import schemas
-from .datasource import Tdatasource
 
 
 #######################################
@@ -21,15 +22,21 @@ from .datasource import Tdatasource
 class Tcollector:
     ''' Class with CRUD methods to access the Collector table.\n
     '''
+    aio = AsyncTable(writes=['create', 'update', 'validate', 'set_export_digest', 'delete_collector',
+        'delete_collector_tree'])
+    '''`aio` (AsyncTable): The same methods for an `AsyncSession`.'''
+
 
     # --------------------
     @staticmethod
-    def get_defaults():
+    def get_defaults(all_defaults:dict=None):
         ''' Parse the Collector default values.\n
+        `all_defaults` (dict): The defaults to parse, `Env.DEFAULTS` if not informed.\n
         return `col` (schemas.collectorCreate): Default collector information.\n
         '''
-        
-        default = Env.DEFAULTS['Collector']
+        if (all_defaults is None):
+            all_defaults = Env.DEFAULTS
+        default = all_defaults['Collector']
 
         col = schemas.collectorCreate(
             ip=default['ip'],
@@ -175,26 +182,90 @@ class Tcollector:
 
     # --------------------
     @staticmethod
-    def delete_collector(db:Session, id:int):
-        ''' Delete a collector.\n
+    def get_export_digest(db:Session, id:int):
+        ''' Get the content digest of the last successful export.\n
+        `db` (Session): Database session instance.\n
+        `id` (int): Collector id to search for.\n
+        return `digest` (str): The saved digest, `None` if never exported.\n
+        '''
+        qry = db.query(models.ExportState.digest)
+        row = qry.filter(models.ExportState.collector_id == id).first()
+        digest = row.digest if row is not None else None
+
+        return(digest)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def set_export_digest(db:Session, id:int, digest:str):
+        ''' Save the content digest of a successful export.\n
+        `db` (Session): Database session instance.\n
+        `id` (int): Collector id exported.\n
+        `digest` (str): Digest of the exported content.\n
+        return `state` (models.ExportState): The saved export state.\n
+        '''
+        state = db.get(models.ExportState, id)
+        if (state is None):
+            state = models.ExportState(collector_id=id)
+            db.add(state)
+        state.digest = digest
+        state.exported_at = datetime.utcnow()
+
+        db.commit()
+
+        return(state)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def delete_collector_tree(db:Session, id:int):
+        ''' Delete a collector with its datasources, protocols and datapoints
+        in a few bulk statements and a single transaction.\n
         `db` (Session): Database access session.\n
         `id` (int): Collector id to search for.\n
-        return `col_answer` (dict): Dictionary containing the id removed and the status.\n
+        return `col_answer` (schemas.collectorRemoved): The id and the number of
+        rows deleted from each table, all `0` if the collector was not found.\n
         '''
-        col_answer = {}
-        
-        col = Tcollector.get_by_id(db,id)
-
-        if (col is not None):
-            for ds in col.datasources:
-                Tdatasource.delete_datasource(db,ds.name)
-            # Remove from database
-            db.delete(col)
+        removed = {'collector':0, 'datasources':0, 'protocols':0, 'datapoints':0}
+
+        # Declare the subtree
+        ds_names = db.query(models.DataSource.name).filter(models.DataSource.collector_id == id)
+
+        # Children first, the database may not enforce the foreign keys
+        qry = db.query(models.DataPoint).filter(models.DataPoint.datasource_name.in_(ds_names))
+        removed['datapoints'] = qry.delete(synchronize_session=False)
+        qry = db.query(models.Protocol).filter(models.Protocol.datasource_name.in_(ds_names))
+        removed['protocols'] = qry.delete(synchronize_session=False)
+        qry = db.query(models.DataSource).filter(models.DataSource.collector_id == id)
+        removed['datasources'] = qry.delete(synchronize_session=False)
+        qry = db.query(models.ExportState).filter(models.ExportState.collector_id == id)
+        qry.delete(synchronize_session=False)
+        qry = db.query(models.Collector).filter(models.Collector.id == id)
+        removed['collector'] = qry.delete(synchronize_session=False)
+
+        if (removed['collector']>0):
+            # Loaded objects keep their values but leave the session
+            db.expunge_all()
             db.commit()
-            
-            col_answer[id] = True
         else:
-            col_answer[id] = False
+            db.rollback()
+            removed = dict.fromkeys(removed.keys(), 0)
+
+        col_answer = schemas.collectorRemoved(id=id, removed=schemas.collectorRows(**removed))
+
+        return(col_answer)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def delete_collector(db:Session, id:int):
+        ''' Delete a collector with its datasources, see `delete_collector_tree`.\n
+        `db` (Session): Database access session.\n
+        `id` (int): Collector id to search for.\n
+        return `col_answer` (dict): Dictionary containing the id removed and the status.\n
+        '''
+        tree = Tcollector.delete_collector_tree(db,id)
+        col_answer = { id: tree.removed.collector>0 }
 
         return(col_answer)
     # --------------------
\ No newline at end of file
@@ -7,13 +7,19 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from sqlalchemy.orm import Session
+from typing import List
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, joinedload, with_polymorphic
 
 # Import custom libs
+from .aio import AsyncTable
 from .. import models
 from ..env import Enviroment as Env
 from ..plc_datapoint import schemas
 from ..plc_datasource import schemas as ds_schemas
+from .paging import keyset_page
+from .batch import chunks, find_existing, update_selected
 
 
 #######################################
@@ -21,19 +27,28 @@ from ..plc_datasource import schemas as ds_schemas
 class Tdatapoint:
     ''' Class with CRUD methods to access the DataPoint table.\n
     '''
+    aio = AsyncTable(writes=['create_datapoint', 'create_datapoints', 'update_datapoint', 'update_datapoints',
+        'confirm_datapoint', 'confirm_datapoints', 'activate_datapoint', 'activate_datapoints',
+        'delete_datapoint'])
+    '''`aio` (AsyncTable): The same methods for an `AsyncSession`.'''
+
     
     # --------------------
     @staticmethod
-    def get_datapoint_placeholder(prot_name:str):
+    def get_datapoint_placeholder(prot_name:str, all_defaults:dict=None):
         ''' Search in DEFAULTS for the placeholders of a specific protocol.\n
         `prot_name` (str): Name of the Protocol to search.\n
+        `all_defaults` (dict): The defaults to search, `Env.DEFAULTS` if not informed.\n
         return (schemas.dataPointInfo): The information to pré-fill the fields.\n
         '''
         info = None
+        if (all_defaults is None):
+            all_defaults = Env.DEFAULTS
 
         # Check for asked protocol in defaults
-        if prot_name in Env.DEFAULTS['Data'].keys():
-            this_access = Env.DEFAULTS['Data'][prot_name]
+        defaults = all_defaults['Data']
+        if prot_name in defaults.keys():
+            this_access = defaults[prot_name]
 
             # Parse protocol specific information
             a_info = {}
@@ -91,6 +106,46 @@ class Tdatapoint:
         return(dp)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def _query_datapoints(db:Session):
+        ''' Declare a listing query that loads every protocol specific
+        column and the parent datasource in one statement, so the parsed
+        items need no extra round trip.\n
+        `db` (Session): Database access session.\n
+        return `dbq` (Query): Query over the polymorphic datapoint table.\n
+        '''
+        dp_poly = with_polymorphic(models.DataPoint, '*')
+        dbq = db.query(dp_poly).options(joinedload(dp_poly.datasource))
+
+        return(dbq)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _parse_datapoints(dbq):
+        ''' Parse all items of a datapoint listing query.\n
+        `dbq` (Query): Query declared by `_query_datapoints`.\n
+        return `dp_answer` (list): List of `schemas.dataPoint`.\n
+        '''
+        dp_answer = [ Tdatapoint._parse_datapoint(dp) for dp in dbq.all() ]
+
+        return(dp_answer)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _access_columns(data_cls):
+        ''' List the protocol specific columns of a datapoint implementation.\n
+        `data_cls` (models.DataPoint): One of `models.IMPLEMENTED_DATA` classes.\n
+        return `cols` (set): Names of the columns not in `models.DataPoint`.\n
+        '''
+        base = { c.key for c in models.DataPoint.__mapper__.column_attrs }
+        cols = { c.key for c in data_cls.__mapper__.column_attrs } - base
+
+        return(cols)
+    # --------------------
+
     # --------------------
     @staticmethod
     def _parse_datapoint(db_dp:models.DataPoint):
@@ -159,6 +214,66 @@ class Tdatapoint:
         return(dp_created)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def create_datapoints(db: Session, new_dps: List[schemas.dataPointInfo]):
+        ''' Create a batch of datapoints in a single transaction. The
+        datasources are resolved once for the whole batch, invalid
+        items are reported without stopping the others and the rows are
+        inserted with one `executemany` per protocol.\n
+        `db` (Session): Database access session.\n
+        `new_dps` (list): List of `schemas.dataPointInfo` to create.\n
+        return `dp_answer` (ds_schemas.bulkResult): Created names and the
+        error message of each rejected item.\n
+        '''
+        dp_answer = ds_schemas.bulkResult(created={}, errors={})
+
+        # Resolve all keys at once
+        names = [ dp.name for dp in new_dps ]
+        dp_found = find_existing(db, models.DataPoint.name, names)
+        ds_found = find_existing(db, models.DataSource.name, [ dp.datasource_name for dp in new_dps ])
+
+        rows = { prot:[] for prot in models.IMPLEMENTED_DATA.keys() }
+        for new_dp in new_dps:
+            if new_dp.name in dp_found or new_dp.name in dp_answer.created.keys():
+                dp_answer.errors[new_dp.name] = 'DataPoint already exists.'
+            elif new_dp.access.name not in models.IMPLEMENTED_DATA.keys():
+                dp_answer.errors[new_dp.name] = f"Protocol '{new_dp.access.name}' not implemented."
+            elif new_dp.datasource_name not in ds_found:
+                dp_answer.errors[new_dp.name] = f"DataSource '{new_dp.datasource_name}' not found."
+            else:
+                prot = new_dp.access.name
+                cols = Tdatapoint._access_columns(models.IMPLEMENTED_DATA[prot])
+                invalid = set(new_dp.access.data.keys()) - cols
+                if (len(invalid)>0):
+                    dp_answer.errors[new_dp.name] = f"Invalid access parameters {sorted(invalid)} for Protocol '{prot}'."
+                    continue
+                # Mount the table row, every row of a protocol with the same columns
+                row = { col:new_dp.access.data.get(col) for col in cols }
+                row.update( name=new_dp.name,
+                    description=new_dp.description,
+                    num_type=new_dp.num_type,
+                    datasource_name=new_dp.datasource_name,
+                    access=prot, active=True, pending=True )
+                rows[prot].append(row)
+                dp_answer.created[new_dp.name] = True
+
+        # Insert in database
+        try:
+            for prot_rows in rows.values():
+                if (len(prot_rows)>0):
+                    db.execute(insert(models.DataPoint.__table__), prot_rows)
+            db.commit()
+        except SQLAlchemyError as exc:
+            db.rollback()
+            msg = str(exc).split('\n')[0]
+            for name in dp_answer.created.keys():
+                dp_answer.errors[name] = msg
+            dp_answer.created = {}
+
+        return(dp_answer)
+    # --------------------
+
     # --------------------
     def update_datapoint(db: Session, dp_update: schemas.dataPointInfo):
         ''' Search for a datapoints and update it's informations.\n
@@ -198,6 +313,87 @@ class Tdatapoint:
         return (dp_answer)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def update_datapoints(db: Session, dp_updates: List[schemas.dataPointInfo]):
+        ''' Update a batch of datapoints in a single transaction, like
+        `update_datapoint` does for each one. The items are loaded once for
+        the whole batch, invalid items are reported without stopping the
+        others and the rows are written with one `executemany` per protocol.\n
+        `db` (Session): Database access session.\n
+        `dp_updates` (list): List of `schemas.dataPointInfo` to update.\n
+        return `dp_answer` (ds_schemas.bulkUpdateResult): Updated names and the
+        error message of each rejected item.\n
+        '''
+        dp_answer = ds_schemas.bulkUpdateResult(updated={}, errors={})
+
+        # Load all items at once, with their protocol columns
+        dp_poly = with_polymorphic(models.DataPoint, '*')
+        dp_found = {}
+        for piece in chunks(list(set([ dp.name for dp in dp_updates ]))):
+            for dp in db.query(dp_poly).filter(models.DataPoint.name.in_(piece)):
+                dp_found[dp.name] = dp
+
+        rows = { prot:[] for prot in models.IMPLEMENTED_DATA.keys() }
+        for dp_update in dp_updates:
+            dp = dp_found.get(dp_update.name)
+            prot = dp_update.access.name
+            if dp_update.name in dp_answer.updated.keys():
+                dp_answer.errors[dp_update.name] = 'DataPoint repeated in the batch.'
+            elif dp is None:
+                dp_answer.errors[dp_update.name] = 'DataPoint not found.'
+            elif prot!=dp.access:
+                dp_answer.errors[dp_update.name] = f"Protocol '{prot}' does not match '{dp.access}'."
+            else:
+                cols = Tdatapoint._access_columns(models.IMPLEMENTED_DATA[prot])
+                invalid = set(dp_update.access.data.keys()) - cols
+                if (len(invalid)>0):
+                    dp_answer.errors[dp_update.name] = f"Invalid access parameters {sorted(invalid)} for Protocol '{prot}'."
+                    continue
+                # Mount the table row, the access columns not informed keep their values
+                row = { col:dp_update.access.data.get(col, getattr(dp,col)) for col in cols }
+                row.update( b_name=dp.name,
+                    description=dp_update.description,
+                    num_type=dp_update.num_type,
+                    pending=True )
+                rows[prot].append(row)
+                dp_answer.updated[dp_update.name] = True
+
+        # Write in database, the datasource and protocol are kept
+        table = models.DataPoint.__table__
+        stmt = update(table).where(table.c.name == bindparam('b_name'))
+        try:
+            for prot_rows in rows.values():
+                if (len(prot_rows)>0):
+                    db.execute(stmt, prot_rows)
+            db.expire_all()
+            db.commit()
+        except SQLAlchemyError as exc:
+            db.rollback()
+            msg = str(exc).split('\n')[0]
+            for name in dp_answer.updated.keys():
+                dp_answer.errors[name] = msg
+            dp_answer.updated = {}
+
+        return(dp_answer)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def set_datasource_pending(db:Session, ds_name:str):
+        ''' Mark all datapoints of a datasource as pending in a single
+        UPDATE. The changes are commited by the caller, with the rest of
+        its transaction.\n
+        `db` (Session): Database access session.\n
+        `ds_name` (str): DataSource name.\n
+        return `count` (int): Number of datapoints marked.\n
+        '''
+        qry = db.query(models.DataPoint).filter(models.DataPoint.datasource_name == ds_name)
+        count = qry.update({models.DataPoint.pending: True}, synchronize_session=False)
+
+        return(count)
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_datapoints(db:Session):
@@ -205,41 +401,87 @@ class Tdatapoint:
         `db` (Session): Database access session.\n
         return `dp_answer` (list): List of datapoints in database.\n
         '''
-        dp_answer = []
         # Declare the query
-        dbq = db.query(models.DataPoint)
+        dbq = Tdatapoint._query_datapoints(db)
 
         # Get Datapoint list
-        for dp in dbq.all():
-            dp = Tdatapoint._get_datapoint_implementation(db,dp.access,dp.name)
-            # Parse data
-            dp_answer.append( Tdatapoint._parse_datapoint(dp) )
+        dp_answer = Tdatapoint._parse_datapoints(dbq)
         
         return (dp_answer)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def iter_datapoints(db:Session, chunk:int=500):
+        ''' Iterate over all datapoints without holding the whole table
+        in memory. Rows are fetched from a server side cursor in chunks.\n
+        `db` (Session): Database access session.\n
+        `chunk` (int): Number of rows fetched from the cursor at a time.\n
+        return (generator): Yields each `schemas.dataPoint` in database.\n
+        '''
+        # Declare the query
+        dbq = Tdatapoint._query_datapoints(db).order_by(models.DataPoint.name)
+
+        # Get Datapoint list in chunks
+        for dp in dbq.yield_per(chunk):
+            yield Tdatapoint._parse_datapoint(dp)
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_datapoints_by_range(db:Session, ini:int, end:int):
         ''' Get all datapoints.\n
         `db` (Session): Database access session.\n
         `ini` (int): First query result to show.\n
-        `end` (int): Last query result to show.\n
+        `end` (int): Last query result to show, inclusive.\n
         return `dp_answer` (list): List of datapoints in database.\n
         '''
-        dp_answer = []
         # Declare the query
-        dbq = db.query(models.DataPoint)
+        dbq = Tdatapoint._query_datapoints(db)
+        dbq = dbq.offset(ini-1).limit(max(end-ini+1,0))
 
         # Get Datapoint list
-        for dp in dbq.offset(ini-1).limit(end).all():
-            dp = Tdatapoint._get_datapoint_implementation(db,dp.access,dp.name)
-            # Parse data
-            dp_answer.append( Tdatapoint._parse_datapoint(dp) )
+        dp_answer = Tdatapoint._parse_datapoints(dbq)
 
         return (dp_answer)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def get_datapoints_page(db:Session, cursor:str=None, size:int=100, active:bool=None,
+        pending:bool=None, collector:int=None, protocol:str=None):
+        ''' Get one page of datapoints sorted by name.\n
+        `db` (Session): Database access session.\n
+        `cursor` (str): Cursor returned by the previous page, `None` to start.\n
+        `size` (int): Maximum number of datapoints in the page.\n
+        `active` (bool): Filter by active state, `None` to ignore.\n
+        `pending` (bool): Filter by pending state, `None` to ignore.\n
+        `collector` (int): Filter by collector id, `None` to ignore.\n
+        `protocol` (str): Filter by protocol name, `None` to ignore.\n
+        return `page` (schemas.dataPointPage): The datapoints and the cursor
+        of the next page.\n
+        '''
+        # Declare the query
+        dbq = Tdatapoint._query_datapoints(db)
+        if active is not None:
+            dbq = dbq.filter(models.DataPoint.active==active)
+        if pending is not None:
+            dbq = dbq.filter(models.DataPoint.pending==pending)
+        if protocol is not None:
+            dbq = dbq.filter(models.DataPoint.access==protocol)
+        if collector is not None:
+            dbq = dbq.join(models.DataPoint.datasource).filter(models.DataSource.collector_id==collector)
+
+        # Get Datapoint page
+        rows, next_cursor = keyset_page(dbq, models.DataPoint.name, cursor, size)
+        page = schemas.dataPointPage(
+            items=[ Tdatapoint._parse_datapoint(dp) for dp in rows ],
+            next_cursor=next_cursor
+        )
+
+        return (page)
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_datapoints_pending(db:Session):
@@ -247,15 +489,12 @@ class Tdatapoint:
         `db` (Session): Database access session.\n
         return `dp_answer` (list): List of datapoints in database.\n
         '''
-        dp_answer = []
         # Declare the query
-        dbq = db.query(models.DataPoint)
+        dbq = Tdatapoint._query_datapoints(db)
+        dbq = dbq.filter(models.DataPoint.pending==True)
 
         # Get Datapoint list
-        for dp in dbq.filter(models.Datapoint.pending==True).all():
-            dp = Tdatapoint._get_datapoint_implementation(db,dp.access,dp.name)
-            # Parse data
-            dp_answer.append( Tdatapoint._parse_datapoint(dp) )
+        dp_answer = Tdatapoint._parse_datapoints(dbq)
 
         return (dp_answer)
     # --------------------
@@ -267,15 +506,12 @@ class Tdatapoint:
         `db` (Session): Database access session.\n
         return `dp_answer` (list): List of datapoints in database.\n
         '''
-        dp_answer = []
         # Declare the query
-        dbq = db.query(models.DataPoint)
+        dbq = Tdatapoint._query_datapoints(db)
+        dbq = dbq.filter(models.DataPoint.active==True)
 
         # Get Datapoint list
-        for dp in dbq.filter(models.DataPoint.active==True).all():
-            dp = Tdatapoint._get_datapoint_implementation(db,dp.access,dp.name)
-            # Parse data
-            dp_answer.append( Tdatapoint._parse_datapoint(dp) )
+        dp_answer = Tdatapoint._parse_datapoints(dbq)
         
         return (dp_answer)
     # --------------------
@@ -358,6 +594,74 @@ class Tdatapoint:
         
         return (dp_answer)
     # --------------------
+
+    # --------------------
+    @staticmethod
+    def _selection_filters(sel:schemas.dataPointSelection):
+        ''' Translate the filters of a selection to query conditions.\n
+        `sel` (schemas.dataPointSelection): The datapoints selected.\n
+        return `conditions` (list): Conditions over `models.DataPoint`.\n
+        '''
+        conditions = []
+        if (sel.datasource_name is not None):
+            conditions.append(models.DataPoint.datasource_name == sel.datasource_name)
+        if (sel.collector_id is not None):
+            ds_names = select(models.DataSource.name).where(models.DataSource.collector_id == sel.collector_id)
+            conditions.append(models.DataPoint.datasource_name.in_(ds_names))
+        if (sel.protocol is not None):
+            conditions.append(models.DataPoint.access == sel.protocol)
+
+        return(conditions)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _update_selection(db:Session, sel:schemas.dataPointSelection, values:dict):
+        ''' Change the selected datapoints in a single transaction.\n
+        `db` (Session): Database access session.\n
+        `sel` (schemas.dataPointSelection): The datapoints selected.\n
+        `values` (dict): The new values of the columns.\n
+        return `dp_answer` (dict): Each name asked and if it was changed. Without
+        `names`, all the datapoints changed.\n
+        '''
+        found = update_selected(db, models.DataPoint, models.DataPoint.name, sel.names,
+            Tdatapoint._selection_filters(sel), values)
+        db.commit()
+
+        if (sel.names is None):
+            dp_answer = { name:True for name in sorted(found) }
+        else:
+            dp_answer = { name:(name in found) for name in sel.names }
+
+        return(dp_answer)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def confirm_datapoints(db:Session, sel:schemas.dataPointSelection):
+        ''' Set the selected datapoints to pending `False`.\n
+        `db` (Session): Database access session.\n
+        `sel` (schemas.dataPointSelection): Names and filters of the datapoints.\n
+        return `dp_answer` (dict): Each datapoint and if it was confirmed.\n
+        '''
+        dp_answer = Tdatapoint._update_selection(db, sel, {models.DataPoint.pending: False})
+
+        return(dp_answer)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def activate_datapoints(db:Session, sel:schemas.dataPointSelection, active:bool):
+        ''' Set active state of the selected datapoints.\n
+        `db` (Session): Database access session.\n
+        `sel` (schemas.dataPointSelection): Names and filters of the datapoints.\n
+        `active` (bool): Activate state value.\n
+        return `dp_answer` (dict): Each datapoint and if it was changed.\n
+        '''
+        dp_answer = Tdatapoint._update_selection(db, sel, {models.DataPoint.active: active})
+
+        return(dp_answer)
+    # --------------------
     
     # --------------------
     @staticmethod
@@ -395,18 +699,12 @@ class Tdatapoint:
         `ds_name (str)`: DataSource name to search.\n
         return `dp_answer` (list): List of datapoints in database.\n
         '''
-        dp_answer = []
         # Declare the query
-        dbq = db.query(models.DataSource)
-        # Get DataSource
-        ds = dbq.filter(models.DataSource.name == ds_name).first()
-        
+        dbq = Tdatapoint._query_datapoints(db)
+        dbq = dbq.filter(models.DataPoint.datasource_name == ds_name)
+
         # Get Datapoint list
-        for dp in ds.datapoints:
-            # Get specific implementation of it
-            dp = Tdatapoint._get_datapoint_implementation(db,dp.access,dp.name)
-            # Parse data
-            dp_answer.append( Tdatapoint._parse_datapoint(dp) )
+        dp_answer = Tdatapoint._parse_datapoints(dbq)
         
         return (dp_answer)
     # --------------------
@@ -419,14 +717,12 @@ class Tdatapoint:
         `id` (int): Collector id to search for.\n
         return `dp_answer` (list): List of datapoints.\n
         '''
-        dp_answer = []
-
-        qry = db.query(models.Collector)
-        col = qry.filter(models.Collector.id == id).first()
+        # Declare the query
+        dbq = Tdatapoint._query_datapoints(db)
+        dbq = dbq.join(models.DataPoint.datasource).filter(models.DataSource.collector_id == id)
 
-        if (col is not None):
-            for ds in col.datasources:
-                dp_answer += Tdatapoint.get_datapoints_from_datasource(db,ds.name)
+        # Get Datapoint list
+        dp_answer = Tdatapoint._parse_datapoints(dbq)
         
         return(dp_answer)
     # --------------------
\ No newline at end of file
@@ -8,13 +8,18 @@ Copyright (c) 2017 Aimirim STI.\n
 
 # Import system libs
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, contains_eager, selectinload, with_polymorphic
 
 # Import custom libs
+from .aio import AsyncTable
 from .. import models
 from ..env import Enviroment as Env
 from ..plc_datasource import schemas
 from .datapoint import Tdatapoint
+from .paging import keyset_page
+from .batch import chunks, find_existing, update_selected
 
 
 #######################################
@@ -22,30 +27,42 @@ from .datapoint import Tdatapoint
 class Tdatasource:
     ''' Class with CRUD methods to access the DataSource table.\n
     '''
+    aio = AsyncTable(writes=['create_protocol', 'create_datasource', 'create_datasources',
+        'update_datasource', 'update_datasources', 'confirm_datasource', 'confirm_datasources',
+        'activate_datasource', 'activate_datasources', 'delete_datasource'])
+    '''`aio` (AsyncTable): The same methods for an `AsyncSession`.'''
+
     
     # --------------------
     @staticmethod
-    def get_avail_protocols():
+    def get_avail_protocols(all_defaults:dict=None):
         ''' Search in DEFAULTS for the listed Protocols.\n
+        `all_defaults` (dict): The defaults to search, `Env.DEFAULTS` if not informed.\n
         return (schemas.comboBox): All protocols.\n
         '''
-        prot_avail = schemas.comboBox(defaultValue='',menuItems=list(Env.DEFAULTS['Protocol'].keys()))
+        if (all_defaults is None):
+            all_defaults = Env.DEFAULTS
+        prot_avail = schemas.comboBox(defaultValue='',menuItems=list(all_defaults['Protocol'].keys()))
 
         return(prot_avail)
     # --------------------
 
     # --------------------
     @staticmethod
-    def get_datasource_placeholder(prot_name:str):
+    def get_datasource_placeholder(prot_name:str, all_defaults:dict=None):
         ''' Search in DEFAULTS for the placeholders of a specific protocol.\n
         `prot_name` (str): Name of the Protocol to search.\n
+        `all_defaults` (dict): The defaults to search, `Env.DEFAULTS` if not informed.\n
         return (schemas.dataSourceInfo): The information to pré-fill the fields.\n
         '''
         info = None
+        if (all_defaults is None):
+            all_defaults = Env.DEFAULTS
 
         # Check for asked protocol in defaults
-        if prot_name in Env.DEFAULTS['Protocol'].keys():
-            this_prot = Env.DEFAULTS['Protocol'][prot_name]
+        defaults = all_defaults['Protocol']
+        if prot_name in defaults.keys():
+            this_prot = defaults[prot_name]
 
             # Parse protocol specific information
             p_info = {}
@@ -108,7 +125,7 @@ class Tdatasource:
             plc_port=db_ds.plc_port,
             cycletime=db_ds.cycletime,
             timeout=db_ds.timeout,
-            collector_id=db_ds.collector.id,
+            collector_id=db_ds.collector_id,
             active=db_ds.active,
             pending=db_ds.pending,
             protocol=prot
@@ -117,6 +134,36 @@ class Tdatasource:
         return(ds)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def _query_datasources(db:Session):
+        ''' Declare a listing query that also loads the protocol of every
+        datasource, with its specific columns, in one extra statement.\n
+        `db` (Session): Database access session.\n
+        return `dbq` (Query): Query over the datasource table.\n
+        '''
+        prot_poly = with_polymorphic(models.Protocol, '*')
+        dbq = db.query(models.DataSource).options(
+            selectinload(models.DataSource.protocol.of_type(prot_poly)))
+
+        return(dbq)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _parse_datasources(db_list:list):
+        ''' Parse datasources loaded by `_query_datasources`.\n
+        `db_list` (list): Datasource table items.\n
+        return `ds_answer` (list): List of `schemas.dataSource`.\n
+        '''
+        ds_answer = []
+        for ds in db_list:
+            prot = Tdatasource._parse_protocol(ds.protocol)
+            ds_answer.append( Tdatasource._parse_datasource(ds, prot) )
+
+        return(ds_answer)
+    # --------------------
+
     # --------------------
     @staticmethod
     def _find_datasource_prototol(db:Session, db_ds:models.DataSource):
@@ -207,6 +254,60 @@ class Tdatasource:
         return(ds_created)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def create_datasources(db: Session, new_dss: List[schemas.dataSourceInfo]):
+        ''' Create a batch of datasources, each one with its protocol, in a
+        single transaction. The collectors are resolved once for the whole
+        batch and invalid items are reported without stopping the others.\n
+        `db` (Session): Database access session.\n
+        `new_dss` (list): List of `schemas.dataSourceInfo` to create.\n
+        return `ds_answer` (schemas.bulkResult): Created names and the
+        error message of each rejected item.\n
+        '''
+        ds_answer = schemas.bulkResult(created={}, errors={})
+
+        # Resolve all keys at once
+        ds_found = find_existing(db, models.DataSource.name, [ ds.name for ds in new_dss ])
+        col_found = find_existing(db, models.Collector.id, [ ds.collector_id for ds in new_dss ])
+
+        db_list = []
+        for new_ds in new_dss:
+            if new_ds.name in ds_found or new_ds.name in ds_answer.created.keys():
+                ds_answer.errors[new_ds.name] = 'DataSource already exists.'
+            elif new_ds.protocol.name not in models.IMPLEMENTED_PROT.keys():
+                ds_answer.errors[new_ds.name] = f"Protocol '{new_ds.protocol.name}' not implemented."
+            elif new_ds.collector_id not in col_found:
+                ds_answer.errors[new_ds.name] = f"Collector '{new_ds.collector_id}' not found."
+            else:
+                # Instanciate DataSource
+                db_ds = models.DataSource( name=new_ds.name,
+                    plc_ip=new_ds.plc_ip, plc_port=new_ds.plc_port,
+                    cycletime=new_ds.cycletime, timeout=new_ds.timeout,
+                    collector_id=new_ds.collector_id)
+                # Instanciate the selected protocol
+                prot_cls = models.IMPLEMENTED_PROT[new_ds.protocol.name]
+                db_prot = prot_cls(name=new_ds.protocol.name, datasource=db_ds)
+                for prop, value in new_ds.protocol.data.items():
+                    setattr(db_prot, prop, value)
+
+                db_list += [db_ds, db_prot]
+                ds_answer.created[new_ds.name] = True
+
+        # Insert in database
+        try:
+            db.add_all(db_list)
+            db.commit()
+        except SQLAlchemyError as exc:
+            db.rollback()
+            msg = str(exc).split('\n')[0]
+            for name in ds_answer.created.keys():
+                ds_answer.errors[name] = msg
+            ds_answer.created = {}
+
+        return(ds_answer)
+    # --------------------
+
     # --------------------
     def update_datasource(db: Session, ds_update: schemas.dataSourceInfo):
         ''' Search for a datasources and update it's informations.\n
@@ -242,10 +343,7 @@ class Tdatasource:
 
             # Set validation to False and include all datapoins in it
             ds.pending = True
-            dp_list = Tdatapoint.get_datapoints_from_datasource(db,ds.name)
-            for dp in dp_list:
-                # The pending state is set internaly uppon update call
-                _ = Tdatapoint.update_datapoint(db,dp)
+            Tdatapoint.set_datasource_pending(db,ds.name)
 
             # Parse data
             ds_answer = Tdatasource._parse_datasource(ds, Tdatasource._parse_protocol(prot))
@@ -256,6 +354,70 @@ class Tdatasource:
         return (ds_answer)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def update_datasources(db: Session, ds_updates: List[schemas.dataSourceInfo]):
+        ''' Update a batch of datasources in a single transaction, like
+        `update_datasource` does for each one. The items and collectors are
+        loaded once for the whole batch and invalid items are reported
+        without stopping the others.\n
+        `db` (Session): Database access session.\n
+        `ds_updates` (list): List of `schemas.dataSourceInfo` to update.\n
+        return `ds_answer` (schemas.bulkUpdateResult): Updated names and the
+        error message of each rejected item.\n
+        '''
+        ds_answer = schemas.bulkUpdateResult(updated={}, errors={})
+
+        # Load all items at once, with their protocols
+        ds_found = {}
+        for piece in chunks(list(set([ ds.name for ds in ds_updates ]))):
+            for ds in Tdatasource._query_datasources(db).filter(models.DataSource.name.in_(piece)):
+                ds_found[ds.name] = ds
+        col_found = find_existing(db, models.Collector.id, [ ds.collector_id for ds in ds_updates ])
+        base = { c.key for c in models.Protocol.__mapper__.column_attrs }
+
+        for ds_update in ds_updates:
+            ds = ds_found.get(ds_update.name)
+            prot_name = ds_update.protocol.name
+            if ds_update.name in ds_answer.updated.keys():
+                ds_answer.errors[ds_update.name] = 'DataSource repeated in the batch.'
+            elif ds is None:
+                ds_answer.errors[ds_update.name] = 'DataSource not found.'
+            elif prot_name!=ds.protocol.name:
+                ds_answer.errors[ds_update.name] = f"Protocol '{prot_name}' does not match '{ds.protocol.name}'."
+            elif ds_update.collector_id not in col_found:
+                ds_answer.errors[ds_update.name] = f"Collector '{ds_update.collector_id}' not found."
+            else:
+                cols = { c.key for c in models.IMPLEMENTED_PROT[prot_name].__mapper__.column_attrs } - base
+                invalid = set(ds_update.protocol.data.keys()) - cols
+                if (len(invalid)>0):
+                    ds_answer.errors[ds_update.name] = f"Invalid protocol parameters {sorted(invalid)} for Protocol '{prot_name}'."
+                    continue
+                ds.plc_ip = ds_update.plc_ip
+                ds.plc_port = ds_update.plc_port
+                ds.cycletime = ds_update.cycletime
+                ds.timeout = ds_update.timeout
+                ds.collector_id = ds_update.collector_id
+                for param, value in ds_update.protocol.data.items():
+                    setattr(ds.protocol,param,value)
+                ds.pending = True
+                ds_answer.updated[ds_update.name] = True
+
+        # Write in database, with the datapoints of the updated datasources
+        try:
+            update_selected(db, models.DataPoint, models.DataPoint.datasource_name,
+                ds_answer.updated.keys(), [], {'pending': True})
+            db.commit()
+        except SQLAlchemyError as exc:
+            db.rollback()
+            msg = str(exc).split('\n')[0]
+            for name in ds_answer.updated.keys():
+                ds_answer.errors[name] = msg
+            ds_answer.updated = {}
+
+        return(ds_answer)
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_datasources(db:Session):
@@ -263,41 +425,88 @@ class Tdatasource:
         `db` (Session): Database access session.\n
         return `ds_answer` (list): List of datasources in database.\n
         '''
-        ds_answer = []
         # Declare the query
-        dbq = db.query(models.DataSource)
+        dbq = Tdatasource._query_datasources(db)
 
         # Get Datasource list
-        for ds in dbq.all():
-            prot = Tdatasource._find_datasource_prototol(db,ds)
-            # Parse data
-            ds_answer.append( Tdatasource._parse_datasource(ds, Tdatasource._parse_protocol(prot)) )
+        ds_answer = Tdatasource._parse_datasources(dbq.all())
         
         return (ds_answer)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def iter_datasources(db:Session, chunk:int=500):
+        ''' Iterate over all datasources without holding the whole table
+        in memory. Rows are fetched from a server side cursor in chunks.\n
+        `db` (Session): Database access session.\n
+        `chunk` (int): Number of rows fetched from the cursor at a time.\n
+        return (generator): Yields each `schemas.dataSource` in database.\n
+        '''
+        # Declare the query
+        dbq = Tdatasource._query_datasources(db).order_by(models.DataSource.name)
+
+        # Get Datasource list in chunks
+        for ds in dbq.yield_per(chunk):
+            prot = Tdatasource._parse_protocol(ds.protocol)
+            yield Tdatasource._parse_datasource(ds, prot)
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_datasources_by_range(db:Session, ini:int, end:int):
         ''' Get all datasources.\n
         `db` (Session): Database access session.\n
         `ini` (int): First query result to show.\n
-        `end` (int): Last query result to show.\n
+        `end` (int): Last query result to show, inclusive.\n
         return `ds_answer` (list): List of datasources in database.\n
         '''
-        ds_answer = []
         # Declare the query
-        dbq = db.query(models.DataSource)
+        dbq = Tdatasource._query_datasources(db)
+        dbq = dbq.offset(ini-1).limit(max(end-ini+1,0))
 
         # Get Datasource list
-        for ds in dbq.offset(ini-1).limit(end).all():
-            prot = Tdatasource._find_datasource_prototol(db,ds)
-            # Parse data
-            ds_answer.append( Tdatasource._parse_datasource(ds, Tdatasource._parse_protocol(prot)) )
+        ds_answer = Tdatasource._parse_datasources(dbq.all())
         
         return (ds_answer)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def get_datasources_page(db:Session, cursor:str=None, size:int=100, active:bool=None,
+        pending:bool=None, collector:int=None, protocol:str=None):
+        ''' Get one page of datasources sorted by name.\n
+        `db` (Session): Database access session.\n
+        `cursor` (str): Cursor returned by the previous page, `None` to start.\n
+        `size` (int): Maximum number of datasources in the page.\n
+        `active` (bool): Filter by active state, `None` to ignore.\n
+        `pending` (bool): Filter by pending state, `None` to ignore.\n
+        `collector` (int): Filter by collector id, `None` to ignore.\n
+        `protocol` (str): Filter by protocol name, `None` to ignore.\n
+        return `page` (schemas.dataSourcePage): The datasources and the cursor
+        of the next page.\n
+        '''
+        # Declare the query
+        dbq = Tdatasource._query_datasources(db)
+        if active is not None:
+            dbq = dbq.filter(models.DataSource.active==active)
+        if pending is not None:
+            dbq = dbq.filter(models.DataSource.pending==pending)
+        if collector is not None:
+            dbq = dbq.filter(models.DataSource.collector_id==collector)
+        if protocol is not None:
+            dbq = dbq.join(models.DataSource.protocol).filter(models.Protocol.name==protocol)
+
+        # Get Datasource page
+        rows, next_cursor = keyset_page(dbq, models.DataSource.name, cursor, size)
+        page = schemas.dataSourcePage(
+            items=Tdatasource._parse_datasources(rows),
+            next_cursor=next_cursor
+        )
+
+        return (page)
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_datasources_pending(db:Session):
@@ -305,15 +514,12 @@ class Tdatasource:
         `db` (Session): Database access session.\n
         return `ds_answer` (list): List of datasources in database.\n
         '''
-        ds_answer = []
         # Declare the query
-        dbq = db.query(models.DataSource)
+        dbq = Tdatasource._query_datasources(db)
+        dbq = dbq.filter(models.DataSource.pending==True)
 
         # Get Datasource list
-        for ds in dbq.filter(models.DataSource.pending==True).all():
-            prot = Tdatasource._find_datasource_prototol(db,ds)
-            # Parse data
-            ds_answer.append( Tdatasource._parse_datasource(ds, Tdatasource._parse_protocol(prot)) )
+        ds_answer = Tdatasource._parse_datasources(dbq.all())
         
         return (ds_answer)
     # --------------------
@@ -325,15 +531,12 @@ class Tdatasource:
         `db` (Session): Database access session.\n
         return `ds_answer` (list): List of datasources in database.\n
         '''
-        ds_answer = []
         # Declare the query
-        dbq = db.query(models.DataSource)
+        dbq = Tdatasource._query_datasources(db)
+        dbq = dbq.filter(models.DataSource.active==True)
 
         # Get Datasource list
-        for ds in dbq.filter(models.DataSource.active==True).all():
-            prot = Tdatasource._find_datasource_prototol(db,ds)
-            # Parse data
-            ds_answer.append( Tdatasource._parse_datasource(ds, Tdatasource._parse_protocol(prot)) )
+        ds_answer = Tdatasource._parse_datasources(dbq.all())
         
         return (ds_answer)
     # --------------------
@@ -416,6 +619,72 @@ class Tdatasource:
         
         return (ds_answer)
     # --------------------
+
+    # --------------------
+    @staticmethod
+    def _selection_filters(sel:schemas.dataSourceSelection):
+        ''' Translate the filters of a selection to query conditions.\n
+        `sel` (schemas.dataSourceSelection): The datasources selected.\n
+        return `conditions` (list): Conditions over `models.DataSource`.\n
+        '''
+        conditions = []
+        if (sel.collector_id is not None):
+            conditions.append(models.DataSource.collector_id == sel.collector_id)
+        if (sel.protocol is not None):
+            ds_names = select(models.Protocol.datasource_name).where(models.Protocol.name == sel.protocol)
+            conditions.append(models.DataSource.name.in_(ds_names))
+
+        return(conditions)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _update_selection(db:Session, sel:schemas.dataSourceSelection, values:dict):
+        ''' Change the selected datasources in a single transaction.\n
+        `db` (Session): Database access session.\n
+        `sel` (schemas.dataSourceSelection): The datasources selected.\n
+        `values` (dict): The new values of the columns.\n
+        return `ds_answer` (dict): Each name asked and if it was changed. Without
+        `names`, all the datasources changed.\n
+        '''
+        found = update_selected(db, models.DataSource, models.DataSource.name, sel.names,
+            Tdatasource._selection_filters(sel), values)
+        db.commit()
+
+        if (sel.names is None):
+            ds_answer = { name:True for name in sorted(found) }
+        else:
+            ds_answer = { name:(name in found) for name in sel.names }
+
+        return(ds_answer)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def confirm_datasources(db:Session, sel:schemas.dataSourceSelection):
+        ''' Set the selected datasources to pending `False`.\n
+        `db` (Session): Database access session.\n
+        `sel` (schemas.dataSourceSelection): Names and filters of the datasources.\n
+        return `ds_answer` (dict): Each datasource and if it was confirmed.\n
+        '''
+        ds_answer = Tdatasource._update_selection(db, sel, {models.DataSource.pending: False})
+
+        return(ds_answer)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def activate_datasources(db:Session, sel:schemas.dataSourceSelection, active:bool):
+        ''' Set active state of the selected datasources.\n
+        `db` (Session): Database access session.\n
+        `sel` (schemas.dataSourceSelection): Names and filters of the datasources.\n
+        `active` (bool): Activate state value.\n
+        return `ds_answer` (dict): Each datasource and if it was changed.\n
+        '''
+        ds_answer = Tdatasource._update_selection(db, sel, {models.DataSource.active: active})
+
+        return(ds_answer)
+    # --------------------
     
     # --------------------
     @staticmethod
@@ -434,11 +703,7 @@ class Tdatasource:
         # Get specific Datasource
         ds = dbq.filter(models.DataSource.name == ds_name).first()
         if (ds is not None):
-            ds_list = Tdatapoint.get_datapoints_from_datasource(db,ds.name)
-            for dp in ds_list:
-                Tdatapoint.delete_datapoint(db,dp.name)
-
-            # Remove from database
+            # Remove from database, its protocol and datapoints go with it
             db.delete(ds)
             db.commit()
             # Parse data
@@ -457,15 +722,47 @@ class Tdatasource:
         `id` (int): Collector id to search for.\n
         return `ds_answer` (list): List of datasources.\n
         '''
-        ds_answer = []
-
-        qry = db.query(models.Collector)
-        col = qry.filter(models.Collector.id == id).first()
+        # Declare the query
+        dbq = Tdatasource._query_datasources(db)
+        dbq = dbq.filter(models.DataSource.collector_id == id)
 
-        for ds in col.datasources:
-            prot = Tdatasource._find_datasource_prototol(db,ds)
-            # Parse data
-            ds_answer.append( Tdatasource._parse_datasource(ds, Tdatasource._parse_protocol(prot)) )
+        # Get Datasource list
+        ds_answer = Tdatasource._parse_datasources(dbq.all())
         
         return(ds_answer)
-    # --------------------
\ No newline at end of file
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_export_tree_from_collector(db:Session, id:int):
+        ''' Get the active and confirmed datasources of a collector with
+        their active and confirmed datapoints in a single joined query.\n
+        `db` (Session): Database access session.\n
+        `id` (int): Collector id to search for.\n
+        return `tree` (list): Pairs of `schemas.dataSource` and the list of its
+        `dp_schemas.dataPoint`, both sorted by name. Datasources without
+        datapoints to export are not listed.\n
+        '''
+        tree = []
+
+        # Declare the query
+        prot_poly = with_polymorphic(models.Protocol, '*')
+        dp_poly = with_polymorphic(models.DataPoint, '*')
+        dbq = db.query(models.DataSource, prot_poly, dp_poly)
+        dbq = dbq.join(models.DataSource.protocol.of_type(prot_poly))
+        dbq = dbq.join(models.DataSource.datapoints.of_type(dp_poly))
+        dbq = dbq.options(contains_eager(dp_poly.datasource))
+        dbq = dbq.filter(models.DataSource.collector_id == id,
+            models.DataSource.active==True, models.DataSource.pending==False,
+            dp_poly.active==True, dp_poly.pending==False)
+        dbq = dbq.order_by(models.DataSource.name, dp_poly.name)
+
+        # Group the datapoints by datasource
+        for ds, prot, dp in dbq:
+            if (len(tree)==0 or tree[-1][0].name!=ds.name):
+                parsed_ds = Tdatasource._parse_datasource(ds, Tdatasource._parse_protocol(prot))
+                tree.append( (parsed_ds, []) )
+            tree[-1][1].append( Tdatapoint._parse_datapoint(dp) )
+
+        return(tree)
+    # --------------------
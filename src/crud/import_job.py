@@ -0,0 +1,107 @@
+'''
+This module holds the functions to
+access the ImportJob Table\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+from sqlalchemy.orm import Session
+from datetime import datetime
+import json
+
+# Import custom libs
+from .aio import AsyncTable
+from .. import models
+from ..csv_import import schemas
+
+#######################################
+
+class Timport:
+    ''' Class with CRUD methods to access the ImportJob table. The progress
+    of the imports is kept in database so every worker can report it.\n
+    '''
+    aio = AsyncTable(writes=['create', 'save'])
+    '''`aio` (AsyncTable): The same methods for an `AsyncSession`.'''
+
+    # --------------------
+    @staticmethod
+    def _parse_import(db_job:models.ImportJob):
+        ''' Parse the table item into its schema.\n
+        `db_job` (models.ImportJob): The import table item.\n
+        return `status` (schemas.importStatus): The import status.\n
+        '''
+        status = schemas.importStatus(id=db_job.id, state=db_job.state,
+            rows=db_job.rows, datasources=db_job.datasources, datapoints=db_job.datapoints,
+            errors=db_job.errors, messages=json.loads(db_job.messages))
+
+        return(status)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_by_id(db:Session, id:str):
+        ''' Search the import by its id.\n
+        `db` (Session): Database session instance.\n
+        `id` (str): Import id to search for.\n
+        return `db_job` (models.ImportJob): The import, `None` if not found.\n
+        '''
+        db_job = db.get(models.ImportJob, id)
+
+        return(db_job)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def create(db:Session, status:schemas.importStatus, keep:int):
+        ''' Save a new import and forget the oldest ones.\n
+        `db` (Session): Database session instance.\n
+        `status` (schemas.importStatus): The status of the new import.\n
+        `keep` (int): Number of imports kept, with the new one.\n
+        return `db_job` (models.ImportJob): The saved import.\n
+        '''
+        db_job = models.ImportJob(id=status.id, created_at=datetime.utcnow())
+        Timport._fill(db_job, status)
+        db.add(db_job)
+        db.flush()
+
+        qry = db.query(models.ImportJob.id).order_by(models.ImportJob.created_at.desc())
+        old = [ row.id for row in qry.offset(keep).all() ]
+        if (len(old)>0):
+            db.query(models.ImportJob).filter(models.ImportJob.id.in_(old)).delete(synchronize_session=False)
+
+        db.commit()
+
+        return(db_job)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def save(db:Session, status:schemas.importStatus):
+        ''' Save the progress of an import.\n
+        `db` (Session): Database session instance.\n
+        `status` (schemas.importStatus): The import status.\n
+        return `db_job` (models.ImportJob): The saved import, `None` if it
+        was already forgotten.\n
+        '''
+        db_job = Timport.get_by_id(db, status.id)
+        if (db_job is not None):
+            Timport._fill(db_job, status)
+            db.commit()
+
+        return(db_job)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _fill(db_job:models.ImportJob, status:schemas.importStatus):
+        ''' Copy the status into the table item.\n
+        '''
+        db_job.state = status.state
+        db_job.rows = status.rows
+        db_job.datasources = status.datasources
+        db_job.datapoints = status.datapoints
+        db_job.errors = status.errors
+        db_job.messages = json.dumps(status.messages)
+    # --------------------
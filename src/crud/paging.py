@@ -0,0 +1,65 @@
+'''
+This module holds the helpers for keyset
+(cursor based) pagination of table listings\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+import base64
+import binascii
+
+#######################################
+
+# --------------------
+def encode_cursor(key:str):
+    ''' Build the opaque cursor that points after a table key.\n
+    `key` (str): Last table key delivered in a page.\n
+    return `cursor` (str): Url safe cursor string.\n
+    '''
+    cursor = base64.urlsafe_b64encode(str(key).encode('utf-8')).decode('ascii')
+
+    return(cursor)
+# --------------------
+
+# --------------------
+def decode_cursor(cursor:str):
+    ''' Recover the table key from an opaque cursor.\n
+    `cursor` (str): Cursor received from a previous page.\n
+    return `key` (str): Table key to continue after. Raises `ValueError`
+    when the cursor is not valid.\n
+    '''
+    try:
+        key = base64.b64decode(cursor.encode('ascii'), altchars=b'-_', validate=True).decode('utf-8')
+    except (binascii.Error, UnicodeError) as exc:
+        raise ValueError(f"Invalid cursor '{cursor}'.") from exc
+
+    return(key)
+# --------------------
+
+# --------------------
+def keyset_page(dbq, key_col, cursor:str, size:int):
+    ''' Fetch one page of a query ordered by an unique key. The cost of
+    every page is the same because it seeks the key instead of skipping
+    the previous rows.\n
+    `dbq` (Query): Query with all the filters already applied.\n
+    `key_col` (Column): Unique column used to sort and seek.\n
+    `cursor` (str): Cursor from the previous page, `None` for the first one.\n
+    `size` (int): Maximum number of rows in the page.\n
+    return `rows, next_cursor` (list, str): Rows of the page and the cursor
+    of the next one, `None` when this is the last page.\n
+    '''
+    if cursor is not None:
+        dbq = dbq.filter(key_col > decode_cursor(cursor))
+
+    # Ask one extra row to know if there is a next page
+    rows = dbq.order_by(key_col).limit(size+1).all()
+
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor(getattr(rows[-1], key_col.key))
+
+    return(rows, next_cursor)
+# --------------------
@@ -8,15 +8,13 @@ Copyright (c) 2017 Aimirim STI.\n
 
 # Import system libs
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 
 
 # Import custom libs
+from .aio import AsyncTable
 from .. import models
 from ..user_auth import schemas
-
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from ..user_auth.password_pool import pwd_context
 
 
 #######################################
@@ -24,6 +22,9 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 class Tuser:
     ''' Class with CRUD methods to access the User table.\n
     '''
+    aio = AsyncTable(writes=['create', 'delete', 'change_password'])
+    '''`aio` (AsyncTable): The same methods for an `AsyncSession`.'''
+
     # --------------------
     @staticmethod
     def authenticate_user(db:Session, username: str, password: str):
@@ -87,13 +88,15 @@ class Tuser:
 
     # --------------------
     @staticmethod
-    def create(db: Session, new_user: schemas.UserCreate):
+    def create(db: Session, new_user: schemas.UserCreate, hashed:bool=False):
         ''' Create a new user in the database.\n
         `db` (Session): Database session instance.\n
         `new_user` (schemas.UserCreate): New user with `.name` and `.password`.\n
+        `hashed` (bool): The `.password` is already hashed.\n
         return `db_user` (models.User): The created user data.\n
         '''
-        new_user.password = Tuser.get_password_hash(new_user.password)
+        if (not hashed):
+            new_user.password = Tuser.get_password_hash(new_user.password)
         db_user = models.User(name=new_user.name, password=new_user.password,
             change_password=new_user.change_password, is_admin=new_user.is_admin)
         db.add(db_user)
@@ -117,15 +120,18 @@ class Tuser:
 
     # --------------------
     @staticmethod
-    def change_password(db:Session, username: str, new_password: str):
+    def change_password(db:Session, username: str, new_password: str, hashed:bool=False):
         '''Change the user password.\n
         `db` (Session): Database session instance.\n
         `username` (string): The user name whose password will be changed.\n
         `new_password` (string): The new password.\n
+        `hashed` (bool): The `new_password` is already hashed.\n
         return (boolean): Returns true.\n
         '''
         user = Tuser.get_by_name(db, name=username)
-        user.password = Tuser.get_password_hash(new_password)
+        if (not hashed):
+            new_password = Tuser.get_password_hash(new_password)
+        user.password = new_password
         user.change_password = False
         db.commit()
         db.refresh(user)
@@ -0,0 +1,275 @@
+'''
+This module hold the endpoints for the
+csv import feature.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* fastapi
+* sqlalchemy
+'''
+
+# Import system libs
+from fastapi import BackgroundTasks, Depends, File, HTTPException, UploadFile
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from itertools import islice
+import tempfile
+import shutil
+import uuid
+import csv
+import os
+
+# Import custom libs
+from . import schemas
+from .. import models
+from ..env import Enviroment as Env
+from ..database import get_db, get_async_db, SessionManager
+from ..crud import Tdatapoint, Tdatasource, Timport
+from ..crud.batch import find_existing
+from ..plc_datapoint import schemas as dp_schemas
+from ..plc_datasource import schemas as ds_schemas
+from ..user_auth import routes as usr_routes
+from ..write_queue import run_write
+
+#######################################
+
+# NOTE: The CSV layout is the same of `utils/parsed_variables.csv`.
+#       The optional `PROTOCOL` column selects the implementation
+#       of each row, it is `Siemens` when absent. Modbus rows can
+#       also have a `FUNC_CODE` column.
+
+DEFAULT_PROTOCOL = 'Siemens'
+'''`DEFAULT_PROTOCOL` (str): Protocol of the rows without `PROTOCOL` column.'''
+
+ADDRESS_FIELD = {
+    'Siemens':  'address',
+    'Modbus':   'address',
+    'Rockwell': 'tag_name',
+}
+'''`ADDRESS_FIELD` (dict): Access field that receives the `ADDRESS` column.'''
+
+MAX_JOBS = 50
+'''`MAX_JOBS` (int): Number of imports kept in database to be consulted.'''
+
+MAX_MESSAGES = 100
+'''`MAX_MESSAGES` (int): Number of error messages kept for each import.'''
+
+# NOTE: The import runs in the worker that received the file, the
+#       progress is saved in database after each chunk so any
+#       worker can answer `get_import_status`.
+
+# --------------------
+def _row_protocol(row:dict):
+    ''' Get the protocol of a CSV row.\n
+    `row` (dict): The CSV row.\n
+    return `prot_name` (str): The protocol name. Raises `ValueError` if
+    it is not implemented.\n
+    '''
+    prot_name = row.get('PROTOCOL') or DEFAULT_PROTOCOL
+    if (prot_name not in ADDRESS_FIELD.keys()):
+        raise ValueError(f"Protocol '{prot_name}' not implemented")
+
+    return(prot_name)
+# --------------------
+
+# --------------------
+def _translate_datasource(row:dict, collector_id:int):
+    ''' Get a CSV row and parse it into the datasource that
+    holds its variable.\n
+    `row` (dict): The CSV row.\n
+    `collector_id` (int): The Collector ID to associate the datasource to.\n
+    return `ds` (ds_schemas.dataSourceInfo): Datasource informations.\n
+    '''
+    prot_name = _row_protocol(row)
+    defaults = Env.DEFAULTS['Protocol'][prot_name]
+
+    # Protocol specific information start with the placeholders
+    p_data = { key:val['value'] for key, val in defaults['protocol'].items() }
+    if (prot_name=='Siemens' and row.get('PLC MODEL')):
+        p_data['plc'] = row['PLC MODEL'].upper()
+
+    ds = ds_schemas.dataSourceInfo(
+        name=row['PLC NAME'],
+        plc_ip=row['PLC IP'],
+        plc_port=int(row.get('PLC PORT') or defaults['plc_port']['value']),
+        cycletime=int(defaults['cycletime']['value']),
+        timeout=int(defaults['timeout']['value']),
+        collector_id=collector_id,
+        protocol=ds_schemas.protocolInfo(name=prot_name, data=p_data)
+    )
+
+    return(ds)
+# --------------------
+
+# --------------------
+def _translate_datapoint(row:dict):
+    ''' Get a CSV row and parse it into a datapoint.\n
+    `row` (dict): The CSV row.\n
+    return `dp` (dp_schemas.dataPointInfo): Datapoint informations.\n
+    '''
+    prot_name = _row_protocol(row)
+
+    a_data = { ADDRESS_FIELD[prot_name]: row['ADDRESS'] }
+    if (prot_name=='Modbus'):
+        default = Env.DEFAULTS['Data'][prot_name]['access']['func_code']['value']
+        a_data['func_code'] = row.get('FUNC_CODE') or default
+
+    dp = dp_schemas.dataPointInfo(
+        name=row['TAG'],
+        description=row.get('DESCRIPTION') or '',
+        num_type=row['NUM_TYPE'],
+        datasource_name=row['PLC NAME'],
+        access=dp_schemas.accessInfo(name=prot_name, data=a_data)
+    )
+
+    return(dp)
+# --------------------
+
+# --------------------
+def _report_errors(status:schemas.importStatus, errors:dict):
+    ''' Accumulate errors in the import status.\n
+    `status` (schemas.importStatus): The status to update.\n
+    `errors` (dict): The error message of each item, like `Line 2`,
+    `DataSource <name>` or `DataPoint <name>`.\n
+    '''
+    status.errors += len(errors)
+    for name, msg in errors.items():
+        if (len(status.messages)<MAX_MESSAGES):
+            status.messages.append(f"{name}: {msg}")
+# --------------------
+
+# --------------------
+def _import_chunk(db:Session, rows:list, first:int, collector_id:int, known_ds:set, status:schemas.importStatus):
+    ''' Write a chunk of CSV rows in database with the bulk create methods.\n
+    `db` (Session): Database access session.\n
+    `rows` (list): The CSV rows of this chunk.\n
+    `first` (int): Line number of the first row, used in messages.\n
+    `collector_id` (int): The Collector ID to associate new datasources to.\n
+    `known_ds` (set): Names of the datasources already in database, it is
+    updated with the ones created here.\n
+    `status` (schemas.importStatus): The import status to update.\n
+    '''
+    errors = {}
+
+    # Parse rows, datasources are taken from the first row that mention them
+    new_ds = {}
+    new_dp = []
+    for i, row in enumerate(rows):
+        try:
+            ds_name = row['PLC NAME']
+            if (ds_name not in known_ds and ds_name not in new_ds.keys()):
+                new_ds[ds_name] = _translate_datasource(row, collector_id)
+            new_dp.append( _translate_datapoint(row) )
+        except Exception as exc:
+            msg = str(exc).split('\n')[0]
+            errors[f"Line {first+i}"] = f"Invalid row ({msg})."
+
+    # Create the datasources that are not in database yet
+    if (len(new_ds)>0):
+        known_ds |= find_existing(db, models.DataSource.name, new_ds.keys())
+        ds_list = [ ds for name, ds in new_ds.items() if name not in known_ds ]
+        ds_answer = run_write(db, Tdatasource.create_datasources, ds_list)
+        known_ds |= set(ds_answer.created.keys())
+        # A datasource and a datapoint can have the same name
+        errors.update({ f"DataSource {name}":msg for name, msg in ds_answer.errors.items() })
+        status.datasources += len(ds_answer.created)
+
+    # Create the datapoints
+    dp_answer = run_write(db, Tdatapoint.create_datapoints, new_dp)
+    errors.update({ f"DataPoint {name}":msg for name, msg in dp_answer.errors.items() })
+
+    status.rows += len(rows)
+    status.datapoints += len(dp_answer.created)
+    _report_errors(status, errors)
+    run_write(db, Timport.save, status)
+# --------------------
+
+# --------------------
+def _run_import(status:schemas.importStatus, path:str, collector_id:int, chunk:int):
+    ''' Read the CSV file in chunks and write its content in database.
+    This runs after the HTTP response, the progress is saved in database.\n
+    `status` (schemas.importStatus): The import status to update.\n
+    `path` (str): Path of the CSV file copy.\n
+    `collector_id` (int): The Collector ID to associate new datasources to.\n
+    `chunk` (int): Number of rows written at a time.\n
+    '''
+    with SessionManager() as db:
+        try:
+            with open(path, 'r', newline='', encoding='utf-8-sig') as fid:
+                reader = csv.DictReader(fid)
+                known_ds = set()
+                # The header is the first line
+                first = 2
+                rows = list(islice(reader, chunk))
+                while (len(rows)>0):
+                    _import_chunk(db, rows, first, collector_id, known_ds, status)
+                    first += len(rows)
+                    rows = list(islice(reader, chunk))
+            status.state = 'done'
+        except Exception as exc:
+            db.rollback()
+            msg = str(exc).split('\n')[0]
+            _report_errors(status, {'Import': msg})
+            status.state = 'failed'
+        finally:
+            os.remove(path)
+            run_write(db, Timport.save, status)
+# --------------------
+
+# --------------------
+def _register_job(db:Session):
+    ''' Create the status of a new import and forget the oldest ones.\n
+    `db` (Session): Database access session.\n
+    return `status` (schemas.importStatus): The new import status.\n
+    '''
+    status = schemas.importStatus(id=uuid.uuid4().hex, state='running',
+        rows=0, datasources=0, datapoints=0, errors=0, messages=[])
+
+    run_write(db, Timport.create, status, keep=MAX_JOBS)
+
+    return(status)
+# --------------------
+
+# --------------------
+def import_csv(collector_id:int, background:BackgroundTasks, chunk:int=5000, file:UploadFile=File(...),
+    db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Import a CSV file with PLC variables, creating the DataSources and DataPoints
+    in it. The file is processed in background, use the returned `id` to follow it.\n
+    `collector_id` (int): The Collector ID of the new DataSources.\n
+    `chunk` (int): Number of rows written at a time, from `1` to `50000`.\n
+    `file` (UploadFile): The CSV file in the `parsed_variables.csv` layout.\n
+    return `status` (JSONResponse): A `schemas.importStatus` automatically parsed into
+    a HTTP_OK response.\n
+    '''
+    if(chunk<1 or chunk>50000):
+        raise HTTPException(status_code=401, detail=f"Import parameter error. The `chunk` must be between `1` and `50000`.")
+
+    if (len(find_existing(db, models.Collector.id, [collector_id]))==0):
+        m_name = f"Collector"
+        raise HTTPException(status_code=404, detail=f"Error searching for {m_name}.")
+
+    # Keep a copy, the upload is closed after the response
+    with tempfile.NamedTemporaryFile('wb', suffix='.csv', delete=False) as fid:
+        shutil.copyfileobj(file.file, fid)
+
+    status = _register_job(db)
+    background.add_task(_run_import, status, fid.name, collector_id, chunk)
+
+    return(status)
+# --------------------
+
+# --------------------
+async def get_import_status(id:str, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get the progress of a CSV import, started by any worker.\n
+    `id` (str): The import ID.\n
+    return `status` (JSONResponse): A `schemas.importStatus` automatically parsed into
+    a HTTP_OK response.\n
+    '''
+    db_job = await Timport.aio.get_by_id(db,id)
+
+    if (db_job is None):
+        m_name = f"Import '{id}'"
+        raise HTTPException(status_code=404, detail=f"Error searching for {m_name}.")
+
+    status = Timport._parse_import(db_job)
+    return(status)
+# --------------------
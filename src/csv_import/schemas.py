@@ -0,0 +1,22 @@
+'''
+This module contais the schemas
+expected in HTTP responses.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pydantic
+'''
+
+# Import system libs
+from pydantic import BaseModel
+from typing import List
+
+#######################################
+
+class importStatus(BaseModel):
+    id: str
+    state: str
+    rows: int
+    datasources: int
+    datapoints: int
+    errors: int
+    messages: List[str]
@@ -4,10 +4,14 @@ instance.\n
 Copyright (c) 2017 Aimirim STI.\n
 ## Dependencies are:
 * sqlalchemy
+* aiosqlite, or psycopg2 and asyncpg for PostgreSQL
 '''
 
 # Import system libs
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
@@ -17,13 +21,144 @@ from .env import Enviroment as Env
 
 #######################################
 
-engine = create_engine( Env.DATABASE_URL,
-    connect_args={"check_same_thread": False} )
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+'''`ASYNC_DRIVERS` (dict): Async driver used for each database backend.'''
+
+STARTUP_LOCK_KEY = 0x746f63616e
+'''`STARTUP_LOCK_KEY` (int): PostgreSQL advisory lock taken while setting up the database.'''
+
+# --------------------
+def _async_url(url:str):
+    ''' Get the url of the same database for the async engine.\n
+    `url` (str): The `DATABASE_URL`.\n
+    return `async_url` (URL): The url with the async driver.\n
+    '''
+    async_url = make_url(url)
+    backend = async_url.get_backend_name()
+    if (backend not in ASYNC_DRIVERS.keys()):
+        raise ValueError(f"No async driver known for the '{backend}' database.")
+
+    return( async_url.set(drivername=ASYNC_DRIVERS[backend]) )
+# --------------------
+
+# --------------------
+def _engine_kwargs(url:str):
+    ''' Get the engine options for the database backend.\n
+    `url` (str): The `DATABASE_URL`.\n
+    return `kwargs` (dict): Keyword arguments to create the engine.\n
+    '''
+    kwargs = { 'pool_pre_ping': Env.DB_POOL_PRE_PING.lower()=='true' }
+
+    if (make_url(url).get_backend_name()=='sqlite'):
+        # The connections are shared between the threads of the workers
+        kwargs['connect_args'] = {"check_same_thread": False}
+    else:
+        kwargs['pool_size'] = int(Env.DB_POOL_SIZE)
+        kwargs['max_overflow'] = int(Env.DB_MAX_OVERFLOW)
+        kwargs['pool_recycle'] = int(Env.DB_POOL_RECYCLE)
+
+    return(kwargs)
+# --------------------
+
+# --------------------
+def _tune_sqlite(dbapi_connection, connection_record):
+    ''' Apply the SQLite pragmas to each new connection.\n
+    `dbapi_connection` (Connection): The driver connection.\n
+    `connection_record` (ConnectionRecord): Pool information, not used.\n
+    '''
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA mmap_size={int(Env.SQLITE_MMAP_SIZE)}')
+    cursor.execute(f'PRAGMA cache_size={int(Env.SQLITE_CACHE_SIZE)}')
+    cursor.execute(f'PRAGMA busy_timeout={int(Env.SQLITE_BUSY_TIMEOUT)}')
+    cursor.close()
+# --------------------
+
+# --------------------
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    ''' SQLite only enforces the foreign keys, and their `ON DELETE`,
+    when asked on each connection.\n
+    '''
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+# --------------------
+
+# --------------------
+def _sqlite_autocommit(dbapi_connection, connection_record):
+    ''' Stop the driver from managing the transactions by itself, or
+    it breaks the SAVEPOINTs of the single writer.\n
+    '''
+    dbapi_connection.isolation_level = None
+# --------------------
+
+# --------------------
+def _sqlite_begin(conn):
+    ''' Emit the BEGIN the driver no longer sends.\n
+    '''
+    conn.exec_driver_sql('BEGIN')
+# --------------------
+
+engine = create_engine( Env.DATABASE_URL, **_engine_kwargs(Env.DATABASE_URL) )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine( _async_url(Env.DATABASE_URL), **_engine_kwargs(Env.DATABASE_URL) )
+
+SQLITE_TUNED = (engine.dialect.name=='sqlite' and Env.SQLITE_TUNING.lower()=='true')
+'''`SQLITE_TUNED` (bool): If the SQLite tuning profile is in use.'''
+
+if (engine.dialect.name=='sqlite'):
+    event.listen(engine, 'connect', _sqlite_foreign_keys)
+    event.listen(async_engine.sync_engine, 'connect', _sqlite_foreign_keys)
+
+if SQLITE_TUNED:
+    event.listen(engine, 'connect', _tune_sqlite)
+    event.listen(engine, 'connect', _sqlite_autocommit)
+    event.listen(engine, 'begin', _sqlite_begin)
+    event.listen(async_engine.sync_engine, 'connect', _tune_sqlite)
+
+# NOTE: The async sessions do not expire the items on commit, loading
+#       attributes after it would need IO outside of `run_sync`.
+AsyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=async_engine,
+    class_=AsyncSession, expire_on_commit=False)
+
 Base = declarative_base()
 
+# --------------------
+@contextmanager
+def startup_lock():
+    ''' Keep the other workers out while this one sets up the database.
+    Only PostgreSQL has the lock, for other databases the setup must
+    tolerate running concurrently.\n
+    '''
+    if (engine.dialect.name=='postgresql'):
+        with engine.connect() as conn:
+            conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key':STARTUP_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key':STARTUP_LOCK_KEY})
+    else:
+        yield
+# --------------------
+
+# --------------------
+def create_tables():
+    ''' Create the missing tables of all models.\n
+    '''
+    try:
+        Base.metadata.create_all(bind=engine)
+    except (OperationalError, ProgrammingError):
+        # Another worker created a table between the check and the
+        # creation, the second pass finds it
+        Base.metadata.create_all(bind=engine)
+# --------------------
+
 # --------------------
 @contextmanager
 def SessionManager():
@@ -51,4 +186,15 @@ def get_db():
         yield db
     finally:
         db.close()
+# --------------------
+
+# --------------------
+async def get_async_db():
+    ''' Async database state in the dependency function, used along with
+    `Depends` in the `async def` routes. Access the tables with the `aio`
+    methods of the table classes.\n
+    return `db` (AsyncSession): Database session.\n
+    '''
+    async with AsyncSessionLocal() as db:
+        yield db
 # --------------------
\ No newline at end of file
@@ -0,0 +1,109 @@
+'''
+This module holds the responses of the
+defaults routes, compiled once.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* fastapi
+'''
+
+# Import system libs
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from typing import NamedTuple, Union
+import threading
+import hashlib
+
+# Import custom libs
+from .env import Enviroment as Env
+from .crud import Tcollector, Tdatapoint, Tdatasource
+from .collector import schemas as col_schemas
+
+#######################################
+
+class defaultsEntry(NamedTuple):
+    ''' A compiled defaults response.\n
+    `body` (bytes): The JSON content.\n
+    `etag` (str): The quoted digest of `body`.\n
+    '''
+    body: bytes
+    etag: str
+
+# --------------------
+def _compile(model):
+    ''' Serialize a response like the routes do.\n
+    `model` (BaseModel): The response content.\n
+    return `entry` (defaultsEntry): The compiled response.\n
+    '''
+    body = JSONResponse(jsonable_encoder(model)).body
+    etag = '"'+hashlib.sha256(body).hexdigest()[:32]+'"'
+
+    return(defaultsEntry(body, etag))
+# --------------------
+
+class DefaultsCache:
+    ''' The placeholders of the forms only change with `Env.DEFAULTS`, so
+    their responses are built once and the routes send the same bytes
+    again. The clients sending the `ETag` back in `If-None-Match` get a
+    `304 Not Modified` without content.\n
+    '''
+    def __init__(self):
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def build(self, defaults:dict=None):
+        ''' Compile the responses and publish them. When `defaults` is
+        informed it becomes `Env.DEFAULTS` together with its responses, only
+        after all of them compiled.\n
+        `defaults` (dict): The new defaults, the current `Env.DEFAULTS` if
+        not informed.\n
+        '''
+        if (defaults is None):
+            defaults = Env.DEFAULTS
+
+        entries = {}
+        entries['protocols'] = _compile(Tdatasource.get_avail_protocols(defaults))
+        for prot_name in defaults['Protocol'].keys():
+            entries[f'datasource/{prot_name}'] = _compile(Tdatasource.get_datasource_placeholder(prot_name, defaults))
+        for prot_name in defaults['Data'].keys():
+            entries[f'datapoint/{prot_name}'] = _compile(Tdatapoint.get_datapoint_placeholder(prot_name, defaults))
+        # Only the public fields, like the route `response_model`
+        col_defaults = Tcollector.get_defaults(defaults)
+        entries['collector'] = _compile(col_schemas.collectorInfo(**col_defaults.dict()))
+
+        with self._lock:
+            self._entries = entries
+            Env.DEFAULTS = defaults
+
+    def get(self, key:str):
+        ''' Search a compiled response.\n
+        `key` (str): `'protocols'`, `'collector'`, `'datasource/{prot_name}'`
+        or `'datapoint/{prot_name}'`.\n
+        return `entry` (defaultsEntry): The response, `None` if not found.\n
+        '''
+        if (self._entries is None):
+            self.build()
+        return(self._entries.get(key))
+
+    def response(self, key:str, if_none_match:Union[str,None]=None):
+        ''' Answer a defaults route.\n
+        `key` (str): The compiled response, see `get`.\n
+        `if_none_match` (str): The `If-None-Match` request header.\n
+        return `response` (Response): The content, or `304` when the client
+        already has it. `None` if not found.\n
+        '''
+        entry = self.get(key)
+        if (entry is None):
+            return(None)
+
+        headers = {'ETag': entry.etag, 'Cache-Control': 'private, no-cache'}
+        if (if_none_match is not None):
+            tags = [ tag.strip().removeprefix('W/') for tag in if_none_match.split(',') ]
+            if (entry.etag in tags or '*' in tags):
+                return(Response(status_code=304, headers=headers))
+
+        response = Response(content=entry.body, media_type='application/json', headers=headers)
+        return(response)
+
+DEFAULTS_CACHE = DefaultsCache()
+'''`DEFAULTS_CACHE` (DefaultsCache): The compiled defaults responses.'''
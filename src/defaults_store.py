@@ -0,0 +1,140 @@
+'''
+This module holds the watcher that reloads
+the defaults file while the application runs.\n
+Copyright (c) 2017 Aimirim STI.\n
+'''
+
+# Import system libs
+import asyncio
+import json
+import os
+
+# Import custom libs
+from .env import Enviroment as Env
+from .defaults_cache import DEFAULTS_CACHE
+
+#######################################
+
+# NOTE: `Env.DEFAULTS` is replaced as a whole and never changed in
+#       place. Read it once in each function, the values are then
+#       from a single version of the file.
+
+REQUIRED_KEYS = {
+    'Protocol': ['name', 'plc_ip', 'plc_port', 'cycletime', 'timeout', 'protocol'],
+    'Data': ['name', 'description', 'num_type', 'datasource_name', 'access'],
+}
+'''`REQUIRED_KEYS` (dict): The keys of each protocol in the sections of the
+defaults file.'''
+
+COLLECTOR_KEYS = ['name', 'ip', 'ssh_port', 'ssh_user', 'prj_path', 'opcua_port', 'health_port', 'update_period']
+'''`COLLECTOR_KEYS` (list): The keys of the `Collector` section.'''
+
+# --------------------
+def load_defaults(path:str):
+    ''' Read and check a defaults file.\n
+    `path` (str): The json file.\n
+    return `defaults` (dict): The file content.\n
+    '''
+    with open(path, 'r') as fid:
+        defaults = json.load(fid)
+
+    for section, keys in REQUIRED_KEYS.items():
+        if (not isinstance(defaults.get(section), dict) or not defaults[section]):
+            raise ValueError(f"Section '{section}' is missing or empty")
+        for prot_name, values in defaults[section].items():
+            missing = [ key for key in keys if key not in values ]
+            if (missing):
+                raise ValueError(f"'{section}.{prot_name}' is missing {missing}")
+    missing = [ key for key in COLLECTOR_KEYS if key not in defaults.get('Collector', {}) ]
+    if (missing):
+        raise ValueError(f"'Collector' is missing {missing}")
+    if (not isinstance(defaults.get('Prometheus', {}).get('scrape_configs'), list)):
+        raise ValueError(f"'Prometheus.scrape_configs' must be a list")
+
+    return(defaults)
+# --------------------
+
+class DefaultsStore:
+    ''' Check the defaults file every `interval` seconds and load it when
+    it changes. A valid file is compiled into the `DEFAULTS_CACHE`, which
+    then replaces `Env.DEFAULTS` at once, an invalid one is reported and the application
+    keeps the last valid version. A non positive `interval` disables the
+    watch.\n
+    '''
+    def __init__(self, path:str, interval:float):
+        self.path = path
+        self.interval = interval
+        self._signature = self._stat()
+        self._task = None
+
+    def _stat(self):
+        ''' Identify the current version of the file.\n
+        return (tuple): Modification time and size, `None` if missing.\n
+        '''
+        try:
+            info = os.stat(self.path)
+        except OSError:
+            return(None)
+        return( (info.st_mtime_ns, info.st_size) )
+
+    def reload(self):
+        ''' Load the file and swap it in.\n
+        return `loaded` (bool): If the new version is in use.\n
+        '''
+        try:
+            defaults = load_defaults(self.path)
+        except (OSError, ValueError) as exc:
+            # Also a file still being written
+            print(f"Defaults not reloaded from '{self.path}': {exc}")
+            return(False)
+
+        # The responses are compiled before `Env.DEFAULTS` changes, the
+        # requests never see one version with the responses of the other
+        try:
+            DEFAULTS_CACHE.build(defaults)
+        except Exception as exc:
+            print(f"Defaults not reloaded from '{self.path}': {exc}")
+            return(False)
+
+        print(f"Defaults reloaded from '{self.path}'")
+        return(True)
+
+    def check(self):
+        ''' Reload the file if it changed since the last check.\n
+        return `loaded` (bool): If a new version is in use.\n
+        '''
+        signature = self._stat()
+        if (signature is None or signature==self._signature):
+            return(False)
+        self._signature = signature
+        return(self.reload())
+
+    async def _run(self):
+        ''' Background loop, stops when cancelled.\n
+        '''
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as exc:
+                print(f"Defaults watch error: {exc}")
+
+    def start(self):
+        ''' Start watching, call it from the running event loop.\n
+        '''
+        if (self.interval>0 and self._task is None):
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        ''' Stop watching.\n
+        '''
+        if (self._task is not None):
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+DEFAULTS_STORE = DefaultsStore(Env.DEFAULT_FILE, float(Env.DEFAULTS_POLL))
+'''`DEFAULTS_STORE` (DefaultsStore): The watcher of `Env.DEFAULT_FILE`.'''
@@ -23,6 +23,26 @@ class Enviroment:
     ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv('CONF_ACCESS_TOKEN_EXPIRE_MINUTES', default="30")
     '''`ACCESS_TOKEN_EXPIRE_MINUTES` (int): Number of minutes to expire user access token.'''
 
+    REFRESH_TOKEN_EXPIRE_MINUTES = os.getenv('CONF_REFRESH_TOKEN_EXPIRE_MINUTES', default="720")
+    '''`REFRESH_TOKEN_EXPIRE_MINUTES` (int): Number of minutes a refresh token can renew the
+    access token. Each refresh gives a new one. Default is `"720"`'''
+
+    TOKEN_CACHE_TTL = os.getenv('CONF_TOKEN_CACHE_TTL', default='60')
+    '''`TOKEN_CACHE_TTL` (str): Seconds a validated token is trusted without checking
+    the user again, `0` disables the cache. Default is `"60"`'''
+
+    TOKEN_CACHE_SIZE = os.getenv('CONF_TOKEN_CACHE_SIZE', default='4096')
+    '''`TOKEN_CACHE_SIZE` (str): Maximum number of validated tokens kept by each
+    worker. Default is `"4096"`'''
+
+    PASSWORD_WORKERS = os.getenv('CONF_PASSWORD_WORKERS', default='2')
+    '''`PASSWORD_WORKERS` (str): Number of processes hashing and verifying passwords
+    for each worker. Default is `"2"`'''
+
+    PASSWORD_QUEUE = os.getenv('CONF_PASSWORD_QUEUE', default='32')
+    '''`PASSWORD_QUEUE` (str): Maximum number of passwords waiting in each worker,
+    the logins above it answer `429 Too Many Requests`. Default is `"32"`'''
+
     API_NAME = os.getenv('CONF_API_NAME', default='')
     '''`API_NAME` (str): The name of the API route formated as 
     `/{name}/{version}`. Default is blank `""`.'''
@@ -31,12 +51,57 @@ class Enviroment:
     '''`DATABASE_URL` (str): The SQL URL to find the `sql_app.db` file.
     Default is `"sqlite:///db/sql_app.db"`'''
 
+    DB_POOL_SIZE = os.getenv('CONF_DB_POOL_SIZE', default='5')
+    '''`DB_POOL_SIZE` (str): Connections kept open to the database by each worker.
+    Not used with SQLite. Default is `"5"`'''
+
+    DB_MAX_OVERFLOW = os.getenv('CONF_DB_MAX_OVERFLOW', default='10')
+    '''`DB_MAX_OVERFLOW` (str): Extra connections each worker can open above
+    `DB_POOL_SIZE` when busy. Not used with SQLite. Default is `"10"`'''
+
+    DB_POOL_RECYCLE = os.getenv('CONF_DB_POOL_RECYCLE', default='1800')
+    '''`DB_POOL_RECYCLE` (str): Seconds after which a pooled connection is replaced,
+    `"-1"` to never replace. Not used with SQLite. Default is `"1800"`'''
+
+    DB_POOL_PRE_PING = os.getenv('CONF_DB_POOL_PRE_PING', default='true')
+    '''`DB_POOL_PRE_PING` (str): If `"true"` the pooled connections are tested before
+    use and replaced if the database dropped them. Default is `"true"`'''
+
+    SQLITE_TUNING = os.getenv('CONF_SQLITE_TUNING', default='false')
+    '''`SQLITE_TUNING` (str): If `"true"` the SQLite database runs in WAL mode with
+    the pragmas below, and the writes of the routes and background jobs go through
+    a single writer that commits them in batches. Default is `"false"`'''
+
+    SQLITE_MMAP_SIZE = os.getenv('CONF_SQLITE_MMAP_SIZE', default='268435456')
+    '''`SQLITE_MMAP_SIZE` (str): Bytes of the database file read through memory map
+    when tuned. Default is `"268435456"`'''
+
+    SQLITE_CACHE_SIZE = os.getenv('CONF_SQLITE_CACHE_SIZE', default='-65536')
+    '''`SQLITE_CACHE_SIZE` (str): Page cache of each connection when tuned, negative
+    values are in KiB. Default is `"-65536"`'''
+
+    SQLITE_BUSY_TIMEOUT = os.getenv('CONF_SQLITE_BUSY_TIMEOUT', default='5000')
+    '''`SQLITE_BUSY_TIMEOUT` (str): Milliseconds to wait for a lock before failing
+    with "database is locked" when tuned. Default is `"5000"`'''
+
+    WRITE_BATCH_SIZE = os.getenv('CONF_WRITE_BATCH_SIZE', default='100')
+    '''`WRITE_BATCH_SIZE` (str): Maximum number of writes committed together by the
+    single writer. Default is `"100"`'''
+
+    WRITE_BATCH_WAIT = os.getenv('CONF_WRITE_BATCH_WAIT', default='0.002')
+    '''`WRITE_BATCH_WAIT` (str): Seconds the single writer waits for more writes to
+    join a batch. Default is `"0.002"`'''
+
     DEFAULT_FILE = os.getenv('CONF_DEFAULT_FILE' ,default='config/defaults.json')
     '''`DEFAULT_FILE` (str): Path to a json file with placeholders for FrontEnd. 
     Default is `"../config/defaults.json"`'''
 
     DEFAULTS = json.load(open(DEFAULT_FILE,'r'))
-    '''`DEFAULTS` (json): Loaded Defaults from DEFAULT_FILE'''
+    '''`DEFAULTS` (json): Loaded Defaults from DEFAULT_FILE, replaced when the file changes'''
+
+    DEFAULTS_POLL = os.getenv('CONF_DEFAULTS_POLL', default='2')
+    '''`DEFAULTS_POLL` (str): Seconds between checks of `DEFAULT_FILE` for changes,
+    `0` disables the reload. Default is `"2"`'''
 
     PROMETHEUS_FILEURL = os.getenv('PROMETHEUS_FILEURL', default='./prometheus.yml')
     '''`PROMETHEUS_FILEURL` (str): Local or Remote path to save the modified
@@ -51,4 +116,29 @@ class Enviroment:
     Default is `"fboot/gw_opc.fboot"`'''
 
     OPCUA_TESTER_PORT = os.getenv('OPCUA_TESTER_PORT', default='4900')
-    '''`OPCUA_TESTER_PORT` (str): The OpcUA tester port on forte project. Default is `"4900"`'''
\ No newline at end of file
+    '''`OPCUA_TESTER_PORT` (str): The OpcUA tester port on forte project. Default is `"4900"`'''
+
+    EXPORT_WORKERS = os.getenv('CONF_EXPORT_WORKERS', default='8')
+    '''`EXPORT_WORKERS` (str): Maximum number of collectors exported at the same
+    time. Default is `"8"`'''
+
+    PROBE_TIMEOUT = os.getenv('CONF_PROBE_TIMEOUT', default='0.2')
+    '''`PROBE_TIMEOUT` (str): Seconds to wait for the collector ports when testing
+    their status, for all collectors together. Default is `"0.2"`'''
+
+    MONITOR_INTERVAL = os.getenv('CONF_MONITOR_INTERVAL', default='10')
+    '''`MONITOR_INTERVAL` (str): Seconds between the background tests of the collector
+    ports. `"0"` disables them. Default is `"10"`'''
+
+    MONITOR_QUEUE = os.getenv('CONF_MONITOR_QUEUE', default='100')
+    '''`MONITOR_QUEUE` (str): Status changes kept for each WebSocket client that did
+    not read them yet. When full only the newest status of each collector is kept.
+    Default is `"100"`'''
+
+    SSH_IDLE_TIMEOUT = os.getenv('CONF_SSH_IDLE_TIMEOUT', default='300')
+    '''`SSH_IDLE_TIMEOUT` (str): Seconds an unused SSH session to a collector is kept
+    open for reuse. Default is `"300"`'''
+
+    SSH_CONNECT_TIMEOUT = os.getenv('CONF_SSH_CONNECT_TIMEOUT', default='2')
+    '''`SSH_CONNECT_TIMEOUT` (str): Seconds to wait when opening an SSH session to a
+    collector. Default is `"2"`'''
@@ -6,29 +6,43 @@ Copyright (c) 2017 Aimirim STI.\n
 * fastapi
 * sqlalchemy
 * pyfboot
-* fsspec
+* paramiko
 * pyyaml
 '''
 
 # Import system libs
 from fastapi import Depends, HTTPException
 from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
 from pyfboot.gateway import MonoGatewayProject
 from pydantic.utils import deep_update
-import fsspec
+import threading
+import tempfile
+import hashlib
+import time
+import copy
+import json
 import yaml
 import os
 
 # Import custom libs
-from ..database import get_db
+from . import schemas
+from ..database import get_db, SessionManager
 from ..env import Enviroment as Env
 from ..user_auth import routes as usr_routes
-from ..crud.datapoint import Tdatapoint
 from ..crud.datasource import Tdatasource
 from ..crud.collector import Tcollector
+from ..ssh_pool import collector_session, open_file, split_url
+from ..write_queue import run_write
 
 #######################################
 
+# NOTE: With the default `PROMETHEUS_FILEURL` all collectors share
+#       the same local Prometheus file, so concurrent exports and
+#       collector changes must not interleave its read and write.
+#       Use `_sync_prometheus_file` instead of taking it directly.
+_prometheus_lock = threading.Lock()
+
 # --------------------
 def _update_prometheus_conf(old,db_col):
     ''' Load the existing Prometheus configuration and update it.\n
@@ -37,12 +51,12 @@ def _update_prometheus_conf(old,db_col):
     this collector.\n
     '''
 
-    prometheus_conf = Env.DEFAULTS['Prometheus']
+    # Work on a copy, the defaults must not change
+    prometheus_conf = copy.deepcopy(Env.DEFAULTS['Prometheus'])
     
     # Read existing Prometheus File
     try:
-        with fsspec.open(Env.PROMETHEUS_FILEURL, 'r', host=db_col.ip, 
-            port=int(db_col.ssh_port), username=db_col.ssh_user, password=db_col.ssh_pass) as fid:
+        with open_file(db_col, Env.PROMETHEUS_FILEURL, 'r') as fid:
             prometheus_conf_r = yaml.safe_load(fid)
         prometheus_conf = deep_update(prometheus_conf,prometheus_conf_r)
     except:
@@ -78,12 +92,12 @@ def _delete_prometheus_conf(db_col):
     this collector.\n
     '''
 
-    prometheus_conf = Env.DEFAULTS['Prometheus']
+    # Work on a copy, the defaults must not change
+    prometheus_conf = copy.deepcopy(Env.DEFAULTS['Prometheus'])
 
     # Read existing Prometheus File
     try:
-        with fsspec.open(Env.PROMETHEUS_FILEURL, 'r', host=db_col.ip, 
-            port=int(db_col.ssh_port), username=db_col.ssh_user, password=db_col.ssh_pass) as fid:
+        with open_file(db_col, Env.PROMETHEUS_FILEURL, 'r') as fid:
             prometheus_conf_r = yaml.safe_load(fid)
         prometheus_conf = deep_update(prometheus_conf,prometheus_conf_r)
     except:
@@ -104,89 +118,181 @@ def _delete_prometheus_conf(db_col):
 
 # --------------------
 def _write_prometheus_file(db_col, prometheus_conf):
-    ''' Description \n
-    `` (): \n
-    return `` (): \n
+    ''' Write the Prometheus configuration file.\n
+    `db_col` (schema.collector): The collector information.\n
+    `prometheus_conf` (dict): The `prometheus.yml` content.\n
     '''
-    with fsspec.open(Env.PROMETHEUS_FILEURL, 'w', encoding = "utf-8", host=db_col.ip, 
-        port=int(db_col.ssh_port), username=db_col.ssh_user, password=db_col.ssh_pass) as fid:
+    with open_file(db_col, Env.PROMETHEUS_FILEURL, 'w') as fid:
         p_dump = yaml.dump(prometheus_conf, allow_unicode=True, encoding=None, default_flow_style=False)
         fid.write( p_dump )
 # --------------------
 
 # --------------------
-def export_gateway(id:int,db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
-    ''' Export active database entries as a Forte OPC-UA gateway fboot file.\n
-    return `res` (JSONResponse): A `bool` automatically parser into
-    a HTTP_OK response.\n
+def _sync_prometheus_file(db_col, old=None, remove:bool=False):
+    ''' Read, change and write the Prometheus file as a single step, so the
+    exports and the collector routes do not overwrite each other.\n
+    `db_col` (schema.collector): The collector information.\n
+    `old` (schema.collector): The collector before the change, `None` if new.\n
+    `remove` (bool): Remove the collector instead of updating it.\n
     '''
-    res = False
+    with _prometheus_lock:
+        if remove:
+            prometheus_conf = _delete_prometheus_conf(db_col)
+        else:
+            prometheus_conf = _update_prometheus_conf(old,db_col)
+        _write_prometheus_file(db_col, prometheus_conf)
+# --------------------
 
-    val_col = Tcollector.get_by_id(db,id)
-    if val_col==None:
-        raise HTTPException(status_code=404, detail=f"Error searching for Collector to Export. Invalid ID.")
-    
+# --------------------
+def _write_fboot_file(db_col, prj_4diac:MonoGatewayProject, fileurl:str):
+    ''' Write the Forte project file. Remote files are built locally and
+    sent through the pooled SFTP channel of the collector.\n
+    `db_col` (schema.collector): The collector information.\n
+    `prj_4diac` (MonoGatewayProject): The gateway project.\n
+    `fileurl` (str): Local path or `ssh://` url of the fboot file.\n
+    '''
+    remote, path = split_url(fileurl)
+    if not remote:
+        prj_4diac.write_fboot(path, overwrite=True)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        local_path = os.path.join(tmp_dir, os.path.basename(path))
+        prj_4diac.write_fboot(local_path, overwrite=True)
+        with collector_session(db_col) as sess:
+            sess.sftp.put(local_path, path)
+# --------------------
+
+# --------------------
+def _export_digest(parsed_col, export_list:list):
+    ''' Compute a digest of everything that is written in the collector.
+    Two exports with the same digest produce the same files.\n
+    `parsed_col` (schemas.collector): The collector information.\n
+    `export_list` (list): The result of `Tdatasource.get_export_tree_from_collector`.\n
+    return `digest` (str): The hexadecimal SHA-256 digest.\n
+    '''
+    content = {
+        # The validation flag changes without changing the exported files
+        'collector': parsed_col.dict(exclude={'valid'}),
+        'datasources': [ {'datasource':ds.dict(), 'datapoints':[ dp.dict() for dp in dp_list ]}
+            for ds, dp_list in export_list ],
+        'prometheus': Env.DEFAULTS['Prometheus'],
+        'files': [ Env.PROMETHEUS_FILEURL, Env.EXPORTER_CONFIG_LOCATION, Env.GATEWAY_FBOOT_LOCATION ],
+    }
+    dump = json.dumps(content, sort_keys=True, default=str)
+    digest = hashlib.sha256(dump.encode('utf-8')).hexdigest()
+
+    return(digest)
+# --------------------
+
+# --------------------
+def _export_collector(db:Session, val_col, force:bool=False):
+    ''' Build and write the Forte project, the OPC-UA exporter and the
+    Prometheus configurations of a collector. Errors are raised.\n
+    `db` (Session): Database access session.\n
+    `val_col` (models.Collector): The collector table item.\n
+    `force` (bool): Write the files even if nothing changed.\n
+    return `written` (bool): `False` when nothing changed since the last
+    successful export and the files were not written.\n
+    '''
     parsed_col = Tcollector._parse_collector(val_col)
 
+    # Get the content to export and check if it changed
+    export_list = Tdatasource.get_export_tree_from_collector(db, val_col.id)
+    digest = _export_digest(parsed_col, export_list)
+    if (not force and digest==Tcollector.get_export_digest(db, val_col.id)):
+        return(False)
+
     # Create the 4diac Gateway Project
     prj_4diac = MonoGatewayProject(parsed_col.update_period*1000)
 
     # Create OPCUA configuration file
     opcua_conf = { 'endPoint':f'opc.tcp://forte_server:4840', 'nodes':[] }
 
-    try:
-        # Get active datasources
-        ds_list = Tdatasource.get_datasources_active(db)
-        for ds in ds_list:
-            # Filter datasources for the ones in this collector
-            if ds.collector_id!=val_col.id:
-                continue
-            # Filter datasources for confirmed ones
-            if ds.pending:
-                continue
-            
-            # Get the datapoints from this datasource
-            dp_list = Tdatapoint.get_datapoints_from_datasource(db,ds.name)
-            for dp in dp_list:
-                
-                # Filter datapoints for active ones
-                if dp.active and not dp.pending:
-                    # Get specific informations
-                    dp = Tdatapoint._get_datapoint_implementation(db,dp.access.name,dp.name)
-                    dp = Tdatapoint._parse_datapoint(dp)
-                    # Create communication blocks and associate them with an OPC variable
-                    comFB = prj_4diac.build_comm_block(ds.dict(),dp.dict())
-                    prj_4diac.addVariable(dp.name,comFB)
-                    # Create corresponding Node on OPCUA
-                    opcua_conf['nodes'].append({
-                        'nodeName':f'ns={1};s={dp.name}',
-                        'metricName':f'{dp.name}',
-                        'metricHelp':f'{dp.description}'
-                    })
-
-        # Insert one more node with the pre-defined observability variable
-        opcua_conf['nodes'].append({
-            'nodeName':'ns=1;s=_ForteCycleTime',
-            'metricName':'_ForteCycleTime',
-            'metricHelp':'Tempo de leitura das variavies do Forte'
-        })
-
-        # Get the updated prometheus configuration
-        prometheus_conf = _update_prometheus_conf(parsed_col,val_col)
-        
+    for ds, dp_list in export_list:
+        for dp in dp_list:
+            # Create communication blocks and associate them with an OPC variable
+            comFB = prj_4diac.build_comm_block(ds.dict(),dp.dict())
+            prj_4diac.addVariable(dp.name,comFB)
+            # Create corresponding Node on OPCUA
+            opcua_conf['nodes'].append({
+                'nodeName':f'ns={1};s={dp.name}',
+                'metricName':f'{dp.name}',
+                'metricHelp':f'{dp.description}'
+            })
+
+    # Insert one more node with the pre-defined observability variable
+    opcua_conf['nodes'].append({
+        'nodeName':'ns=1;s=_ForteCycleTime',
+        'metricName':'_ForteCycleTime',
+        'metricHelp':'Tempo de leitura das variavies do Forte'
+    })
+
+    # Every file access below shares one SSH session
+    with collector_session(val_col):
         # Write Forte project remote
         fboot_fileurl = os.path.join('ssh://'+parsed_col.prj_path,Env.GATEWAY_FBOOT_LOCATION)
-        prj_4diac.write_fboot(fboot_fileurl, overwrite=True,
-            host=val_col.ip, port=int(val_col.ssh_port),
-            username=val_col.ssh_user, password=val_col.ssh_pass)
+        _write_fboot_file(val_col, prj_4diac, fboot_fileurl)
         # Write OPC configuration remote
         opcua_fileurl = os.path.join('ssh://'+parsed_col.prj_path,Env.EXPORTER_CONFIG_LOCATION)
-        with fsspec.open(opcua_fileurl, "w", encoding = "utf-8", host=val_col.ip, 
-            port=int(val_col.ssh_port), username=val_col.ssh_user, password=val_col.ssh_pass) as fid:
+        with open_file(val_col, opcua_fileurl, 'w') as fid:
             dump =  yaml.dump(opcua_conf, allow_unicode=True, encoding=None)
-            fid.write( dump )        
-        # Write Prometheus File        
-        _write_prometheus_file(val_col, prometheus_conf)
+            fid.write( dump )
+        # Update the Prometheus File
+        _sync_prometheus_file(val_col, parsed_col)
+
+    # Remember what was exported
+    run_write(db, Tcollector.set_export_digest, val_col.id, digest)
+
+    return(True)
+# --------------------
+
+# --------------------
+def _export_worker(id:int, force:bool):
+    ''' Export one collector with its own database session, used by the
+    parallel export. Errors are reported in the result.\n
+    `id` (int): The Collector ID.\n
+    `force` (bool): Write the files even if nothing changed.\n
+    return `result` (schemas.exportResult): The export outcome.\n
+    '''
+    start = time.monotonic()
+    result = schemas.exportResult(id=id, success=False, written=False, detail='', elapsed=0)
+
+    try:
+        with SessionManager() as db:
+            val_col = Tcollector.get_by_id(db,id)
+            if val_col==None:
+                result.detail = 'Error searching for Collector to Export. Invalid ID.'
+            else:
+                result.written = _export_collector(db, val_col, force)
+                result.success = True
+    except Exception as exc:
+        msg = str(exc).split('\n')[0]
+        result.detail = f'Export Error: "{msg}"'
+
+    result.elapsed = time.monotonic()-start
+
+    return(result)
+# --------------------
+
+# --------------------
+def export_gateway(id:int, force:bool=False, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Export active database entries as a Forte OPC-UA gateway fboot file.
+    When nothing changed since the last successful export of this collector
+    the files are not written again.\n
+    `id` (int): The Collector ID.\n
+    `force` (bool): Write the files even if nothing changed. Default `False`.\n
+    return `res` (JSONResponse): A `bool` automatically parser into
+    a HTTP_OK response.\n
+    '''
+    res = False
+
+    val_col = Tcollector.get_by_id(db,id)
+    if val_col==None:
+        raise HTTPException(status_code=404, detail=f"Error searching for Collector to Export. Invalid ID.")
+
+    try:
+        _ = _export_collector(db, val_col, force)
 
         # Return Status
         res = True
@@ -198,3 +304,25 @@ def export_gateway(id:int,db:Session=Depends(get_db), usr:str=Depends(usr_routes
 
     return(res)
 # --------------------
+
+# --------------------
+def export_collectors(export:schemas.exportRequest, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Export a set of collectors at the same time. A collector that fails
+    does not stop the others.\n
+    `export` (schemas.exportRequest): The Collector IDs, all of them when not
+    informed, and the `force` flag of the single export route.\n
+    return `results` (JSONResponse): A list of `schemas.exportResult` automatically
+    parsed into a HTTP_OK response.\n
+    '''
+    ids = export.ids
+    if (ids is None):
+        ids = [ col.id for col in Tcollector.get_all(db) ]
+    if (len(ids)==0):
+        return([])
+
+    workers = min(int(Env.EXPORT_WORKERS), len(ids))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_export_worker, ids, [export.force]*len(ids)))
+
+    return(results)
+# --------------------
@@ -0,0 +1,24 @@
+'''
+This module contais the schemas
+expected in HTTP responses.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pydantic
+'''
+
+# Import system libs
+from pydantic import BaseModel
+from typing import List, Union
+
+#######################################
+
+class exportRequest(BaseModel):
+    ids: Union[List[int],None] = None
+    force: bool = False
+
+class exportResult(BaseModel):
+    id: int
+    success: bool
+    written: bool
+    detail: str
+    elapsed: float
@@ -10,10 +10,12 @@ Copyright (c) 2017 Aimirim STI.\n
 from typing import Dict, List
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.exc import IntegrityError
 
 # Import custom libs
 from . import AppInfo
 from . import database
+from . import migrations
 from .env import Enviroment as Env
 from .crud import Tuser
 from .database import SessionManager, engine
@@ -25,15 +27,21 @@ from .plc_datapoint import schemas as dp_schemas
 from .plc_datapoint import routes as dp_routes
 from .collector import schemas as col_schemas
 from .collector import routes as col_routes
+from .collector.monitor import HEALTH_MONITOR
+from .user_auth.password_pool import PASSWORD_POOL
+from .defaults_cache import DEFAULTS_CACHE
+from .defaults_store import DEFAULTS_STORE
+from .ssh_pool import SSH_POOL
+from .fboot_gen import schemas as fboot_schemas
 from .fboot_gen import routes as fboot_routes
 from .com_test import schemas as com_schemas
 from .com_test import routes as com_routes
+from .csv_import import schemas as imp_schemas
+from .csv_import import routes as imp_routes
 
 
 #######################################
 
-database.Base.metadata.create_all(bind=engine)
-
 app = FastAPI(root_path=f"{Env.API_NAME}", **AppInfo.__dict__)
 
 app.add_middleware(
@@ -44,12 +52,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-with SessionManager() as db:
+# Several workers can be starting at the same time
+with database.startup_lock(), SessionManager() as db:
+    migrations.upgrade(engine)
+    database.create_tables()
     # Check for users and create a default one if empty
     if (len(Tuser.get_all(db))==0):
         admin_usr = auth_schemas.UserCreate(name='admin', password='admin',
             change_password=True, is_admin=True)
-        Tuser.create(db,admin_usr)
+        try:
+            Tuser.create(db,admin_usr)
+        except IntegrityError:
+            # Other worker created it first
+            db.rollback()
+
+# Collectors health in background
+app.add_event_handler("startup", HEALTH_MONITOR.start)
+app.add_event_handler("shutdown", HEALTH_MONITOR.stop)
+
+# Password hashing out of the request threads
+app.add_event_handler("startup", PASSWORD_POOL.start)
+app.add_event_handler("shutdown", PASSWORD_POOL.stop)
+
+# Defaults responses compiled once, and again when the file changes
+app.add_event_handler("startup", DEFAULTS_CACHE.build)
+app.add_event_handler("startup", DEFAULTS_STORE.start)
+app.add_event_handler("shutdown", DEFAULTS_STORE.stop)
+
+# Pooled SSH sessions to the collectors
+app.add_event_handler("shutdown", SSH_POOL.close_all)
 
 # Application Routes 
 
@@ -60,6 +91,9 @@ app.add_api_route("/login",
 app.add_api_route("/validate",
     methods=["GET"], response_model=bool,
     endpoint=auth_routes.check_token)
+app.add_api_route("/token/refresh",
+    methods=["POST"], response_model=auth_schemas.TokenRefresh,
+    endpoint=auth_routes.refresh_token)
 
 ### Defaults
 app.add_api_route("/protocol_defaults",
@@ -99,6 +133,10 @@ app.add_api_route("/collector/{id}",
     methods=["DELETE"], response_model=Dict[int,bool],
     endpoint=col_routes.del_collector)
 
+app.add_api_route("/collector/{id}/tree",
+    methods=["DELETE"], response_model=col_schemas.collectorRemoved,
+    endpoint=col_routes.del_collector_tree)
+
 app.add_api_route("/collector",
     methods=["POST"], response_model=col_schemas.collector,
     endpoint=col_routes.new_collector)
@@ -107,6 +145,9 @@ app.add_api_route("/collectors",
     methods=["GET"], response_model=List[col_schemas.collector],
     endpoint=col_routes.get_all_collectors)
 
+app.add_api_websocket_route("/collectors/status/ws",
+    endpoint=col_routes.watch_collectors_status)
+
 app.add_api_route("/collectors/status",
     methods=["GET"], response_model=List[col_schemas.collectorStatus],
     endpoint=col_routes.check_collectors_status)
@@ -132,6 +173,14 @@ app.add_api_route("/datasource/{ds_name}={active}",
     methods=["PUT"], response_model=Dict[str,bool],
     endpoint=ds_routes.change_datasource_active_status)
 
+app.add_api_route("/datasources/bulk",
+    methods=["POST"], response_model=ds_schemas.bulkResult,
+    endpoint=ds_routes.create_datasources)
+
+app.add_api_route("/datasources/bulk",
+    methods=["PUT"], response_model=ds_schemas.bulkUpdateResult,
+    endpoint=ds_routes.update_datasources)
+
 app.add_api_route("/datasources",
     methods=["GET"], response_model=List[ds_schemas.dataSource],
     endpoint=ds_routes.get_datasources)
@@ -140,6 +189,13 @@ app.add_api_route("/datasources/range/{ini}-{end}",
     methods=["GET"], response_model=List[ds_schemas.dataSource],
     endpoint=ds_routes.get_datasources_by_range)
 
+app.add_api_route("/datasources/stream",
+    methods=["GET"], endpoint=ds_routes.stream_datasources)
+
+app.add_api_route("/datasources/page",
+    methods=["GET"], response_model=ds_schemas.dataSourcePage,
+    endpoint=ds_routes.get_datasources_page)
+
 app.add_api_route("/datasources/pending",
     methods=["GET"], response_model=List[ds_schemas.dataSource],
     endpoint=ds_routes.get_datasources_pending)
@@ -152,6 +208,14 @@ app.add_api_route("/datasource/{ds_name}/confirm",
     methods=["PUT"], response_model=Dict[str,bool],
     endpoint=ds_routes.confirm_datasources)
 
+app.add_api_route("/datasources/confirm",
+    methods=["PUT"], response_model=Dict[str,bool],
+    endpoint=ds_routes.confirm_datasource_selection)
+
+app.add_api_route("/datasources/active={active}",
+    methods=["PUT"], response_model=Dict[str,bool],
+    endpoint=ds_routes.change_datasources_active_status)
+
 ### DataPoints
 app.add_api_route("/datapoint",
     methods=["POST"], response_model=dp_schemas.dataPoint,
@@ -173,6 +237,14 @@ app.add_api_route("/datapoint/{dp_name}={active}",
     methods=["PUT"], response_model=Dict[str,bool],
     endpoint=dp_routes.change_datapoint_active_status)
 
+app.add_api_route("/datapoints/bulk",
+    methods=["POST"], response_model=ds_schemas.bulkResult,
+    endpoint=dp_routes.create_datapoints)
+
+app.add_api_route("/datapoints/bulk",
+    methods=["PUT"], response_model=ds_schemas.bulkUpdateResult,
+    endpoint=dp_routes.update_datapoints)
+
 app.add_api_route("/datapoints",
     methods=["GET"], response_model=List[dp_schemas.dataPoint],
     endpoint=dp_routes.get_datapoints)
@@ -181,6 +253,13 @@ app.add_api_route("/datapoints/range/{ini}-{end}",
     methods=["GET"], response_model=List[dp_schemas.dataPoint],
     endpoint=dp_routes.get_datapoints_by_range)
 
+app.add_api_route("/datapoints/stream",
+    methods=["GET"], endpoint=dp_routes.stream_datapoints)
+
+app.add_api_route("/datapoints/page",
+    methods=["GET"], response_model=dp_schemas.dataPointPage,
+    endpoint=dp_routes.get_datapoints_page)
+
 app.add_api_route("/datapoints/pending",
     methods=["GET"], response_model=List[dp_schemas.dataPoint],
     endpoint=dp_routes.get_datapoints_pending)
@@ -193,11 +272,32 @@ app.add_api_route("/datapoint/{dp_name}/confirm",
     methods=["PUT"], response_model=Dict[str,bool],
     endpoint=dp_routes.confirm_datapoints)
 
+app.add_api_route("/datapoints/confirm",
+    methods=["PUT"], response_model=Dict[str,bool],
+    endpoint=dp_routes.confirm_datapoint_selection)
+
+app.add_api_route("/datapoints/active={active}",
+    methods=["PUT"], response_model=Dict[str,bool],
+    endpoint=dp_routes.change_datapoints_active_status)
+
 ### ForteGateway
 app.add_api_route("/export/collector/{id}",
     methods=["POST"], response_model=bool,
     endpoint=fboot_routes.export_gateway)
 
+app.add_api_route("/export/collectors",
+    methods=["POST"], response_model=List[fboot_schemas.exportResult],
+    endpoint=fboot_routes.export_collectors)
+
+### Import
+app.add_api_route("/import/csv",
+    methods=["POST"], response_model=imp_schemas.importStatus,
+    endpoint=imp_routes.import_csv)
+
+app.add_api_route("/import/{id}",
+    methods=["GET"], response_model=imp_schemas.importStatus,
+    endpoint=imp_routes.get_import_status)
+
 ### Communication Tests
 app.add_api_route("/test/{dp_name}",
     methods=["POST"], response_model=com_schemas.comTest,
@@ -0,0 +1,152 @@
+'''
+This module holds the versioned changes
+of the database schema.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+from sqlalchemy import Column, Integer, MetaData, String, Table, cast, inspect, or_, select, update
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+# Import custom libs
+from . import models
+
+#######################################
+
+# NOTE: Every change of the models in a table that already exists
+#       needs a migration here, `create_all` only creates the
+#       missing tables. Append new migrations to `MIGRATIONS` and
+#       never change the ones already released.
+
+_meta = MetaData()
+
+version_table = Table('schema_version', _meta,
+    Column('version', Integer, nullable=False),
+)
+'''`version_table` (Table): Holds the version of the database schema.'''
+
+# --------------------
+def _create_indexes(conn, table:Table, names:list):
+    ''' Create indexes declared in the models if they do not exist.\n
+    `conn` (Connection): Database connection inside the migration transaction.\n
+    `table` (Table): The table of the indexes.\n
+    `names` (list): Names of the indexes to create.\n
+    '''
+    for index in table.indexes:
+        if (index.name in names):
+            index.create(conn, checkfirst=True)
+# --------------------
+
+# --------------------
+def _v1_access_indexes(conn):
+    ''' Index the columns used to search datapoints by datasource,
+    datasources by collector, protocols by datasource, and the
+    active and pending listings.\n
+    '''
+    _create_indexes(conn, models.DataPoint.__table__,
+        ['ix_datapoints_datasource', 'ix_datapoints_active', 'ix_datapoints_pending'])
+    _create_indexes(conn, models.DataSource.__table__,
+        ['ix_datasources_collector', 'ix_datasources_active', 'ix_datasources_pending'])
+    _create_indexes(conn, models.Protocol.__table__,
+        ['ix_protocols_datasource'])
+# --------------------
+
+# --------------------
+def _rebuild_table(conn, table:Table, where=None):
+    ''' Recreate a SQLite table from its model, keeping the rows. SQLite can
+    not change the type or the constraints of existing columns.\n
+    `conn` (Connection): Database connection inside the migration transaction.\n
+    `table` (Table): The model of the table.\n
+    `where` (function): Receives the old table and returns the condition of
+    the rows to keep. Optional.\n
+    '''
+    insp = inspect(conn)
+    old_cols = set([ col['name'] for col in insp.get_columns(table.name) ])
+    old = Table(table.name, MetaData(), *[ Column(name) for name in old_cols ])
+
+    for index in insp.get_indexes(table.name):
+        conn.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+
+    # Copy to the metadata of the referenced tables
+    meta = MetaData()
+    for tbl in table.metadata.sorted_tables:
+        tbl.to_metadata(meta)
+    new = table.to_metadata(meta, name=f'_new_{table.name}')
+    new.indexes.clear()
+    new.create(conn)
+
+    cols = [ col for col in new.columns if col.name in old_cols ]
+    qry = select(*[ cast(old.c[col.name], col.type) for col in cols ])
+    if (where is not None):
+        qry = qry.where(where(old))
+    conn.execute(new.insert().from_select([ col.name for col in cols ], qry))
+
+    conn.exec_driver_sql(f'DROP TABLE "{table.name}"')
+    conn.exec_driver_sql(f'ALTER TABLE "{new.name}" RENAME TO "{table.name}"')
+    for index in table.indexes:
+        index.create(conn)
+# --------------------
+
+# --------------------
+def _v2_datasource_keys(conn):
+    ''' Make `datasource_name` of datapoints and protocols a String, like
+    the datasource name, and delete them with their datasource. Rows
+    pointing to missing datasources are dropped.\n
+    '''
+    # NOTE: Other databases refuse to create the Integer column
+    #       referencing a String key, so only SQLite has it.
+    if (conn.dialect.name!='sqlite'):
+        return
+
+    ds_names = select(models.DataSource.__table__.c.name)
+    _rebuild_table(conn, models.DataPoint.__table__,
+        lambda old: or_(old.c.datasource_name==None, cast(old.c.datasource_name, String).in_(ds_names)))
+    # Protocols were left without datasource by the old deletes
+    _rebuild_table(conn, models.Protocol.__table__,
+        lambda old: cast(old.c.datasource_name, String).in_(ds_names))
+# --------------------
+
+MIGRATIONS = [
+    (1, 'Indexes for the access paths', _v1_access_indexes),
+    (2, 'String datasource keys deleted in cascade', _v2_datasource_keys),
+]
+'''`MIGRATIONS` (list): The version, description and function of each change.'''
+
+LAST_VERSION = MIGRATIONS[-1][0]
+'''`LAST_VERSION` (int): Version of the schema described by the models.'''
+
+# --------------------
+def _upgrade(engine):
+    ''' Apply the missing migrations in a single transaction.\n
+    `engine` (Engine): The database engine.\n
+    '''
+    with engine.begin() as conn:
+        insp = inspect(conn)
+        if (not insp.has_table(version_table.name)):
+            # Without tables `create_all` builds them in the last version
+            fresh = not insp.has_table(models.DataPoint.__tablename__)
+            version_table.create(conn)
+            conn.execute(version_table.insert().values(version=LAST_VERSION if fresh else 0))
+
+        current = conn.execute(select(version_table.c.version)).scalar()
+        for version, description, migrate in MIGRATIONS:
+            if (version>current):
+                migrate(conn)
+                conn.execute(update(version_table).values(version=version))
+                print(f"Database migrated to version {version}: {description}")
+# --------------------
+
+# --------------------
+def upgrade(engine):
+    ''' Bring an existing database to the schema of the models. Run it
+    before `database.create_tables` and inside `database.startup_lock`.\n
+    `engine` (Engine): The database engine.\n
+    '''
+    try:
+        _upgrade(engine)
+    except (OperationalError, ProgrammingError):
+        # Another worker was doing the same, it is done now
+        _upgrade(engine)
+# --------------------
@@ -7,7 +7,7 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from sqlalchemy import Column, ForeignKey, Boolean, Integer, String
+from sqlalchemy import Column, ForeignKey, Index, Boolean, DateTime, Integer, String
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import relationship
 
@@ -42,6 +42,28 @@ class Collector(Base):
     timeout = Column(Integer)
     # Other tables
     datasources = relationship("DataSource", back_populates="collector")# 1 to N
+    export_state = relationship("ExportState", uselist=False)# 1 to 1
+
+class ExportState(Base):
+    __tablename__ = "export_state"
+
+    # Items
+    collector_id = Column(Integer, ForeignKey("collector.id"), primary_key=True)
+    digest = Column(String, nullable=False)
+    exported_at = Column(DateTime)
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    # Items
+    id = Column(String, primary_key=True)
+    state = Column(String, nullable=False)
+    rows = Column(Integer, default=0)
+    datasources = Column(Integer, default=0)
+    datapoints = Column(Integer, default=0)
+    errors = Column(Integer, default=0)
+    messages = Column(String, default='[]')# JSON list
+    created_at = Column(DateTime, index=True)
     
 # --------------------
 class DataPoint(Base):
@@ -56,9 +78,15 @@ class DataPoint(Base):
     pending = Column(Boolean, default=True)
     # Other tables
     datasource = relationship("DataSource", back_populates="datapoints")# N to 1
-    datasource_name = Column(Integer, ForeignKey("datasources.name"))
+    datasource_name = Column(String, ForeignKey("datasources.name", ondelete="CASCADE"))
     # Allow inheritance
     __mapper_args__ = {'polymorphic_on': access}
+    # Access paths
+    __table_args__ = (
+        Index('ix_datapoints_datasource', 'datasource_name', 'active', 'pending'),
+        Index('ix_datapoints_active', 'active', 'name'),
+        Index('ix_datapoints_pending', 'pending', 'name'),
+    )
 # --------------------
 
 # --------------------
@@ -74,10 +102,20 @@ class DataSource(Base):
     active = Column(Boolean, default=True)
     pending = Column(Boolean, default=True)
     # Other tables
-    protocol = relationship("Protocol", uselist=False)# 1 to 1
-    datapoints = relationship("DataPoint", back_populates="datasource")# 1 to N
+    # NOTE: The database removes the protocol and datapoints of a
+    #       deleted datasource, they are not loaded to be deleted.
+    protocol = relationship("Protocol", uselist=False,
+        cascade="all, delete", passive_deletes=True)# 1 to 1
+    datapoints = relationship("DataPoint", back_populates="datasource",
+        cascade="all, delete", passive_deletes=True)# 1 to N
     collector = relationship("Collector", back_populates="datasources")# N to 1
     collector_id = Column(Integer, ForeignKey("collector.id"))
+    # Access paths
+    __table_args__ = (
+        Index('ix_datasources_collector', 'collector_id', 'active', 'pending'),
+        Index('ix_datasources_active', 'active', 'name'),
+        Index('ix_datasources_pending', 'pending', 'name'),
+    )
 # --------------------
 
 # --------------------
@@ -88,9 +126,13 @@ class Protocol(Base):
     name = Column(String, nullable=False)
     # Other tables
     datasource = relationship("DataSource", back_populates="protocol")# 1 to 1
-    datasource_name = Column(Integer, ForeignKey("datasources.name"))
+    datasource_name = Column(String, ForeignKey("datasources.name", ondelete="CASCADE"))
     # Allow inheritance
     __mapper_args__ = {'polymorphic_on': name,'polymorphic_identity' : 'protocol'}
+    # Access paths
+    __table_args__ = (
+        Index('ix_protocols_datasource', 'datasource_name'),
+    )
 # --------------------
 
 # --------------------
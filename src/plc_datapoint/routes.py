@@ -8,13 +8,17 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from fastapi import Depends, HTTPException
+from fastapi import Depends, Header, HTTPException
+from typing import List, Union
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Import custom libs
 from . import schemas
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..crud import Tdatapoint
+from ..defaults_cache import DEFAULTS_CACHE
+from ..streaming import STREAM_FORMATS, stream_models
 from ..user_auth import routes as usr_routes
 
 
@@ -22,13 +26,13 @@ from ..user_auth import routes as usr_routes
 
 
 # --------------------
-def get_datapoint_defaults(prot_name:str, usr:str=Depends(usr_routes._check_valid_token)):
+async def get_datapoint_defaults(prot_name:str, if_none_match:Union[str,None]=Header(default=None), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get the list of DataPoint information to use as placeholders.\n
     `prot_name` (str): Protocol name to ger defauts from.\n
-    return `val_dict` (JSONResponse): A `schemas.dataPointInfo` object
-    automatically parsed into an HTTP_OK response.\n
+    return `val_dict` (Response): A `schemas.dataPointInfo` object already
+    serialized, or HTTP_304 if it matches `If-None-Match`.\n
     '''
-    val_dict = Tdatapoint.get_datapoint_placeholder(prot_name)
+    val_dict = DEFAULTS_CACHE.response(f'datapoint/{prot_name}', if_none_match)
     
     if (val_dict is None):
         m_name = f"datapoint information for Protocol: '{prot_name}'"
@@ -38,14 +42,14 @@ def get_datapoint_defaults(prot_name:str, usr:str=Depends(usr_routes._check_vali
 # --------------------
 
 # --------------------
-def create_datapoint(datapoint:schemas.dataPointInfo, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def create_datapoint(datapoint:schemas.dataPointInfo, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Create an entry at in database to save this DataPoint.\n
     `datapoint` (schemas.dataPointInfo): DataPoint informations.\n
     return `val_dp` (JSONResponse): A `schemas.dataPoint` automatically parsed into
     a HTTP_OK response.\n
     '''
     try:
-        val_dp = Tdatapoint.create_datapoint(db,datapoint)
+        val_dp = await Tdatapoint.aio.create_datapoint(db,datapoint)
     except Exception as exc:
         msg = str(exc).split('\n')[0]
         raise HTTPException(status_code=520, detail=msg)
@@ -58,13 +62,53 @@ def create_datapoint(datapoint:schemas.dataPointInfo, db:Session=Depends(get_db)
 # --------------------
 
 # --------------------
-def get_datapoint_by_name(dp_name:str, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def create_datapoints(datapoints:List[schemas.dataPointInfo], db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Create a batch of entries in database in a single transaction.\n
+    `datapoints` (list): List of `schemas.dataPointInfo`.\n
+    return `val_dp` (JSONResponse): A `bulkResult` with the created names and the
+    error of each rejected item automatically parsed into a HTTP_OK response.\n
+    '''
+    try:
+        val_dp = await Tdatapoint.aio.create_datapoints(db,datapoints)
+    except Exception as exc:
+        msg = str(exc).split('\n')[0]
+        raise HTTPException(status_code=520, detail=msg)
+
+    if (val_dp is None):
+        m_name = f"Data Points"
+        raise HTTPException(status_code=404, detail=f"Error creating {m_name}.")
+
+    return(val_dp)
+# --------------------
+
+# --------------------
+async def update_datapoints(datapoints:List[schemas.dataPointInfo], db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Update a batch of entries in database in a single transaction.\n
+    `datapoints` (list): List of `schemas.dataPointInfo`.\n
+    return `val_dp` (JSONResponse): A `bulkUpdateResult` with the updated names and the
+    error of each rejected item automatically parsed into a HTTP_OK response.\n
+    '''
+    try:
+        val_dp = await Tdatapoint.aio.update_datapoints(db,datapoints)
+    except Exception as exc:
+        msg = str(exc).split('\n')[0]
+        raise HTTPException(status_code=520, detail=msg)
+
+    if (val_dp is None):
+        m_name = f"Data Points"
+        raise HTTPException(status_code=404, detail=f"Error updating {m_name}.")
+
+    return(val_dp)
+# --------------------
+
+# --------------------
+async def get_datapoint_by_name(dp_name:str, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Search an entry in database with provided name.\n
     `dp_name` (str): DataPoint name.\n
     return `val_dp` (JSONResponse): A `schemas.dataPoint` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_dp = Tdatapoint.get_datapoint_by_name(db, dp_name)
+    val_dp = await Tdatapoint.aio.get_datapoint_by_name(db, dp_name)
 
     if (val_dp is None):
         m_name = f"Data Point '{dp_name}'"
@@ -74,13 +118,13 @@ def get_datapoint_by_name(dp_name:str, db:Session=Depends(get_db), usr:str=Depen
 # --------------------
 
 # --------------------
-def update_datapoint(datapoint:schemas.dataPointInfo, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def update_datapoint(datapoint:schemas.dataPointInfo, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Search an entry in database with provided name and update it's informations.\n
     `datapoint` (schemas.dataPointInfo): DataPoint informations.\n
     return `val_dp` (JSONResponse): A `schemas.datapoint` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_dp = Tdatapoint.update_datapoint(db, datapoint)
+    val_dp = await Tdatapoint.aio.update_datapoint(db, datapoint)
 
     if (val_dp is None):
         m_name = f"Data Point '{datapoint.name}'"
@@ -90,14 +134,14 @@ def update_datapoint(datapoint:schemas.dataPointInfo, db:Session=Depends(get_db)
 # --------------------
 
 # --------------------
-def change_datapoint_active_status(dp_name:str, active:bool, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def change_datapoint_active_status(dp_name:str, active:bool, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Search an entry in database with provided name and change it's activated state.\n
     `dp_name` (str): DataPoint name.\n
     `active` (bool): Active state.\n
     return `val_dp` (JSONResponse): A `schemas.dataPoint` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_dp = Tdatapoint.activate_datapoint(db, dp_name, active)
+    val_dp = await Tdatapoint.aio.activate_datapoint(db, dp_name, active)
 
     if (val_dp is None):
         m_name = f"Data Point '{dp_name}'"
@@ -107,13 +151,13 @@ def change_datapoint_active_status(dp_name:str, active:bool, db:Session=Depends(
 # --------------------
 
 # --------------------
-def confirm_datapoints(dp_name:str, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def confirm_datapoints(dp_name:str, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Search the names in database and change their pending state to False.\n
     `dp_name` (str): DataPoint name.\n
     return `val_dp` (JSONResponse): A `schemas.dataPoint` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_dp = Tdatapoint.confirm_datapoint(db, dp_name)
+    val_dp = await Tdatapoint.aio.confirm_datapoint(db, dp_name)
 
     if (val_dp is None):
         m_name = f"Data Point"
@@ -123,12 +167,45 @@ def confirm_datapoints(dp_name:str, db:Session=Depends(get_db), usr:str=Depends(
 # --------------------
 
 # --------------------
-def get_datapoints(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def confirm_datapoint_selection(sel:schemas.dataPointSelection, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Change the pending state of many datapoints to False at once.\n
+    `sel` (schemas.dataPointSelection): The datapoint names and/or filters by
+    datasource, collector and protocol.\n
+    return `val_dp` (JSONResponse): Each datapoint and if it was confirmed,
+    automatically parsed into a HTTP_OK response.\n
+    '''
+    if (not any([ val is not None for val in sel.dict().values() ])):
+        raise HTTPException(status_code=401, detail=f"Selection parameter error. Give the `names` or a filter.")
+
+    val_dp = await Tdatapoint.aio.confirm_datapoints(db, sel)
+
+    return(val_dp)
+# --------------------
+
+# --------------------
+async def change_datapoints_active_status(active:bool, sel:schemas.dataPointSelection, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Change the activated state of many datapoints at once.\n
+    `active` (bool): Active state.\n
+    `sel` (schemas.dataPointSelection): The datapoint names and/or filters by
+    datasource, collector and protocol.\n
+    return `val_dp` (JSONResponse): Each datapoint and if it was changed,
+    automatically parsed into a HTTP_OK response.\n
+    '''
+    if (not any([ val is not None for val in sel.dict().values() ])):
+        raise HTTPException(status_code=401, detail=f"Selection parameter error. Give the `names` or a filter.")
+
+    val_dp = await Tdatapoint.aio.activate_datapoints(db, sel, active)
+
+    return(val_dp)
+# --------------------
+
+# --------------------
+async def get_datapoints(db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datapoint entries in database.\n
     return `val_dp` (JSONResponse): A list of `schemas.dataPoint` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_dp = Tdatapoint.get_datapoints(db)
+    val_dp = await Tdatapoint.aio.get_datapoints(db)
 
     if (val_dp is None):
         m_name = f"Data Points"
@@ -138,12 +215,12 @@ def get_datapoints(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check
 # --------------------
 
 # --------------------
-def get_datapoints_pending(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def get_datapoints_pending(db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datapoint that are pending in database.\n
     return `val_dp` (JSONResponse): A list of `schemas.dataPoint` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_dp = Tdatapoint.get_datapoints_pending(db)
+    val_dp = await Tdatapoint.aio.get_datapoints_pending(db)
 
     if (val_dp is None):
         m_name = f"Data Points"
@@ -153,12 +230,12 @@ def get_datapoints_pending(db:Session=Depends(get_db), usr:str=Depends(usr_route
 # --------------------
 
 # --------------------
-def get_datapoints_active(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def get_datapoints_active(db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datapoint that are acrive in database.\n
     return `val_dp` (JSONResponse): A list of `schemas.dataPoint` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_dp = Tdatapoint.get_datapoints_active(db)
+    val_dp = await Tdatapoint.aio.get_datapoints_active(db)
 
     if (val_dp is None):
         m_name = f"Data Points"
@@ -168,7 +245,7 @@ def get_datapoints_active(db:Session=Depends(get_db), usr:str=Depends(usr_routes
 # --------------------
 
 # --------------------
-def get_datapoints_by_range(ini:int, end:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def get_datapoints_by_range(ini:int, end:int, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datapoint entries in database.\n
     `ini` (int): First query result to show. Starts at `1`.\n
     `end` (int): Last query result to show, inclusive. \n
@@ -179,7 +256,7 @@ def get_datapoints_by_range(ini:int, end:int, db:Session=Depends(get_db), usr:st
     if(ini<1):
         raise HTTPException(status_code=401, detail=f"Range parameter error. Minimun value for `ini` is `1`.")
 
-    val_dp = Tdatapoint.get_datapoints_by_range(db,ini,end)
+    val_dp = await Tdatapoint.aio.get_datapoints_by_range(db,ini,end)
 
     if (val_dp is None):
         m_name = f"Data Points"
@@ -189,17 +266,64 @@ def get_datapoints_by_range(ini:int, end:int, db:Session=Depends(get_db), usr:st
 # --------------------
 
 # --------------------
-def del_datapoint_by_name(dp_name:str, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def del_datapoint_by_name(dp_name:str, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Delete the specified entry from database.\n
     `ds_name` (str): DataPoint name.\n
     return `val_dp` (JSONResponse): A `schemas.dataPoint` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_dp = Tdatapoint.delete_datapoint(db, dp_name)
+    val_dp = await Tdatapoint.aio.delete_datapoint(db, dp_name)
 
     if (val_dp is None):
         m_name = f"Data Point"
         raise HTTPException(status_code=404, detail=f"Error on {m_name} deletion.")
 
     return(val_dp)
-# --------------------
\ No newline at end of file
+# --------------------
+
+# --------------------
+async def get_datapoints_page(cursor:Union[str,None]=None, size:int=100, active:Union[bool,None]=None,
+    pending:Union[bool,None]=None, collector:Union[int,None]=None, protocol:Union[str,None]=None,
+    db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get one page of datapoint entries in database sorted by name.\n
+    `cursor` (str): The `next_cursor` of the previous page. Leave blank for the first page.\n
+    `size` (int): Maximum number of entries in the page, from `1` to `1000`.\n
+    `active` (bool): Only entries with this active state. Optional.\n
+    `pending` (bool): Only entries with this pending state. Optional.\n
+    `collector` (int): Only entries of this Collector ID. Optional.\n
+    `protocol` (str): Only entries of this protocol. Optional.\n
+    return `val_dp` (JSONResponse): A `schemas.dataPointPage` automatically parsed into
+    a HTTP_OK response.\n
+    '''
+
+    if(size<1 or size>1000):
+        raise HTTPException(status_code=401, detail=f"Page parameter error. The `size` must be between `1` and `1000`.")
+
+    try:
+        val_dp = await Tdatapoint.aio.get_datapoints_page(db, cursor, size, active, pending, collector, protocol)
+    except ValueError as exc:
+        raise HTTPException(status_code=401, detail=f"Page parameter error. {exc}")
+
+    if (val_dp is None):
+        m_name = f"Data Points"
+        raise HTTPException(status_code=404, detail=f"Error searching for available {m_name}.")
+
+    return(val_dp)
+# --------------------
+
+# --------------------
+def stream_datapoints(fmt:str='ndjson', db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Stream all datapoint entries in database sorted by name. The items are
+    sent as they are read, so this is the route to use on very large tables.\n
+    `fmt` (str): `ndjson` for one `schemas.dataPoint` per line or `json` for
+    a JSON array.\n
+    return `val_dp` (StreamingResponse): A chunked HTTP_OK response.\n
+    '''
+
+    if(fmt not in STREAM_FORMATS.keys()):
+        raise HTTPException(status_code=401, detail=f"Stream parameter error. Valid `fmt` values are {list(STREAM_FORMATS.keys())}.")
+
+    val_dp = stream_models(Tdatapoint.iter_datapoints(db), fmt)
+
+    return(val_dp)
+# --------------------
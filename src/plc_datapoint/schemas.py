@@ -8,7 +8,7 @@ Copyright (c) 2017 Aimirim STI.\n
 
 # Import system libs
 from pydantic import BaseModel
-from typing import Any
+from typing import Any, List, Union
 
 # Import custom libs
 from ..plc_datasource import schemas as ds_schemas
@@ -30,3 +30,10 @@ class dataPoint(dataPointInfo):
     active: bool
     pending: bool
     # datasource: ds_schemas.dataSource
+
+class dataPointSelection(ds_schemas.dataSourceSelection):
+    datasource_name: Union[str,None] = None
+
+class dataPointPage(BaseModel):
+    items: List[dataPoint]
+    next_cursor: Union[str,None]
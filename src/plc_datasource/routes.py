@@ -8,13 +8,17 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from fastapi import Depends, HTTPException
+from fastapi import Depends, Header, HTTPException
+from typing import List, Union
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Import custom libs
 from . import schemas
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..crud import Tdatasource
+from ..defaults_cache import DEFAULTS_CACHE
+from ..streaming import STREAM_FORMATS, stream_models
 from ..user_auth import routes as usr_routes
 
 #######################################
@@ -25,12 +29,12 @@ from ..user_auth import routes as usr_routes
 #       user shoud pass, but it is handled internaly by FastAPI.
 
 # --------------------
-def get_protocol_defaults(usr:str=Depends(usr_routes._check_valid_token)):
+async def get_protocol_defaults(if_none_match:Union[str,None]=Header(default=None), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get the list of DataSource protocols available.\n
-    return `val_list` (JSONResponse): A `schemas.comboBox` object
-    automatically parsed into an HTTP_OK response.\n
+    return `val_list` (Response): A `schemas.comboBox` object already
+    serialized, or HTTP_304 if it matches `If-None-Match`.\n
     '''
-    val_list = Tdatasource.get_avail_protocols()
+    val_list = DEFAULTS_CACHE.response('protocols', if_none_match)
     
     if (val_list is None):
         m_name = "protocols"
@@ -40,13 +44,13 @@ def get_protocol_defaults(usr:str=Depends(usr_routes._check_valid_token)):
 # --------------------
 
 # --------------------
-def get_datasource_defaults(prot_name:str, usr:str=Depends(usr_routes._check_valid_token)):
+async def get_datasource_defaults(prot_name:str, if_none_match:Union[str,None]=Header(default=None), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get the list of DataSource information to use as placeholders.\n
     `prot_name` (str): Protocol name to ger defauts from.\n
-    return `val_dict` (JSONResponse): A `schemas.dataSourceInfo` object
-    automatically parsed into an HTTP_OK response.\n
+    return `val_dict` (Response): A `schemas.dataSourceInfo` object already
+    serialized, or HTTP_304 if it matches `If-None-Match`.\n
     '''
-    val_dict = Tdatasource.get_datasource_placeholder(prot_name)
+    val_dict = DEFAULTS_CACHE.response(f'datasource/{prot_name}', if_none_match)
     
     if (val_dict is None):
         m_name = f"datasource information for Protocol: '{prot_name}'"
@@ -56,14 +60,14 @@ def get_datasource_defaults(prot_name:str, usr:str=Depends(usr_routes._check_val
 # --------------------
 
 # --------------------
-def create_datasource(datasource:schemas.dataSourceInfo, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def create_datasource(datasource:schemas.dataSourceInfo, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Create an entry at in database to save this DataSource.\n
     `datasource` (schemas.dataSourceInfo): DataSource informations.\n
     return `val_ds` (JSONResponse): A `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
     try:
-        val_ds = Tdatasource.create_datasource(db,datasource)
+        val_ds = await Tdatasource.aio.create_datasource(db,datasource)
     except Exception as exc:
         msg = str(exc).split('\n')[0]
         raise HTTPException(status_code=520, detail=msg)
@@ -76,13 +80,53 @@ def create_datasource(datasource:schemas.dataSourceInfo, db:Session=Depends(get_
 # --------------------
 
 # --------------------
-def get_datasource_by_name(ds_name:str, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def create_datasources(datasources:List[schemas.dataSourceInfo], db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Create a batch of entries in database in a single transaction.\n
+    `datasources` (list): List of `schemas.dataSourceInfo`.\n
+    return `val_ds` (JSONResponse): A `bulkResult` with the created names and the
+    error of each rejected item automatically parsed into a HTTP_OK response.\n
+    '''
+    try:
+        val_ds = await Tdatasource.aio.create_datasources(db,datasources)
+    except Exception as exc:
+        msg = str(exc).split('\n')[0]
+        raise HTTPException(status_code=520, detail=msg)
+
+    if (val_ds is None):
+        m_name = f"Data Sources"
+        raise HTTPException(status_code=404, detail=f"Error creating {m_name}.")
+
+    return(val_ds)
+# --------------------
+
+# --------------------
+async def update_datasources(datasources:List[schemas.dataSourceInfo], db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Update a batch of entries in database in a single transaction.\n
+    `datasources` (list): List of `schemas.dataSourceInfo`.\n
+    return `val_ds` (JSONResponse): A `bulkUpdateResult` with the updated names and the
+    error of each rejected item automatically parsed into a HTTP_OK response.\n
+    '''
+    try:
+        val_ds = await Tdatasource.aio.update_datasources(db,datasources)
+    except Exception as exc:
+        msg = str(exc).split('\n')[0]
+        raise HTTPException(status_code=520, detail=msg)
+
+    if (val_ds is None):
+        m_name = f"Data Sources"
+        raise HTTPException(status_code=404, detail=f"Error updating {m_name}.")
+
+    return(val_ds)
+# --------------------
+
+# --------------------
+async def get_datasource_by_name(ds_name:str, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Search an entry in database with provided name.\n
     `ds_name` (str): DataSource name.\n
     return `val_ds` (JSONResponse): A `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_ds = Tdatasource.get_datasource_by_name(db, ds_name)
+    val_ds = await Tdatasource.aio.get_datasource_by_name(db, ds_name)
 
     if (val_ds is None):
         m_name = f"Data Source '{ds_name}'"
@@ -92,13 +136,13 @@ def get_datasource_by_name(ds_name:str, db:Session=Depends(get_db), usr:str=Depe
 # --------------------
 
 # --------------------
-def update_datasource(datasource:schemas.dataSourceInfo, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def update_datasource(datasource:schemas.dataSourceInfo, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Search an entry in database with provided name and update it's informations.\n
     `datasource` (schemas.dataSourceInfo): DataSource informations.\n
     return `val_ds` (JSONResponse): A `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_ds = Tdatasource.update_datasource(db, datasource)
+    val_ds = await Tdatasource.aio.update_datasource(db, datasource)
 
     if (val_ds is None):
         m_name = f"Data Source '{datasource.name}'"
@@ -108,14 +152,14 @@ def update_datasource(datasource:schemas.dataSourceInfo, db:Session=Depends(get_
 # --------------------
 
 # --------------------
-def change_datasource_active_status(ds_name:str, active:bool, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def change_datasource_active_status(ds_name:str, active:bool, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Search an entry in database with provided name and change it's activated state.\n
     `ds_name` (str): DataSource name.\n
     `active` (bool): Active state.\n
     return `val_ds` (JSONResponse): A `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_ds = Tdatasource.activate_datasource(db, ds_name, active)
+    val_ds = await Tdatasource.aio.activate_datasource(db, ds_name, active)
 
     if (val_ds is None):
         m_name = f"Data Source '{ds_name}'"
@@ -125,13 +169,13 @@ def change_datasource_active_status(ds_name:str, active:bool, db:Session=Depends
 # --------------------
 
 # --------------------
-def confirm_datasources(ds_name:str, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def confirm_datasources(ds_name:str, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Search the names in database and change their pending state to False.\n
     `ds_name` (str): DataSource name.\n
     return `val_ds` (JSONResponse): A `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_ds = Tdatasource.confirm_datasource(db, ds_name)
+    val_ds = await Tdatasource.aio.confirm_datasource(db, ds_name)
 
     if (val_ds is None):
         m_name = f"Data Source"
@@ -141,12 +185,45 @@ def confirm_datasources(ds_name:str, db:Session=Depends(get_db), usr:str=Depends
 # --------------------
 
 # --------------------
-def get_datasources(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def confirm_datasource_selection(sel:schemas.dataSourceSelection, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Change the pending state of many datasources to False at once.\n
+    `sel` (schemas.dataSourceSelection): The datasource names and/or filters by
+    collector and protocol.\n
+    return `val_ds` (JSONResponse): Each datasource and if it was confirmed,
+    automatically parsed into a HTTP_OK response.\n
+    '''
+    if (not any([ val is not None for val in sel.dict().values() ])):
+        raise HTTPException(status_code=401, detail=f"Selection parameter error. Give the `names` or a filter.")
+
+    val_ds = await Tdatasource.aio.confirm_datasources(db, sel)
+
+    return(val_ds)
+# --------------------
+
+# --------------------
+async def change_datasources_active_status(active:bool, sel:schemas.dataSourceSelection, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Change the activated state of many datasources at once.\n
+    `active` (bool): Active state.\n
+    `sel` (schemas.dataSourceSelection): The datasource names and/or filters by
+    collector and protocol.\n
+    return `val_ds` (JSONResponse): Each datasource and if it was changed,
+    automatically parsed into a HTTP_OK response.\n
+    '''
+    if (not any([ val is not None for val in sel.dict().values() ])):
+        raise HTTPException(status_code=401, detail=f"Selection parameter error. Give the `names` or a filter.")
+
+    val_ds = await Tdatasource.aio.activate_datasources(db, sel, active)
+
+    return(val_ds)
+# --------------------
+
+# --------------------
+async def get_datasources(db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datasource entries in database.\n
     return `val_ds` (JSONResponse): A list of `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_ds = Tdatasource.get_datasources(db)
+    val_ds = await Tdatasource.aio.get_datasources(db)
 
     if (val_ds is None):
         m_name = f"Data Sources"
@@ -156,12 +233,12 @@ def get_datasources(db:Session=Depends(get_db), usr:str=Depends(usr_routes._chec
 # --------------------
 
 # --------------------
-def get_datasources_pending(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def get_datasources_pending(db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datasource that are pending in database.\n
     return `val_ds` (JSONResponse): A list of `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_ds = Tdatasource.get_datasources_pending(db)
+    val_ds = await Tdatasource.aio.get_datasources_pending(db)
 
     if (val_ds is None):
         m_name = f"Data Sources"
@@ -171,12 +248,12 @@ def get_datasources_pending(db:Session=Depends(get_db), usr:str=Depends(usr_rout
 # --------------------
 
 # --------------------
-def get_datasources_active(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def get_datasources_active(db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datasource that are acrive in database.\n
     return `val_ds` (JSONResponse): A list of `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_ds = Tdatasource.get_datasources_active(db)
+    val_ds = await Tdatasource.aio.get_datasources_active(db)
 
     if (val_ds is None):
         m_name = f"Data Sources"
@@ -186,7 +263,7 @@ def get_datasources_active(db:Session=Depends(get_db), usr:str=Depends(usr_route
 # --------------------
 
 # --------------------
-def get_datasources_by_range(ini:int, end:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def get_datasources_by_range(ini:int, end:int, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datasource entries in database.\n
     `ini` (int): First query result to show. Starts at `1`.\n
     `end` (int): Last query result to show, inclusive. \n
@@ -197,7 +274,7 @@ def get_datasources_by_range(ini:int, end:int, db:Session=Depends(get_db), usr:s
     if(ini<1):
         raise HTTPException(status_code=401, detail=f"Range parameter error. Minimun value for `ini` is `1`.")
 
-    val_ds = Tdatasource.get_datasources_by_range(db,ini,end)
+    val_ds = await Tdatasource.aio.get_datasources_by_range(db,ini,end)
 
     if (val_ds is None):
         m_name = f"Data Sources"
@@ -207,17 +284,64 @@ def get_datasources_by_range(ini:int, end:int, db:Session=Depends(get_db), usr:s
 # --------------------
 
 # --------------------
-def del_datasource_by_name(ds_name:str, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+async def del_datasource_by_name(ds_name:str, db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Delete the specified entry from database.\n
     `ds_name` (str): DataSource name.\n
     return `val_ds` (JSONResponse): A `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
-    val_ds = Tdatasource.delete_datasource(db, ds_name)
+    val_ds = await Tdatasource.aio.delete_datasource(db, ds_name)
 
     if (val_ds is None):
         m_name = f"Data Source"
         raise HTTPException(status_code=404, detail=f"Error on {m_name} deletion.")
 
     return(val_ds)
-# --------------------
\ No newline at end of file
+# --------------------
+
+# --------------------
+async def get_datasources_page(cursor:Union[str,None]=None, size:int=100, active:Union[bool,None]=None,
+    pending:Union[bool,None]=None, collector:Union[int,None]=None, protocol:Union[str,None]=None,
+    db:AsyncSession=Depends(get_async_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get one page of datasource entries in database sorted by name.\n
+    `cursor` (str): The `next_cursor` of the previous page. Leave blank for the first page.\n
+    `size` (int): Maximum number of entries in the page, from `1` to `1000`.\n
+    `active` (bool): Only entries with this active state. Optional.\n
+    `pending` (bool): Only entries with this pending state. Optional.\n
+    `collector` (int): Only entries of this Collector ID. Optional.\n
+    `protocol` (str): Only entries of this protocol. Optional.\n
+    return `val_ds` (JSONResponse): A `schemas.dataSourcePage` automatically parsed into
+    a HTTP_OK response.\n
+    '''
+
+    if(size<1 or size>1000):
+        raise HTTPException(status_code=401, detail=f"Page parameter error. The `size` must be between `1` and `1000`.")
+
+    try:
+        val_ds = await Tdatasource.aio.get_datasources_page(db, cursor, size, active, pending, collector, protocol)
+    except ValueError as exc:
+        raise HTTPException(status_code=401, detail=f"Page parameter error. {exc}")
+
+    if (val_ds is None):
+        m_name = f"Data Sources"
+        raise HTTPException(status_code=404, detail=f"Error searching for available {m_name}.")
+
+    return(val_ds)
+# --------------------
+
+# --------------------
+def stream_datasources(fmt:str='ndjson', db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Stream all datasource entries in database sorted by name. The items are
+    sent as they are read, so this is the route to use on very large tables.\n
+    `fmt` (str): `ndjson` for one `schemas.dataSource` per line or `json` for
+    a JSON array.\n
+    return `val_ds` (StreamingResponse): A chunked HTTP_OK response.\n
+    '''
+
+    if(fmt not in STREAM_FORMATS.keys()):
+        raise HTTPException(status_code=401, detail=f"Stream parameter error. Valid `fmt` values are {list(STREAM_FORMATS.keys())}.")
+
+    val_ds = stream_models(Tdatasource.iter_datasources(db), fmt)
+
+    return(val_ds)
+# --------------------
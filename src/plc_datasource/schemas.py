@@ -8,6 +8,7 @@ Copyright (c) 2017 Aimirim STI.\n
 
 # Import system libs
 from pydantic import BaseModel
+from typing import Dict, List, Union
 
 #######################################
 
@@ -34,4 +35,21 @@ class protocol(protocolInfo):
 class dataSource(dataSourceInfo):
     active: bool
     pending: bool
-    protocol: protocol
\ No newline at end of file
+    protocol: protocol
+
+class dataSourcePage(BaseModel):
+    items: List[dataSource]
+    next_cursor: Union[str,None]
+
+class dataSourceSelection(BaseModel):
+    names: Union[List[str],None] = None
+    collector_id: Union[int,None] = None
+    protocol: Union[str,None] = None
+
+class bulkResult(BaseModel):
+    created: Dict[str,bool]
+    errors: Dict[str,str]
+
+class bulkUpdateResult(BaseModel):
+    updated: Dict[str,bool]
+    errors: Dict[str,str]
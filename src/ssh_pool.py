@@ -0,0 +1,246 @@
+'''
+This module holds the pool of SSH sessions
+shared by every access to the collectors.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* paramiko
+'''
+
+# Import system libs
+from paramiko import SSHClient, AutoAddPolicy
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import threading
+import hashlib
+import time
+
+# Import custom libs
+from .env import Enviroment as Env
+
+#######################################
+
+REMOTE_PROTOCOLS = ['ssh', 'sftp']
+'''`REMOTE_PROTOCOLS` (list): Url schemes of files inside the collector.'''
+
+class SSHSession:
+    ''' An authenticated SSH transport with its SFTP channel. Only one
+    thread uses it at a time, the `lock` is re-entrant so nested
+    accesses of the same thread share the session.\n
+    '''
+    def __init__(self, client:SSHClient):
+        self.client = client
+        self.sftp = client.open_sftp()
+        self.lock = threading.RLock()
+        self.last_used = time.monotonic()
+
+    def is_healthy(self):
+        ''' Check that the transport is still usable.\n
+        return (bool): `False` if the connection was lost.\n
+        '''
+        transport = self.client.get_transport()
+        if (transport is None or not transport.is_active()):
+            return(False)
+        try:
+            transport.send_ignore()
+        except Exception:
+            return(False)
+        return(True)
+
+    def close(self):
+        ''' Close the SFTP channel and the transport.\n
+        '''
+        try:
+            self.sftp.close()
+        finally:
+            self.client.close()
+
+class SSHPool:
+    ''' Keyed pool of `SSHSession`, one per collector address and
+    credentials. Sessions idle for longer than `idle_timeout` seconds
+    are closed by a background thread.\n
+    '''
+    def __init__(self, idle_timeout:float, connect_timeout:float):
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    @staticmethod
+    def _key(host:str, port:int, username:str, password:str):
+        ''' The password only takes part of the key as a digest.\n
+        '''
+        pwd = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return( (host, int(port), username, pwd) )
+
+    def _connect(self, host:str, port:int, username:str, password:str):
+        ''' Open a new authenticated session.\n
+        '''
+        client = SSHClient()
+        client.set_missing_host_key_policy(AutoAddPolicy())
+        try:
+            client.connect(host, username=username, password=password,
+                port=int(port), timeout=self.connect_timeout)
+            sess = SSHSession(client)
+        except Exception:
+            client.close()
+            raise
+        return(sess)
+
+    def _start_reaper(self):
+        ''' Start the idle eviction thread if it is not running.\n
+        '''
+        if (self._reaper is None or not self._reaper.is_alive()):
+            self._reaper = threading.Thread(target=self._reap, daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        ''' Periodically close idle sessions, stops when the pool is empty.\n
+        '''
+        while True:
+            time.sleep(max(self.idle_timeout/2, 1))
+            self.evict_idle()
+            with self._lock:
+                if (len(self._sessions)==0):
+                    self._reaper = None
+                    return
+
+    def _discard(self, key, sess:SSHSession):
+        ''' Remove a session from the pool and close it.\n
+        '''
+        with self._lock:
+            if (self._sessions.get(key) is sess):
+                del self._sessions[key]
+        sess.close()
+
+    def evict_idle(self):
+        ''' Close the sessions not used in the last `idle_timeout` seconds.\n
+        '''
+        now = time.monotonic()
+        with self._lock:
+            idle = [ (key, sess) for key, sess in self._sessions.items()
+                if now-sess.last_used > self.idle_timeout ]
+        for key, sess in idle:
+            # Skip sessions that are in use right now
+            if sess.lock.acquire(blocking=False):
+                try:
+                    if (time.monotonic()-sess.last_used > self.idle_timeout):
+                        self._discard(key, sess)
+                finally:
+                    sess.lock.release()
+
+    def evict(self, host:str, port:int, username:str, password:str):
+        ''' Close the session of a collector, after the thread using it
+        is done. Use it when the collector is removed or its access changes.\n
+        `host` (str): Collector address.\n
+        `port` (int): SSH port.\n
+        `username` (str): SSH user.\n
+        `password` (str): SSH password.\n
+        '''
+        key = SSHPool._key(host, port, username, password)
+        with self._lock:
+            sess = self._sessions.get(key)
+        if (sess is not None):
+            with sess.lock:
+                self._discard(key, sess)
+
+    def close_all(self):
+        ''' Close every session in the pool.\n
+        '''
+        with self._lock:
+            sessions = list(self._sessions.items())
+        for key, sess in sessions:
+            with sess.lock:
+                self._discard(key, sess)
+
+    @contextmanager
+    def session(self, host:str, port:int, username:str, password:str):
+        ''' Borrow the session of a collector, connecting when there is no
+        healthy one.\n
+        `host` (str): Collector address.\n
+        `port` (int): SSH port.\n
+        `username` (str): SSH user.\n
+        `password` (str): SSH password.\n
+        return `sess` (SSHSession): The session to use inside the block.\n
+        '''
+        key = SSHPool._key(host, port, username, password)
+
+        while True:
+            with self._lock:
+                sess = self._sessions.get(key)
+            if (sess is None):
+                new = self._connect(host, port, username, password)
+                with self._lock:
+                    sess = self._sessions.setdefault(key, new)
+                    self._start_reaper()
+                if (sess is not new):
+                    new.close()
+
+            sess.lock.acquire()
+            # It can be evicted or replaced while waiting the lock
+            with self._lock:
+                current = self._sessions.get(key) is sess
+            if (current and sess.is_healthy()):
+                break
+            sess.lock.release()
+            if (current):
+                self._discard(key, sess)
+
+        try:
+            yield sess
+        finally:
+            sess.last_used = time.monotonic()
+            sess.lock.release()
+
+SSH_POOL = SSHPool(float(Env.SSH_IDLE_TIMEOUT), float(Env.SSH_CONNECT_TIMEOUT))
+'''`SSH_POOL` (SSHPool): The pool shared by the whole application.'''
+
+# --------------------
+def collector_session(db_col):
+    ''' Borrow the pooled SSH session of a collector.\n
+    `db_col` (models.Collector): The collector table item.\n
+    return (contextmanager): Yields the `SSHSession`.\n
+    '''
+    return( SSH_POOL.session(db_col.ip, db_col.ssh_port, db_col.ssh_user, db_col.ssh_pass) )
+# --------------------
+
+# --------------------
+def evict_collector(db_col):
+    ''' Close the pooled SSH session of a collector.\n
+    `db_col` (models.Collector): The collector table item, with the access
+    of the session to close.\n
+    '''
+    SSH_POOL.evict(db_col.ip, db_col.ssh_port, db_col.ssh_user, db_col.ssh_pass)
+# --------------------
+
+# --------------------
+def split_url(url:str):
+    ''' Check if a file url is inside the collector.\n
+    `url` (str): Local path or `ssh://` url.\n
+    return `remote, path` (bool, str): If the file is remote and its path.\n
+    '''
+    parts = urlsplit(url)
+    remote = parts.scheme in REMOTE_PROTOCOLS
+
+    return( remote, parts.path if remote else url )
+# --------------------
+
+# --------------------
+@contextmanager
+def open_file(db_col, url:str, mode:str='r'):
+    ''' Open a file local or inside the collector, remote files use the
+    pooled SFTP channel.\n
+    `db_col` (models.Collector): The collector table item.\n
+    `url` (str): Local path or `ssh://` url.\n
+    `mode` (str): Open mode, `r` or `w`.\n
+    return `fid` (file): The opened file.\n
+    '''
+    remote, path = split_url(url)
+    if remote:
+        with collector_session(db_col) as sess:
+            with sess.sftp.open(path, mode) as fid:
+                yield fid
+    else:
+        with open(path, mode, encoding='utf-8') as fid:
+            yield fid
+# --------------------
@@ -0,0 +1,61 @@
+'''
+This module holds the helpers to stream
+large listings as HTTP responses.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* fastapi
+* pydantic
+'''
+
+# Import system libs
+from fastapi.responses import StreamingResponse
+
+#######################################
+
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+'''`STREAM_FORMATS` (dict): Supported stream formats and their media type.'''
+
+# --------------------
+def _ndjson_lines(items):
+    ''' Serialize each item as one JSON document per line.\n
+    `items` (generator): Pydantic models to serialize.\n
+    return (generator): Yields the encoded lines.\n
+    '''
+    for item in items:
+        yield item.json() + '\n'
+# --------------------
+
+# --------------------
+def _json_array(items):
+    ''' Serialize the items as a JSON array written piece by piece.\n
+    `items` (generator): Pydantic models to serialize.\n
+    return (generator): Yields the encoded array chunks.\n
+    '''
+    sep = '['
+    for item in items:
+        yield sep + item.json()
+        sep = ','
+    # Close the array, or open and close it if there were no items
+    yield ']' if sep==',' else '[]'
+# --------------------
+
+# --------------------
+def stream_models(items, fmt:str='ndjson'):
+    ''' Build a chunked HTTP response from a generator of models, so
+    the memory used does not depend on the number of items.\n
+    `items` (generator): Pydantic models to send.\n
+    `fmt` (str): One of `STREAM_FORMATS` keys.\n
+    return `response` (StreamingResponse): The HTTP response.\n
+    '''
+    if fmt=='ndjson':
+        content = _ndjson_lines(items)
+    else:
+        content = _json_array(items)
+
+    response = StreamingResponse(content, media_type=STREAM_FORMATS[fmt])
+
+    return(response)
+# --------------------
@@ -0,0 +1,124 @@
+'''
+This module holds the processes that
+hash and verify the passwords.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* passlib
+'''
+
+# Import system libs
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from passlib.context import CryptContext
+import threading
+import asyncio
+
+# Import custom libs
+from ..env import Enviroment as Env
+
+#######################################
+
+# NOTE: The worker processes import this module to run the
+#       functions below, keep its imports light.
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# --------------------
+def _hash(password:str):
+    ''' Worker side of `PasswordPool.hash`.\n
+    '''
+    return(pwd_context.hash(password))
+# --------------------
+
+# --------------------
+def _verify(password:str, hashed_password:str):
+    ''' Worker side of `PasswordPool.verify`.\n
+    '''
+    return(pwd_context.verify(password, hashed_password))
+# --------------------
+
+class PasswordPoolBusy(Exception):
+    ''' Raised when too many passwords are waiting to be processed.\n
+    '''
+
+class PasswordPool:
+    ''' Hash and verify passwords in `workers` processes, so the bcrypt
+    rounds neither block the event loop nor hold the GIL of the API. At
+    most `max_pending` passwords wait or run at the same time, the next
+    ones are refused with `PasswordPoolBusy` instead of piling up. When a
+    worker dies the processes are replaced and the call is retried once.\n
+    The methods are called from the event loop.\n
+    '''
+    def __init__(self, workers:int, max_pending:int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pending = 0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        ''' Create the worker processes, or do nothing if they exist.\n
+        '''
+        with self._lock:
+            if (self._pool is None):
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                # NOTE: Create the processes now, at the application
+                #       startup, while there are few threads to fork.
+                self._pool.submit(int)
+
+    def _replace(self, broken:ProcessPoolExecutor):
+        ''' Create new worker processes when one of them died, which breaks
+        the whole executor. Only the first caller replaces it.\n
+        `broken` (ProcessPoolExecutor): The executor that failed.\n
+        '''
+        with self._lock:
+            if (self._pool is broken):
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def stop(self):
+        ''' Terminate the worker processes.\n
+        '''
+        with self._lock:
+            if (self._pool is not None):
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    async def run(self, func, *args):
+        ''' Run a function in a worker process.\n
+        `func` (function): A module level function, it is sent by name.\n
+        return (any): The `func` result, or raises its exception.\n
+        '''
+        if (self._pending>=self.max_pending):
+            raise PasswordPoolBusy()
+
+        self._pending += 1
+        try:
+            self.start()
+            pool = self._pool
+            try:
+                return(await asyncio.wrap_future(pool.submit(func, *args)))
+            except BrokenProcessPool:
+                # A worker was killed, retry once in new processes
+                self._replace(pool)
+                return(await asyncio.wrap_future(self._pool.submit(func, *args)))
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password:str):
+        ''' Create the hash of a password.\n
+        `password` (str): Password that will be hashed.\n
+        return (str): Password hash.\n
+        '''
+        return(await self.run(_hash, password))
+
+    async def verify(self, password:str, hashed_password:str):
+        ''' Check a password against its hash.\n
+        `password` (str): Password you want to verify.\n
+        `hashed_password` (str): Password saved in database.\n
+        return (bool): Password verification result.\n
+        '''
+        return(await self.run(_verify, password, hashed_password))
+
+PASSWORD_POOL = PasswordPool(int(Env.PASSWORD_WORKERS), int(Env.PASSWORD_QUEUE))
+'''`PASSWORD_POOL` (PasswordPool): The password processes of this worker.'''
@@ -10,17 +10,20 @@ Copyright (c) 2017 Aimirim STI.\n
 # Import system libs
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from typing import Union
+import hashlib
 
 # Import custom libs
 from ..crud import Tuser
-from ..database import get_db
+from ..database import AsyncSessionLocal, get_async_db
 from ..env import Enviroment as Env
-from .schemas import LoginData, LoginSucess, SafeUserCreate, UserCreate, User, UserPasswordChange
+from .schemas import LoginData, LoginSucess, Principal, RefreshData, SafeUserCreate, TokenRefresh, UserCreate, User, UserPasswordChange
+from .token_cache import TOKEN_CACHE
+from .password_pool import PASSWORD_POOL, PasswordPoolBusy
 
 #######################################
 
@@ -35,30 +38,104 @@ oauth2_schema = OAuth2PasswordBearer(tokenUrl=f"{Env.API_NAME}"+"/login")
 #       user shoud pass, but it is handled internaly by FastAPI.
 
 # --------------------
-def authentication(user: LoginData=Depends(), db:Session=Depends(get_db)):
+async def _run_password_task(task, *args):
+    ''' Run a `PASSWORD_POOL` method, refusing the request when there are
+    too many passwords waiting.\n
+    `task` (function): `PASSWORD_POOL.hash` or `PASSWORD_POOL.verify`.\n
+    return (any): The `task` result.\n
+    '''
+    try:
+        return(await task(*args))
+    except PasswordPoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many logins at the same time, try again",
+            headers={"Retry-After": "1"},
+        )
+# --------------------
+
+# --------------------
+async def authentication(user: LoginData=Depends(), db:AsyncSession=Depends(get_async_db)):
     ''' Checks if the entered user is validated. \n
     `user` (LoginData): Username and Password fields.\n
     return `success` (JSONResponse): Return the access token and type. \n
     '''
-    usr = Tuser.authenticate_user(db, user.username, user.password)
+    usr = await Tuser.aio.get_by_name(db, name=user.username)
+    if usr and not await _run_password_task(PASSWORD_POOL.verify, user.password, usr.password):
+        usr = None
     if not usr:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=int(Env.ACCESS_TOKEN_EXPIRE_MINUTES))
-    access_token = _create_access_token(
-        data={"usr": usr.name}, expires_delta=access_token_expires
-    )
+    access_token, refresh_token = _create_tokens(usr)
     
     success = LoginSucess(name=usr.name, is_admin=usr.is_admin,
         change_password=usr.change_password, access_token=access_token,
-        token_type="Bearer")
+        refresh_token=refresh_token, token_type="Bearer")
     
     return(success)
 # --------------------
 
+# --------------------
+async def refresh_token(refresh: RefreshData, db:AsyncSession=Depends(get_async_db)):
+    ''' Exchange a refresh token for new access and refresh tokens, so the
+    session is extended without sending the password again.\n
+    `refresh` (RefreshData): The refresh token received on login or on
+    the last refresh.\n
+    return `tokens` (JSONResponse): The new tokens and type.\n
+    '''
+    exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail='Invalid refresh token',
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(refresh.refresh_token, Env.SECRET_KEY, algorithms=Env.ALGORITHM )
+        if payload.get('typ')!='refresh' or payload.get('usr') is None:
+            raise exception
+        if payload.get('exp')<datetime.timestamp(datetime.utcnow()):
+            raise exception
+    except JWTError:
+        raise exception
+
+    # Removed users and changed passwords end the session
+    usr = await Tuser.aio.get_by_name(db, name=payload.get('usr'))
+    if usr is None or payload.get('key')!=_password_key(usr.password):
+        raise exception
+
+    access_token, refresh_token = _create_tokens(usr)
+    tokens = TokenRefresh(access_token=access_token, refresh_token=refresh_token,
+        token_type="Bearer")
+
+    return(tokens)
+# --------------------
+
+# --------------------
+def _password_key(hashed_password:str):
+    ''' Short fingerprint of the password hash, it changes with the password.\n
+    `hashed_password` (str): Password saved in database.\n
+    return (str): The fingerprint.\n
+    '''
+    return(hashlib.sha256(hashed_password.encode()).hexdigest()[:16])
+# --------------------
+
+# --------------------
+def _create_tokens(usr):
+    ''' Create the access and refresh tokens of a user.\n
+    `usr` (models.User): The logged user.\n
+    return `access_token, refresh_token` (str, str): The tokens.\n
+    '''
+    access_token = _create_access_token(data={"usr": usr.name},
+        expires_delta=timedelta(minutes=int(Env.ACCESS_TOKEN_EXPIRE_MINUTES)))
+    refresh_token = _create_access_token(
+        data={"usr": usr.name, "typ": "refresh", "key": _password_key(usr.password)},
+        expires_delta=timedelta(minutes=int(Env.REFRESH_TOKEN_EXPIRE_MINUTES)))
+
+    return(access_token, refresh_token)
+# --------------------
+
 # --------------------
 def _create_access_token(data: dict, expires_delta: Union[timedelta, None] = None):
     ''' Create access token. \n
@@ -78,11 +155,17 @@ def _create_access_token(data: dict, expires_delta: Union[timedelta, None] = Non
 # --------------------
 
 # --------------------
-def _check_valid_token(token:str=Depends(oauth2_schema)):
-    ''' Checks if a user is logged in \n
+async def _get_principal(token:str=Depends(oauth2_schema)):
+    ''' Checks if a user is logged in. The validated tokens are cached
+    in `TOKEN_CACHE`, only the first request of a token decodes it and
+    searches the user.\n
     `token` (str): Token to be validated. \n
-    return `usrname` (str): Name of the logged user.\n
+    return `principal` (Principal): Name and permissions of the logged user.\n
     '''
+    principal = TOKEN_CACHE.get(token)
+    if (principal is not None):
+        return(principal)
+
     exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED, detail='Not logged in')
     try:
@@ -90,21 +173,42 @@ def _check_valid_token(token:str=Depends(oauth2_schema)):
         usrname = payload.get('usr')
         if usrname is None:
             raise exception
+        # Refresh tokens only give new tokens
+        if payload.get('typ') is not None:
+            raise exception
         if payload.get('exp')<datetime.timestamp(datetime.utcnow()):
             raise exception
     except JWTError:
         raise exception
 
-    # TODO: Returns a new token instead of the user
-    #       doing this will refresh the token at every
-    #       successful request. And this should be better
-    #       for the user experience.
+    # Removed users are logged out
+    async with AsyncSessionLocal() as db:
+        usr = await Tuser.aio.get_by_name(db, name=usrname)
+    if usr is None:
+        raise exception
+
+    principal = Principal(name=usr.name, is_admin=usr.is_admin)
+    TOKEN_CACHE.put(token, principal, payload.get('exp'))
+
+    return(principal)
+# --------------------
+
+# --------------------
+async def _check_valid_token(principal:Principal=Depends(_get_principal)):
+    ''' Checks if a user is logged in \n
+    `principal` (Principal): The logged user. \n
+    return `usrname` (str): Name of the logged user.\n
+    '''
+    usrname = principal.name
+
+    # NOTE: The clients extend the session with the refresh
+    #       token on `refresh_token`, before the access expires.
 
     return(usrname)
 # --------------------
 
 # --------------------
-def check_token(usr:str=Depends(_check_valid_token)):
+async def check_token(usr:str=Depends(_check_valid_token)):
     ''' A dummy route to check the token validation.\n
     return `True`: In case of unauthorized access the exception
     will be raised as `HTTP_401_UNAUTHORIZED` when processing the
@@ -114,23 +218,22 @@ def check_token(usr:str=Depends(_check_valid_token)):
 # --------------------
 
 # --------------------
-def create_user(new_user: SafeUserCreate , logged_username: _check_valid_token=Depends(),db: Session=Depends(get_db)):
+async def create_user(new_user: SafeUserCreate , logged_user: Principal=Depends(_get_principal), db: AsyncSession=Depends(get_async_db)):
     ''' Create a new user. Only the admin user can create a new user. \n
     `new_user`(schemas.SafeUserCreate): The new user's data, including 
     name, password and change_password (which indicates if the user should change his password) \n
     return (schemas.User): Returns the data of the created user. \n
     '''
-
-    logged_user = Tuser.get_by_name(db, name=logged_username)
     if logged_user.is_admin:
         try:
-            user_exists = bool(Tuser.get_by_name(db, name=new_user.name))
+            user_exists = bool(await Tuser.aio.get_by_name(db, name=new_user.name))
             if not user_exists:
+                password = await _run_password_task(PASSWORD_POOL.hash, new_user.password)
                 new_user_not_admin = UserCreate(name=new_user.name,
                                                 is_admin=False,
                                                 change_password=new_user.change_password,
-                                                password=new_user.password)
-                new_user_response = Tuser.create(db, new_user_not_admin)
+                                                password=password)
+                new_user_response = await Tuser.aio.create(db, new_user_not_admin, hashed=True)
                 return User(name=new_user_response.name, 
                             is_admin=new_user_response.is_admin,
                             change_password=new_user_response.change_password,
@@ -147,16 +250,17 @@ def create_user(new_user: SafeUserCreate , logged_username: _check_valid_token=D
 # --------------------
 
 # --------------------
-def change_password(new_usr_pwd: UserPasswordChange ,logged_username: _check_valid_token=Depends(),db: Session=Depends(get_db)):
+async def change_password(new_usr_pwd: UserPasswordChange, logged_user: Principal=Depends(_get_principal), db: AsyncSession=Depends(get_async_db)):
     ''' Change user password. The admin can change any user's password. 
     Other users can only change their own passwords. \n
     `new_usr_pwd` (schemas.UserPasswordChange): The username whose password will be changed and the new password. \n
     return (bool): Returns true if the password was changed. \n
     '''
-    logged_user = Tuser.get_by_name(db, name=logged_username)
-    if logged_username == new_usr_pwd.name or logged_user.is_admin:
+    if logged_user.name == new_usr_pwd.name or logged_user.is_admin:
         try:
-            Tuser.change_password(db, new_usr_pwd.name, new_usr_pwd.new_password)
+            password = await _run_password_task(PASSWORD_POOL.hash, new_usr_pwd.new_password)
+            await Tuser.aio.change_password(db, new_usr_pwd.name, password, hashed=True)
+            TOKEN_CACHE.forget_user(new_usr_pwd.name)
             return(True)
         except SQLAlchemyError:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -167,18 +271,18 @@ def change_password(new_usr_pwd: UserPasswordChange ,logged_username: _check_val
 # --------------------
 
 # --------------------
-def delete_user(username: str, logged_username: _check_valid_token=Depends(), db: Session=Depends(get_db)):
+async def delete_user(username: str, logged_user: Principal=Depends(_get_principal), db: AsyncSession=Depends(get_async_db)):
     ''' Delete a user. Only the admin can delete users. \n
     `username` (string): The user name that will be deleted.\n
     return (bool): Returns true if the user was deleted. \n
     '''
-    logged_user = Tuser.get_by_name(db, name=logged_username)
     if logged_user.is_admin:
         if (username=='admin'):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                 detail='Main Admin user can not be removed')
         try:
-            num = Tuser.delete(db, username)
+            num = await Tuser.aio.delete(db, username)
+            TOKEN_CACHE.forget_user(username)
             if num > 0: 
                 return True
             else:
@@ -193,14 +297,13 @@ def delete_user(username: str, logged_username: _check_valid_token=Depends(), db
 # --------------------
 
 # --------------------
-def get_user_list(logged_username: _check_valid_token=Depends(), db: Session=Depends(get_db)):
+async def get_user_list(logged_user: Principal=Depends(_get_principal), db: AsyncSession=Depends(get_async_db)):
     '''Get the list of users. Only the admin can access this list. \n
     return `users` (list): The list of Users in the application.\n
     '''
-    logged_user = Tuser.get_by_name(db, name=logged_username)
     if logged_user.is_admin:
         try:
-            usr_list = Tuser.get_all(db)
+            usr_list = await Tuser.aio.get_all(db)
             users = []
             for usr in usr_list:
                 users.append(User(name=usr.name, is_admin=usr.is_admin,
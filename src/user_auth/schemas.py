@@ -23,6 +23,15 @@ class UserBase(BaseModel):
 
 class LoginSucess(UserBase):
     access_token: str
+    refresh_token: str
+    token_type: str
+
+class RefreshData(BaseModel):
+    refresh_token: str
+
+class TokenRefresh(BaseModel):
+    access_token: str
+    refresh_token: str
     token_type: str
 
 class SafeUserCreate(BaseModel):
@@ -39,3 +48,7 @@ class UserCreate(UserBase):
 
 class User(UserBase):
     id: int
+
+class Principal(BaseModel):
+    name: str
+    is_admin: bool
@@ -0,0 +1,73 @@
+'''
+This module holds the cache of the
+validated access tokens.\n
+Copyright (c) 2017 Aimirim STI.\n
+'''
+
+# Import system libs
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import time
+
+# Import custom libs
+from ..env import Enviroment as Env
+
+#######################################
+
+class TokenCache:
+    ''' Keep the user of the recently validated tokens, so the protected
+    routes do not decode the token and query the user at each request.
+    The entries live `ttl` seconds, never past the token expiration, and
+    the least recently used are dropped above `max_size` entries. A non
+    positive `ttl` disables the cache.\n
+    '''
+    def __init__(self, ttl:float, max_size:int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token:str):
+        ''' Search a validated token.\n
+        `token` (str): The access token.\n
+        return `principal` (schemas.Principal): The token user, `None` if
+        not cached or expired.\n
+        '''
+        with self._lock:
+            item = self._items.get(token)
+            if (item is None):
+                return(None)
+            principal, expires = item
+            if (expires<=time.monotonic()):
+                del self._items[token]
+                return(None)
+            self._items.move_to_end(token)
+        return(principal)
+
+    def put(self, token:str, principal, exp:float):
+        ''' Save a validated token.\n
+        `token` (str): The access token.\n
+        `principal` (schemas.Principal): The token user.\n
+        `exp` (float): The token expiration timestamp.\n
+        '''
+        lifetime = min(self.ttl, exp-datetime.timestamp(datetime.utcnow()))
+        if (lifetime<=0):
+            return
+        with self._lock:
+            self._items[token] = (principal, time.monotonic()+lifetime)
+            self._items.move_to_end(token)
+            while (len(self._items)>self.max_size):
+                self._items.popitem(last=False)
+
+    def forget_user(self, name:str):
+        ''' Drop every token of a user, after its data changed.\n
+        `name` (str): The user name.\n
+        '''
+        with self._lock:
+            tokens = [ token for token, (principal, _) in self._items.items() if principal.name==name ]
+            for token in tokens:
+                del self._items[token]
+
+TOKEN_CACHE = TokenCache(float(Env.TOKEN_CACHE_TTL), int(Env.TOKEN_CACHE_SIZE))
+'''`TOKEN_CACHE` (TokenCache): The validated tokens of this process.'''
@@ -0,0 +1,165 @@
+'''
+This module holds the single writer that
+serializes the database writes.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+from concurrent.futures import Future
+from sqlalchemy.orm import Session
+import threading
+import asyncio
+import queue
+import time
+
+# Import custom libs
+from .env import Enviroment as Env
+from .database import engine, SQLITE_TUNED
+
+#######################################
+
+class _WriterSession(Session):
+    ''' Session of one write operation inside the batch transaction. The
+    `commit` of the table methods only flushes, and `rollback` undoes
+    everything the operation did, without touching the other writes.\n
+    '''
+    def begin_job(self):
+        self._job = self.begin_nested()
+
+    def end_job(self):
+        self.flush()
+        self._job.commit()
+
+    def abort_job(self):
+        if self._job.is_active:
+            self._job.rollback()
+
+    def commit(self):
+        self.flush()
+
+    def rollback(self):
+        self._job.rollback()
+        self._job = self.begin_nested()
+
+class WriteQueue:
+    ''' Run the write operations one at a time in a dedicated thread,
+    so SQLite never sees two writers fighting for the lock. The writes
+    that arrive together are committed in one transaction, each inside
+    its own SAVEPOINT, so a failing write does not undo the others.\n
+    The operations are the methods of the table classes, they receive
+    the `Session` of the writer as first argument.\n
+    '''
+    def __init__(self, engine, batch_size:int, batch_wait:float):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, method, *args, **kwargs):
+        ''' Schedule a write operation.\n
+        `method` (function): Called as `method(db, *args, **kwargs)`.\n
+        return `future` (Future): Receives the `method` result.\n
+        '''
+        future = Future()
+        with self._lock:
+            if (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._jobs.put( (future, method, args, kwargs) )
+        return(future)
+
+    async def run(self, method, *args, **kwargs):
+        ''' Schedule a write operation and wait for it without blocking
+        the event loop.\n
+        `method` (function): Called as `method(db, *args, **kwargs)`.\n
+        return (any): The `method` result, or raises its exception.\n
+        '''
+        return(await asyncio.wrap_future(self.submit(method, *args, **kwargs)))
+
+    def call(self, method, *args, **kwargs):
+        ''' Schedule a write operation and wait for it, for the sync code
+        running in the threadpool. Never call it from the writer thread.\n
+        `method` (function): Called as `method(db, *args, **kwargs)`.\n
+        return (any): The `method` result, or raises its exception.\n
+        '''
+        return(self.submit(method, *args, **kwargs).result())
+
+    def _next_batch(self):
+        ''' Wait for a write and collect the ones that follow it.\n
+        return `batch` (list): The jobs to commit together.\n
+        '''
+        batch = [ self._jobs.get() ]
+        deadline = time.monotonic()+self.batch_wait
+        while (len(batch)<self.batch_size):
+            try:
+                batch.append( self._jobs.get(timeout=max(deadline-time.monotonic(), 0)) )
+            except queue.Empty:
+                break
+        return(batch)
+
+    def _run(self):
+        ''' Writer thread loop.\n
+        '''
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(batch)
+            except Exception as exc:
+                # Could not even open the transaction
+                for future, _, _, _ in batch:
+                    if (not future.done()):
+                        future.set_exception(exc)
+
+    def _write(self, batch:list):
+        ''' Commit a batch of jobs in a single transaction.\n
+        `batch` (list): The jobs to run.\n
+        '''
+        done = []
+        with self.engine.connect() as conn:
+            trans = conn.begin()
+            for future, method, args, kwargs in batch:
+                if (not future.set_running_or_notify_cancel()):
+                    continue
+                with _WriterSession(bind=conn, autoflush=False, expire_on_commit=False) as db:
+                    db.begin_job()
+                    try:
+                        result = method(db, *args, **kwargs)
+                        db.end_job()
+                        done.append( (future, result) )
+                    except Exception as exc:
+                        db.abort_job()
+                        future.set_exception(exc)
+
+            try:
+                trans.commit()
+            except Exception as exc:
+                for future, _ in done:
+                    future.set_exception(exc)
+                return
+
+        for future, result in done:
+            future.set_result(result)
+
+WRITE_QUEUE = WriteQueue(engine, int(Env.WRITE_BATCH_SIZE), float(Env.WRITE_BATCH_WAIT)) if SQLITE_TUNED else None
+'''`WRITE_QUEUE` (WriteQueue): The single writer, `None` when the SQLite
+tuning profile is not in use.'''
+
+# --------------------
+def run_write(db:Session, method, *args, **kwargs):
+    ''' Run a write operation from sync code, the `Session` routes and the
+    background jobs. It goes through `WRITE_QUEUE` when it is in use, like
+    the `aio` writes, otherwise it runs in `db`.\n
+    `db` (Session): Database access session of the caller.\n
+    `method` (function): Called as `method(db, *args, **kwargs)`.\n
+    return (any): The `method` result, its items do not belong to `db`
+    when the writer ran it.\n
+    '''
+    if (WRITE_QUEUE is None):
+        return(method(db, *args, **kwargs))
+
+    return(WRITE_QUEUE.call(method, *args, **kwargs))
+# --------------------
\ No newline at end of file
@@ -0,0 +1 @@
+# Copyright (c) 2017 Aimirim STI.
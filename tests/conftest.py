@@ -0,0 +1,134 @@
+'''
+This module holds the fixtures shared by
+the tests of the backend.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pytest
+* requests
+'''
+
+# Import system libs
+from contextlib import contextmanager
+from sqlalchemy import event
+import tempfile
+import shutil
+import pytest
+import os
+
+# NOTE: The settings are read when `src` is imported, so the
+#       temporary database is chosen before any test module
+#       imports the application.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP_DIR = tempfile.mkdtemp(prefix='tocandira_tests_')
+
+os.environ['CONF_DATABASE_URL'] = f'sqlite:///{TMP_DIR}/test.db'
+os.environ['CONF_DEFAULT_FILE'] = os.path.join(ROOT, 'config', 'defaults.json')
+os.environ['CONF_MONITOR_INTERVAL'] = '0'
+os.environ['CONF_DEFAULTS_POLL'] = '0'
+os.environ['PROMETHEUS_FILEURL'] = os.path.join(TMP_DIR, 'prometheus.yml')
+
+from src import database, models
+from src.main import app
+from src.user_auth import routes as usr_routes
+
+#######################################
+
+# --------------------
+@contextmanager
+def record_statements(*engines):
+    ''' Collect the statements sent to the database while inside the block.\n
+    `engines` (Engine): The engines to listen to, the sync engine of an
+    `AsyncEngine`.\n
+    return `statements` (list): Receives the SQL and parameters of each statement.\n
+    '''
+    statements = []
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append( (statement, parameters) )
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+# --------------------
+
+# --------------------
+@pytest.fixture
+def db():
+    ''' Empty the tables of the temporary database before a test.\n
+    return `db` (Session): A session of the application database.\n
+    '''
+    for table in reversed(models.Base.metadata.sorted_tables):
+        if (table.name!=models.User.__tablename__):
+            with database.engine.begin() as conn:
+                conn.execute(table.delete())
+
+    with database.SessionManager() as db:
+        yield db
+# --------------------
+
+# --------------------
+@pytest.fixture(scope='session')
+def client():
+    ''' The application with an user already logged in.\n
+    return `client` (TestClient): Sends the requests to the application.\n
+    '''
+    from fastapi.testclient import TestClient
+
+    app.dependency_overrides[usr_routes._check_valid_token] = lambda: 'admin'
+    with TestClient(app) as client:
+        yield client
+    app.dependency_overrides.clear()
+# --------------------
+
+DATAPOINTS_PER_PROTOCOL = 20
+
+ACCESS = {
+    'Siemens':  lambda i: {'address': f'DB1.DBD{4*i}'},
+    'Rockwell': lambda i: {'tag_name': f'Program:Main.Tag{i}'},
+    'Modbus':   lambda i: {'func_code': 3, 'address': f'{i}'},
+}
+'''`ACCESS` (dict): The protocol specific columns of the i-th datapoint.'''
+
+# --------------------
+@pytest.fixture
+def datapoints(db):
+    ''' Fill the database with a collector, a datasource of each protocol
+    and their datapoints, some inactive and some confirmed.\n
+    return `datapoints` (dict): The access data of each datapoint name.\n
+    '''
+    col = models.Collector(name='col', ip='127.0.0.1', ssh_port=22, ssh_user='user',
+        ssh_pass='pass', prj_path='/tmp', opcua_port=4840, health_port=30000,
+        update_period=30, timeout=2)
+    db.add(col)
+
+    datapoints = {}
+    prot_args = {
+        'Siemens':  {'rack': 0, 'slot': 1, 'plc': 'S7-300'},
+        'Rockwell': {'path': '1,0', 'slot': 0, 'connection': 'Micro800'},
+        'Modbus':   {'slave_id': 1},
+    }
+    for prot_name, prot_cls in models.IMPLEMENTED_PROT.items():
+        ds = models.DataSource(name=f'ds_{prot_name}', plc_ip='10.0.0.1', plc_port=102,
+            cycletime=1000, timeout=1000, collector=col)
+        ds.protocol = prot_cls(**prot_args[prot_name])
+        db.add(ds)
+        data_cls = models.IMPLEMENTED_DATA[prot_name]
+        for i in range(DATAPOINTS_PER_PROTOCOL):
+            name = f'dp_{prot_name}_{i}'
+            db.add(data_cls(name=name, description='test', num_type='REAL', datasource=ds,
+                active=(i%2==0), pending=(i%3==0), **ACCESS[prot_name](i)))
+            datapoints[name] = ACCESS[prot_name](i)
+    db.commit()
+
+    return(datapoints)
+# --------------------
+
+# --------------------
+def pytest_sessionfinish(session, exitstatus):
+    ''' Remove the temporary database.\n
+    '''
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
+# --------------------
@@ -0,0 +1,91 @@
+'''
+This module checks the bulk update of
+datapoints and datasources.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pytest
+* requests
+'''
+
+# Import custom libs
+from src import database, models
+from .conftest import DATAPOINTS_PER_PROTOCOL, record_statements
+
+#######################################
+
+MAX_UPDATE_STATEMENTS = 2
+'''`MAX_UPDATE_STATEMENTS` (int): Statements allowed for a whole batch of
+datapoints with the same columns, whatever its size.'''
+
+# --------------------
+def _datapoint(name:str, prot_name:str, data:dict):
+    ''' A datapoint to update.\n
+    '''
+    return({ 'name': name, 'description': 'updated', 'num_type': 'INT',
+        'datasource_name': f'ds_{prot_name}', 'access': {'name': prot_name, 'data': data} })
+# --------------------
+
+# --------------------
+def test_update_datapoints(client, db, datapoints):
+    ''' Valid items are updated in one transaction and each invalid one
+    reports its error.\n
+    '''
+    batch = [
+        _datapoint('dp_Modbus_1', 'Modbus', {'address': '7'}),
+        _datapoint('dp_Siemens_1', 'Modbus', {'address': '7'}),
+        _datapoint('dp_Siemens_2', 'Siemens', {'tag_name': 'x'}),
+        _datapoint('dp_missing', 'Siemens', {'address': 'DB1.DBD0'}),
+        _datapoint('dp_Modbus_1', 'Modbus', {'address': '8'}),
+    ]
+    response = client.put('/datapoints/bulk', json=batch)
+    assert response.status_code==200
+    answer = response.json()
+    assert answer['updated']=={'dp_Modbus_1': True}
+    # The repeated item is updated once
+    assert sorted(answer['errors'].keys())==['dp_Modbus_1', 'dp_Siemens_1', 'dp_Siemens_2', 'dp_missing']
+
+    dp = client.get('/datapoint/dp_Modbus_1').json()
+    assert (dp['description'], dp['num_type'], dp['pending'])==('updated', 'INT', True)
+    # Only the informed access columns change
+    assert dp['access']['data']=={'address': '7', 'func_code': 3}
+    assert client.get('/datapoint/dp_Siemens_1').json()['description']=='test'
+# --------------------
+
+# --------------------
+def test_update_datapoints_statements(client, datapoints):
+    ''' A batch is loaded and written with a fixed number of statements.\n
+    '''
+    batch = [ _datapoint(f'dp_Siemens_{i}', 'Siemens', {'address': f'DB2.DBD{4*i}'})
+        for i in range(DATAPOINTS_PER_PROTOCOL) ]
+    with record_statements(database.engine, database.async_engine.sync_engine) as statements:
+        response = client.put('/datapoints/bulk', json=batch)
+
+    assert len(response.json()['updated'])==DATAPOINTS_PER_PROTOCOL
+    # The transaction control of the single writer is not counted
+    sql_list = [ sql for sql, params in statements if sql.split()[0] in ['SELECT', 'UPDATE'] ]
+    assert len(sql_list)<=MAX_UPDATE_STATEMENTS, sql_list
+# --------------------
+
+# --------------------
+def test_update_datasources(client, db, datapoints):
+    ''' The updated datasources and all their datapoints become pending.\n
+    '''
+    col_id = db.query(models.Collector.id).scalar()
+    ds = client.get('/datasource/ds_Modbus').json()
+    ds.update(plc_port=1502, collector_id=col_id)
+    ds['protocol']['data'] = {'slave_id': 5}
+    wrong = dict(ds, name='ds_Siemens')
+    lost = dict(ds, name='ds_Rockwell', protocol={'name': 'Rockwell', 'data': {}}, collector_id=col_id+1)
+
+    answer = client.put('/datasources/bulk', json=[ds, wrong, lost]).json()
+    assert answer['updated']=={'ds_Modbus': True}
+    assert sorted(answer['errors'].keys())==['ds_Rockwell', 'ds_Siemens']
+
+    updated = client.get('/datasource/ds_Modbus').json()
+    assert (updated['plc_port'], updated['protocol']['data']['slave_id'])==(1502, 5)
+    # Ends the read transaction of the test session
+    db.commit()
+    pending = { dp.datasource_name:dp.pending for dp in db.query(models.DataPoint) if not dp.pending }
+    assert 'ds_Modbus' not in pending.keys()
+    assert 'ds_Siemens' in pending.keys()
+# --------------------
@@ -0,0 +1,49 @@
+'''
+This module checks the removal of a collector
+with its datasources and datapoints.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pytest
+'''
+
+# Import custom libs
+from src import models
+
+#######################################
+
+# --------------------
+def _collector_id(db):
+    ''' Get the id of the collector of the `datapoints` fixture.\n
+    '''
+    return( db.query(models.Collector.id).scalar() )
+# --------------------
+
+# --------------------
+def test_delete_answer(client, db, datapoints):
+    ''' The delete route keeps answering a map of ids to status.\n
+    '''
+    id = _collector_id(db)
+
+    response = client.delete(f'/collector/{id}')
+    assert response.status_code==200
+    assert response.json()=={str(id): True}
+
+    db.expire_all()
+    assert db.query(models.DataSource).count()==0
+    assert db.query(models.DataPoint).count()==0
+    assert client.delete(f'/collector/{id}').status_code==404
+# --------------------
+
+# --------------------
+def test_delete_tree_counts(client, db, datapoints):
+    ''' The tree route reports the rows deleted from each table.\n
+    '''
+    id = _collector_id(db)
+
+    response = client.delete(f'/collector/{id}/tree')
+    assert response.status_code==200
+    assert response.json()=={'id': id, 'removed': {'collector': 1,
+        'datasources': len(models.IMPLEMENTED_PROT), 'protocols': len(models.IMPLEMENTED_PROT),
+        'datapoints': len(datapoints)}}
+    assert client.delete(f'/collector/{id}/tree').status_code==404
+# --------------------
@@ -0,0 +1,60 @@
+'''
+This module checks the CSV import and the
+progress reported by any worker.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pytest
+* requests
+'''
+
+# Import custom libs
+from src import models
+from src.crud import Tdatasource
+from src.plc_datasource import schemas as ds_schemas
+
+#######################################
+
+CSV_HEADER = 'TAG,PROCESS,DESCRIPTION,PLC NAME,PLC IP,PLC MODEL,ADDRESS,NUM_TYPE\n'
+
+# --------------------
+def _import(client, col_id:int, content:str):
+    ''' Send a CSV file to be imported.\n
+    '''
+    files = {'file': ('variables.csv', CSV_HEADER+content, 'text/csv')}
+    return( client.post(f'/import/csv?collector_id={col_id}', files=files) )
+# --------------------
+
+# --------------------
+def test_status_saved(client, db, datapoints):
+    ''' The progress is read from database, not from the worker memory.\n
+    '''
+    col_id = db.query(models.Collector.id).scalar()
+    response = _import(client, col_id, 'tag0,,test,plc1,10.0.0.9,S7-300,DB1.DBD0,REAL\n'
+        'tag1,,test,plc1,10.0.0.9,S7-300,DB1.DBD4,REAL\n')
+    assert response.status_code==200
+    id = response.json()['id']
+
+    status = client.get(f'/import/{id}').json()
+    assert (status['state'], status['rows'], status['datasources'], status['datapoints'])==('done', 2, 1, 2)
+    assert db.get(models.ImportJob, id).state=='done'
+
+    db.query(models.ImportJob).delete()
+    db.commit()
+    assert client.get(f'/import/{id}').status_code==404
+# --------------------
+
+# --------------------
+def test_errors_by_table(client, db, datapoints, monkeypatch):
+    ''' A datasource and a datapoint with the same name report their own error.\n
+    '''
+    def refuse(db, ds_list):
+        return( ds_schemas.bulkResult(created={}, errors={ ds.name:'Refused.' for ds in ds_list }) )
+    monkeypatch.setattr(Tdatasource, 'create_datasources', staticmethod(refuse))
+
+    col_id = db.query(models.Collector.id).scalar()
+    id = _import(client, col_id, 'plc1,,test,plc1,10.0.0.9,S7-300,DB1.DBD0,REAL\n').json()['id']
+
+    status = client.get(f'/import/{id}').json()
+    assert status['errors']==2
+    assert status['messages']==["DataSource plc1: Refused.", "DataPoint plc1: DataSource 'plc1' not found."]
+# --------------------
@@ -0,0 +1,45 @@
+'''
+This module checks the number of statements
+of the datapoint listings.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pytest
+'''
+
+# Import system libs
+import pytest
+
+# Import custom libs
+from src import database
+from .conftest import record_statements
+
+#######################################
+
+MAX_LISTING_STATEMENTS = 1
+'''`MAX_LISTING_STATEMENTS` (int): Statements allowed for a whole listing,
+whatever the number of datapoints.'''
+
+# --------------------
+@pytest.mark.parametrize('route, expected', [
+    ('/datapoints', lambda i: True),
+    ('/datapoints/active', lambda i: i%2==0),
+    ('/datapoints/pending', lambda i: i%3==0),
+])
+def test_listing_statements(client, datapoints, route, expected):
+    ''' The listings load the protocol columns and the datasource of all
+    datapoints with a fixed number of statements.\n
+    '''
+    with record_statements(database.engine, database.async_engine.sync_engine) as statements:
+        response = client.get(route)
+
+    assert response.status_code==200
+    assert len(statements)<=MAX_LISTING_STATEMENTS, [ sql for sql, params in statements ]
+
+    names = [ name for name in datapoints.keys() if expected(int(name.split('_')[-1])) ]
+    listed = { dp['name']:dp for dp in response.json() }
+    assert sorted(listed.keys())==sorted(names)
+    for name in names:
+        prot_name = name.split('_')[1]
+        assert listed[name]['datasource_name']==f'ds_{prot_name}'
+        assert listed[name]['access']=={'name': prot_name, 'data': datapoints[name]}
+# --------------------
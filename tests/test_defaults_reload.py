@@ -0,0 +1,74 @@
+'''
+This module checks the reload of the
+defaults file.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pytest
+'''
+
+# Import system libs
+import pytest
+import json
+
+# Import custom libs
+from src import defaults_cache
+from src.env import Enviroment as Env
+from src.defaults_cache import DEFAULTS_CACHE
+from src.defaults_store import DefaultsStore
+
+#######################################
+
+# --------------------
+@pytest.fixture
+def store(tmp_path):
+    ''' A copy of the defaults file to be changed.\n
+    return `store` (DefaultsStore): The watcher of the copy, not started.\n
+    '''
+    previous = Env.DEFAULTS
+    path = tmp_path/'defaults.json'
+    path.write_text(json.dumps(previous))
+
+    yield DefaultsStore(str(path), 0)
+    DEFAULTS_CACHE.build(previous)
+# --------------------
+
+# --------------------
+def _change_port(store, port:str):
+    ''' Write a new Modbus port in the defaults file.\n
+    '''
+    with open(store.path, 'r') as fid:
+        defaults = json.load(fid)
+    defaults['Protocol']['Modbus']['plc_port']['value'] = port
+    with open(store.path, 'w') as fid:
+        json.dump(defaults, fid)
+# --------------------
+
+# --------------------
+def test_publish_after_compile(store, monkeypatch):
+    ''' `Env.DEFAULTS` only changes after all responses are compiled, and
+    not at all if they fail.\n
+    '''
+    previous = Env.DEFAULTS
+    published = []
+    compile = defaults_cache._compile
+    def checked_compile(model):
+        published.append(Env.DEFAULTS is not previous)
+        return(compile(model))
+    monkeypatch.setattr(defaults_cache, '_compile', checked_compile)
+
+    _change_port(store, '1502')
+    assert store.reload()
+    assert published and not any(published)
+    assert Env.DEFAULTS['Protocol']['Modbus']['plc_port']['value']=='1502'
+    assert json.loads(DEFAULTS_CACHE.get('datasource/Modbus').body)['plc_port']==1502
+
+    def broken_compile(model):
+        raise ValueError('Invalid placeholder')
+    monkeypatch.setattr(defaults_cache, '_compile', broken_compile)
+    current = Env.DEFAULTS
+    entry = DEFAULTS_CACHE.get('datasource/Modbus')
+    _change_port(store, '2502')
+    assert not store.reload()
+    assert Env.DEFAULTS is current
+    assert DEFAULTS_CACHE.get('datasource/Modbus') is entry
+# --------------------
@@ -0,0 +1,179 @@
+'''
+This module checks the migration of a database
+created by the first release and the indexes
+used by the frequent queries.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pytest
+'''
+
+# Import system libs
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import Session
+import pytest
+
+# Import custom libs
+from src import database, migrations, models
+from src.crud import Tdatapoint, Tdatasource
+from .conftest import record_statements
+
+#######################################
+
+BASELINE_SCHEMA = [
+    '''CREATE TABLE collector (
+        id INTEGER NOT NULL, name VARCHAR NOT NULL, ip VARCHAR, ssh_port INTEGER,
+        ssh_user VARCHAR NOT NULL, ssh_pass VARCHAR NOT NULL, prj_path VARCHAR NOT NULL,
+        opcua_port INTEGER, health_port INTEGER, valid BOOLEAN, update_period INTEGER,
+        timeout INTEGER, PRIMARY KEY (id))''',
+    'CREATE INDEX ix_collector_id ON collector (id)',
+    '''CREATE TABLE users (
+        id INTEGER NOT NULL, name VARCHAR NOT NULL, password VARCHAR NOT NULL,
+        change_password BOOLEAN, is_admin BOOLEAN, PRIMARY KEY (id))''',
+    'CREATE INDEX ix_users_id ON users (id)',
+    'CREATE UNIQUE INDEX ix_users_name ON users (name)',
+    '''CREATE TABLE datasources (
+        name VARCHAR NOT NULL, plc_ip VARCHAR, plc_port INTEGER, cycletime INTEGER,
+        timeout INTEGER, active BOOLEAN, pending BOOLEAN, collector_id INTEGER,
+        PRIMARY KEY (name), FOREIGN KEY(collector_id) REFERENCES collector (id))''',
+    'CREATE INDEX ix_datasources_name ON datasources (name)',
+    '''CREATE TABLE datapoints (
+        name VARCHAR NOT NULL, description VARCHAR, num_type VARCHAR, access VARCHAR NOT NULL,
+        active BOOLEAN, pending BOOLEAN, datasource_name INTEGER, address VARCHAR,
+        tag_name VARCHAR, func_code INTEGER,
+        PRIMARY KEY (name), FOREIGN KEY(datasource_name) REFERENCES datasources (name))''',
+    'CREATE INDEX ix_datapoints_name ON datapoints (name)',
+    '''CREATE TABLE protocols (
+        id INTEGER NOT NULL, name VARCHAR NOT NULL, datasource_name INTEGER, rack INTEGER,
+        slot INTEGER, plc VARCHAR, path VARCHAR, connection VARCHAR, slave_id INTEGER,
+        PRIMARY KEY (id), FOREIGN KEY(datasource_name) REFERENCES datasources (name))''',
+    'CREATE INDEX ix_protocols_id ON protocols (id)',
+]
+'''`BASELINE_SCHEMA` (list): The tables as created by the first release, before
+`migrations` existed.'''
+
+BASELINE_ROWS = [
+    '''INSERT INTO collector VALUES (1, 'col', '127.0.0.1', 22, 'user', 'pass', '/tmp',
+        4840, 30000, 0, 1000, 1000)''',
+    "INSERT INTO datasources VALUES ('ds_Siemens', '10.0.0.1', 102, 1000, 1000, 1, 1, 1)",
+    "INSERT INTO datasources VALUES ('ds_Modbus', '10.0.0.2', 502, 1000, 1000, 1, 0, 1)",
+    "INSERT INTO protocols VALUES (1, 'Siemens', 'ds_Siemens', 0, 1, 'S7-300', NULL, NULL, NULL)",
+    "INSERT INTO protocols VALUES (2, 'Modbus', 'ds_Modbus', NULL, NULL, NULL, NULL, NULL, 1)",
+    # Left behind by the deletes of the first release
+    "INSERT INTO protocols VALUES (3, 'Modbus', 'ds_deleted', NULL, NULL, NULL, NULL, NULL, 2)",
+    '''INSERT INTO datapoints VALUES ('dp_Siemens_0', 'test', 'REAL', 'Siemens', 1, 1,
+        'ds_Siemens', 'DB1.DBD0', NULL, NULL)''',
+    '''INSERT INTO datapoints VALUES ('dp_Siemens_1', 'test', 'REAL', 'Siemens', 0, 0,
+        'ds_Siemens', 'DB1.DBD4', NULL, NULL)''',
+    '''INSERT INTO datapoints VALUES ('dp_Modbus_0', 'test', 'INT', 'Modbus', 1, 0,
+        'ds_Modbus', '0', NULL, 3)''',
+    '''INSERT INTO datapoints VALUES ('dp_orphan', 'test', 'INT', 'Modbus', 1, 1,
+        'ds_deleted', '1', NULL, 3)''',
+]
+'''`BASELINE_ROWS` (list): Items of the first release, with the orphans it left.'''
+
+# --------------------
+@pytest.fixture
+def engine(tmp_path):
+    ''' A database created by the first release, upgraded like on the
+    application startup.\n
+    return `engine` (Engine): The engine of the upgraded database.\n
+    '''
+    url = f'sqlite:///{tmp_path}/baseline.db'
+    # The first release did not enforce the foreign keys
+    baseline = create_engine(url)
+    with baseline.begin() as conn:
+        for sql in BASELINE_SCHEMA+BASELINE_ROWS:
+            conn.exec_driver_sql(sql)
+    baseline.dispose()
+
+    engine = create_engine(url)
+    event.listen(engine, 'connect', database._sqlite_foreign_keys)
+    migrations.upgrade(engine)
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+# --------------------
+
+# --------------------
+def _query_plans(engine, statements:list):
+    ''' Ask SQLite how it runs each statement.\n
+    `engine` (Engine): The database engine.\n
+    `statements` (list): The SQL and parameters recorded by `record_statements`.\n
+    return `plans` (list): The steps of the plan of each statement.\n
+    '''
+    plans = []
+    with engine.connect() as conn:
+        for sql, params in statements:
+            rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN '+sql, params).fetchall()
+            plans.append([ row[-1] for row in rows ])
+
+    return(plans)
+# --------------------
+
+# --------------------
+@pytest.mark.parametrize('query, index', [
+    (lambda db: Tdatapoint.get_datapoints_from_datasource(db, 'ds_Siemens'), 'ix_datapoints_datasource'),
+    (lambda db: Tdatasource.get_datasources_from_collector(db, 1), 'ix_datasources_collector'),
+    (lambda db: Tdatapoint.get_datapoints_active(db), 'ix_datapoints_active'),
+    (lambda db: Tdatapoint.get_datapoints_pending(db), 'ix_datapoints_pending'),
+    (lambda db: Tdatasource.get_datasources_active(db), 'ix_datasources_active'),
+    (lambda db: Tdatasource.get_datasources_pending(db), 'ix_datasources_pending'),
+])
+def test_listing_uses_index(engine, query, index):
+    ''' The frequent queries search the migrated tables by index.\n
+    '''
+    with Session(engine) as db, record_statements(engine) as statements:
+        assert len(query(db))>0
+
+    plans = _query_plans(engine, statements)
+    steps = sum(plans, [])
+    assert f'USING INDEX {index}' in ' '.join(steps), plans
+    assert not [ step for step in steps if step.startswith('SCAN') ], plans
+# --------------------
+
+# --------------------
+def test_protocol_uses_index(engine):
+    ''' The protocol of a datasource is searched by index.\n
+    '''
+    with Session(engine) as db:
+        ds = db.query(models.DataSource).filter(models.DataSource.name=='ds_Siemens').one()
+        with record_statements(engine) as statements:
+            prot = Tdatasource._find_datasource_prototol(db, ds)
+    assert prot.plc=='S7-300'
+
+    plans = _query_plans(engine, statements)
+    steps = sum(plans, [])
+    assert 'USING INDEX ix_protocols_datasource' in ' '.join(steps), plans
+    assert not [ step for step in steps if step.startswith('SCAN') ], plans
+# --------------------
+
+# --------------------
+def test_upgrade_keeps_rows(engine):
+    ''' The new datasource keys keep the items, drop the orphans and delete
+    the children with their datasource.\n
+    '''
+    insp = inspect(engine)
+    for table in ['datapoints', 'protocols']:
+        cols = { col['name']:col for col in insp.get_columns(table) }
+        assert str(cols['datasource_name']['type'])=='VARCHAR'
+        assert [ fk['options'].get('ondelete') for fk in insp.get_foreign_keys(table) ]==['CASCADE']
+    indexes = [ idx['name'] for idx in insp.get_indexes('datapoints') ]
+    assert sorted(indexes)==sorted([ idx.name for idx in models.DataPoint.__table__.indexes ])
+
+    with Session(engine) as db:
+        dps = { dp.name:dp for dp in Tdatapoint.get_datapoints(db) }
+        assert sorted(dps.keys())==['dp_Modbus_0', 'dp_Siemens_0', 'dp_Siemens_1']
+        assert dps['dp_Siemens_1'].access.data=={'address': 'DB1.DBD4'}
+        assert (dps['dp_Siemens_1'].active, dps['dp_Siemens_1'].pending)==(False, False)
+        assert dps['dp_Modbus_0'].access.data=={'address': '0', 'func_code': 3}
+        assert [ prot.id for prot in db.query(models.Protocol).order_by(models.Protocol.id) ]==[1, 2]
+
+        db.delete(db.get(models.DataSource, 'ds_Modbus'))
+        db.commit()
+        assert db.query(models.DataPoint).filter(models.DataPoint.datasource_name=='ds_Modbus').count()==0
+        assert db.query(models.Protocol).count()==1
+
+    with engine.connect() as conn:
+        version = conn.execute(migrations.version_table.select()).scalar()
+    assert version==migrations.LAST_VERSION
+# --------------------
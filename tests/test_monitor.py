@@ -0,0 +1,93 @@
+'''
+This module checks the status changes sent
+to the subscribers of the health monitor.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pytest
+'''
+
+# Import system libs
+import asyncio
+
+# Import custom libs
+from src.collector import monitor
+from src.collector import schemas as col_schemas
+
+#######################################
+
+# --------------------
+def _collector(id:int):
+    ''' A collector to test.\n
+    '''
+    return( col_schemas.collector(id=id, name=f'col{id}', ip='127.0.0.1', ssh_port=22,
+        ssh_user='user', prj_path='/tmp', opcua_port=4840, health_port=30000,
+        update_period=30, timeout=2, valid=False) )
+# --------------------
+
+# --------------------
+def test_slow_subscriber(monkeypatch):
+    ''' A subscriber that does not read keeps a bounded queue with the
+    newest status of the collectors.\n
+    '''
+    rounds = []
+    async def probe_collectors(col_list):
+        up = len(rounds)%2==0
+        rounds.append(up)
+        return([ {'ssh':up, 'opcua':False, 'health':False} for col in col_list ])
+    monkeypatch.setattr(monitor, 'probe_collectors', probe_collectors)
+
+    async def run():
+        health = monitor.HealthMonitor(interval=0, queue_size=3)
+        queue = health.subscribe()
+        for i in range(9):
+            await health.refresh([ _collector(id) for id in range(5) ])
+            assert queue.qsize()<=3
+        return([ queue.get_nowait() for i in range(queue.qsize()) ])
+
+    changes = asyncio.run(run())
+    # The last round of the collectors checked last
+    assert [ change.id for change in changes ]==[2, 3, 4]
+    assert all([ change.status.ssh==rounds[-1] for change in changes ])
+
+    async def coalesce():
+        health = monitor.HealthMonitor(interval=0, queue_size=3)
+        queue = health.subscribe()
+        for i in range(4):
+            await health.refresh([ _collector(1) ])
+        return([ queue.get_nowait() for i in range(queue.qsize()) ])
+
+    # When full the older changes of a collector are dropped
+    rounds.clear()
+    changes = asyncio.run(coalesce())
+    assert [ (change.id, change.status.ssh) for change in changes ]==[(1, False)]
+# --------------------
+
+# --------------------
+def test_forget_during_test(monkeypatch):
+    ''' A collector changed or removed while it is tested does not get the
+    old health back.\n
+    '''
+    health = monitor.HealthMonitor(interval=0, queue_size=3)
+    async def probe_collectors(col_list):
+        # The collector is updated while its ports are tested
+        health.forget(1)
+        return([ {'ssh':True, 'opcua':False, 'health':False} for col in col_list ])
+    monkeypatch.setattr(monitor, 'probe_collectors', probe_collectors)
+
+    async def run():
+        queue = health.subscribe()
+        entries = await health.refresh([ _collector(1) ])
+        return(entries, queue.qsize())
+
+    entries, published = asyncio.run(run())
+    assert entries[0].status['ssh']==True
+    assert health.get(1) is None
+    assert published==0
+
+    # The background loop reads the collectors before testing them
+    since = health.generations()
+    health.forget(2)
+    asyncio.run(health.refresh([ _collector(2), _collector(3) ], since))
+    assert health.get(2) is None
+    assert health.get(3) is not None
+# --------------------
@@ -0,0 +1,44 @@
+'''
+This module checks the processes that hash
+and verify the passwords.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pytest
+* requests
+'''
+
+# Import system libs
+import signal
+import time
+import os
+
+# Import custom libs
+from src.user_auth.password_pool import PASSWORD_POOL
+
+#######################################
+
+# --------------------
+def _login(client):
+    ''' Log in with the default user.\n
+    '''
+    return( client.post('/login', data={'username':'admin', 'password':'admin'}) )
+# --------------------
+
+# --------------------
+def test_login_after_worker_killed(client):
+    ''' A killed worker does not break the next logins.\n
+    '''
+    assert _login(client).status_code==200
+
+    broken = PASSWORD_POOL._pool
+    os.kill(next(iter(broken._processes)), signal.SIGKILL)
+    # Wait for the executor to notice
+    deadline = time.monotonic()+10
+    while (not broken._broken and time.monotonic()<deadline):
+        time.sleep(0.05)
+    assert broken._broken
+
+    assert _login(client).status_code==200
+    assert PASSWORD_POOL._pool is not broken
+    assert _login(client).status_code==200
+# --------------------
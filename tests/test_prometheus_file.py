@@ -0,0 +1,81 @@
+'''
+This module checks the changes of the Prometheus
+file shared by the collectors.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pytest
+* pyyaml
+'''
+
+# Import system libs
+from concurrent.futures import ThreadPoolExecutor
+import time
+import yaml
+import os
+
+# Import custom libs
+from src import models
+from src.env import Enviroment as Env
+from src.fboot_gen import routes as fb_routes
+
+#######################################
+
+# --------------------
+def _jobs():
+    ''' Get the job names of the Prometheus file.\n
+    '''
+    with open(Env.PROMETHEUS_FILEURL, 'r') as fid:
+        prometheus_conf = yaml.safe_load(fid)
+
+    return(sorted([ conf['job_name'] for conf in prometheus_conf['scrape_configs'] ]))
+# --------------------
+
+# --------------------
+def test_parallel_changes(monkeypatch):
+    ''' Changes of several collectors at the same time keep all the jobs.\n
+    '''
+    write = fb_routes._write_prometheus_file
+    def slow_write(db_col, prometheus_conf):
+        # Gives the other threads time to read a stale file
+        time.sleep(0.02)
+        write(db_col, prometheus_conf)
+    monkeypatch.setattr(fb_routes, '_write_prometheus_file', slow_write)
+
+    cols = [ models.Collector(name=f'prom{i}', ip='127.0.0.1', opcua_port=4840,
+        health_port=30000, update_period=30) for i in range(8) ]
+    before = set(_jobs()) if os.path.exists(Env.PROMETHEUS_FILEURL) else set()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(fb_routes._sync_prometheus_file, cols))
+    assert set(_jobs())==before|set([ col.name for col in cols ])
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda col: fb_routes._sync_prometheus_file(col, remove=True), cols[:4]))
+    assert set(_jobs())==before|set([ col.name for col in cols[4:] ])
+# --------------------
+
+# --------------------
+def test_routes_hold_lock(monkeypatch, client, db):
+    ''' The collector routes write the Prometheus file only while holding
+    the lock of the exports.\n
+    '''
+    written = []
+    write = fb_routes._write_prometheus_file
+    def checked_write(db_col, prometheus_conf):
+        written.append(fb_routes._prometheus_lock.locked())
+        write(db_col, prometheus_conf)
+    monkeypatch.setattr(fb_routes, '_write_prometheus_file', checked_write)
+
+    info = dict(name='locked', ip='127.0.0.1', ssh_port=22, ssh_user='user', ssh_pass='pass',
+        prj_path='/tmp', opcua_port=4840, health_port=30000, update_period=30, timeout=2)
+    col = client.post('/collector', json=info).json()
+    assert 'locked' in _jobs()
+
+    info.update(name='relocked')
+    assert client.put(f'/collector/{col["id"]}', json=info).status_code==200
+    assert 'relocked' in _jobs() and 'locked' not in _jobs()
+
+    assert client.delete(f'/collector/{col["id"]}').status_code==200
+    assert 'relocked' not in _jobs()
+    assert written==[True, True, True]
+# --------------------
@@ -0,0 +1,124 @@
+'''
+This module checks when the pooled SSH
+sessions of the collectors are closed.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pytest
+'''
+
+# Import system libs
+import threading
+import pytest
+import time
+
+# Import custom libs
+from src import models, ssh_pool
+
+#######################################
+
+class _FakeSession:
+    ''' Stands for an `SSHSession` without opening a connection.\n
+    '''
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.last_used = time.monotonic()
+        self.closed = False
+
+    def is_healthy(self):
+        return(not self.closed)
+
+    def close(self):
+        self.closed = True
+
+# --------------------
+@pytest.fixture
+def pool(monkeypatch):
+    ''' The application pool connecting to fake sessions.\n
+    return `pool` (SSHPool): The `SSH_POOL`, empty.\n
+    '''
+    pool = ssh_pool.SSH_POOL
+    monkeypatch.setattr(pool, '_connect', lambda *args: _FakeSession())
+    yield pool
+    pool.close_all()
+# --------------------
+
+# --------------------
+def _borrow(pool, col):
+    ''' Open the pooled session of a collector.\n
+    '''
+    with ssh_pool.collector_session(col) as sess:
+        return(sess)
+# --------------------
+
+# --------------------
+def test_evict_and_close_all(pool):
+    ''' `evict` only closes the session of its collector, `close_all` the others.\n
+    '''
+    first = _borrow(pool, models.Collector(ip='10.0.0.1', ssh_port=22, ssh_user='user', ssh_pass='a'))
+    second = _borrow(pool, models.Collector(ip='10.0.0.2', ssh_port=22, ssh_user='user', ssh_pass='a'))
+
+    pool.evict('10.0.0.1', 22, 'user', 'a')
+    assert first.closed and not second.closed
+
+    pool.close_all()
+    assert second.closed
+    assert pool._sessions=={}
+# --------------------
+
+# --------------------
+def test_collector_routes_evict(pool, client, datapoints, db):
+    ''' Changing the access of a collector or deleting it closes its session.\n
+    '''
+    col = db.query(models.Collector).one()
+    sess = _borrow(pool, col)
+
+    # Without SSH changes the session stays
+    info = client.get(f'/collector/{col.id}').json()
+    info.update(ssh_pass='', name='renamed')
+    assert client.put(f'/collector/{col.id}', json=info).status_code==200
+    assert not sess.closed
+
+    info.update(ssh_pass='other')
+    assert client.put(f'/collector/{col.id}', json=info).status_code==200
+    assert sess.closed
+
+    db.expire_all()
+    col = db.query(models.Collector).one()
+    sess = _borrow(pool, col)
+    assert client.delete(f'/collector/{col.id}').status_code==200
+    assert sess.closed
+    assert pool._sessions=={}
+# --------------------
+
+# --------------------
+def test_update_unknown_collector(pool, client, datapoints, db):
+    ''' Updating a collector that does not exist is refused before touching
+    the sessions.\n
+    '''
+    col = db.query(models.Collector).one()
+    sess = _borrow(pool, col)
+
+    info = client.get(f'/collector/{col.id}').json()
+    info.update(ssh_pass='other')
+    assert client.put(f'/collector/{col.id+1}', json=info).status_code==404
+    assert not sess.closed
+# --------------------
+
+# --------------------
+def test_check_opens_new_session(pool, client, monkeypatch, datapoints, db):
+    ''' The access check does not trust an already open session.\n
+    '''
+    col = db.query(models.Collector).one()
+    sess = _borrow(pool, col)
+
+    def refused(*args):
+        raise ConnectionError('Authentication failed.')
+    monkeypatch.setattr(pool, '_connect', refused)
+    response = client.get(f'/collector/{col.id}/check')
+    assert response.status_code==200
+    assert response.json()['valid']==False
+    assert sess.closed
+
+    monkeypatch.setattr(pool, '_connect', lambda *args: _FakeSession())
+    assert client.get(f'/collector/{col.id}/check').json()['valid']==True
+# --------------------
@@ -0,0 +1,78 @@
+'''
+This module checks the single writer used
+by the sync routes and background jobs.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pytest
+'''
+
+# Import system libs
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+import pytest
+
+# Import custom libs
+from src import database, models, write_queue
+from src.crud import Tcollector
+from src.collector import schemas as col_schemas
+
+#######################################
+
+# --------------------
+def _new_collector(name:str):
+    ''' A collector to create.\n
+    '''
+    return( col_schemas.collectorCreate(name=name, ip='127.0.0.1', ssh_port=22, ssh_user='user',
+        ssh_pass='pass', prj_path='/tmp', opcua_port=4840, health_port=30000,
+        update_period=30, timeout=2) )
+# --------------------
+
+# --------------------
+@pytest.fixture
+def writer(tmp_path):
+    ''' A single writer over a database with the SQLite tuning profile.\n
+    return `writer` (WriteQueue): The writer of a new database.\n
+    '''
+    engine = create_engine(f'sqlite:///{tmp_path}/tuned.db', connect_args={"check_same_thread": False})
+    event.listen(engine, 'connect', database._tune_sqlite)
+    event.listen(engine, 'connect', database._sqlite_autocommit)
+    event.listen(engine, 'begin', database._sqlite_begin)
+    models.Base.metadata.create_all(bind=engine)
+
+    yield write_queue.WriteQueue(engine, batch_size=10, batch_wait=0.01)
+    engine.dispose()
+# --------------------
+
+# --------------------
+def test_sync_writes(writer):
+    ''' Writes waited from many threads are all committed, a failing one
+    only raises to its caller.\n
+    '''
+    names = [ f'col{i}' for i in range(40) ]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        created = list(pool.map(lambda name: writer.call(Tcollector.create, _new_collector(name)), names))
+        failed = pool.submit(writer.call, Tcollector.validate, 999)
+    assert sorted([ col.name for col in created ])==sorted(names)
+    with pytest.raises(AttributeError):
+        failed.result()
+
+    # The items left the writer with their values loaded
+    valid = writer.call(Tcollector.validate, created[0].id, valid=True)
+    assert (valid.id, valid.name, valid.valid)==(created[0].id, created[0].name, True)
+
+    with Session(writer.engine) as db:
+        assert sorted([ col.name for col in Tcollector.get_all(db) ])==sorted(names)
+        assert Tcollector.get_by_id(db, created[0].id).valid==True
+# --------------------
+
+# --------------------
+def test_run_write_without_writer(db):
+    ''' Without the tuning profile the writes run in the session of the caller.\n
+    '''
+    assert write_queue.WRITE_QUEUE is None
+
+    col = write_queue.run_write(db, Tcollector.create, _new_collector('local'))
+    assert col in db
+    assert Tcollector.get_by_id(db, col.id).name=='local'
+# --------------------
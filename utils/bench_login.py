@@ -0,0 +1,117 @@
+'''
+This program measures the login throughput
+of the backend and how the other routes
+respond during a burst of logins.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* requests
+'''
+
+# Import system libs
+from concurrent.futures import ThreadPoolExecutor
+import statistics
+import requests
+import time
+
+# Import custom libs
+from bench_routes import login, _client
+
+#######################################
+
+# --------------------
+def _login_client(backend_url:str, username:str, password:str, deadline:float, latencies:list):
+    ''' Login one time after the other until the deadline.\n
+    `backend_url` (str): The backend address.\n
+    `username` (str): User to login.\n
+    `password` (str): Password of the user.\n
+    `deadline` (float): `time.monotonic` value to stop at.\n
+    `latencies` (list): Receives the duration of each successful login.\n
+    return `refused, errors` (int, int): Logins refused with 429 and other failures.\n
+    '''
+    refused = 0
+    errors = 0
+    with requests.Session() as session:
+        while (time.monotonic()<deadline):
+            start = time.monotonic()
+            response = session.post(backend_url+'/login', {'username':username, 'password':password})
+            if (response.status_code==200):
+                latencies.append(time.monotonic()-start)
+            elif (response.status_code==429):
+                refused += 1
+                time.sleep(float(response.headers.get('Retry-After', 1)))
+            else:
+                errors += 1
+    return(refused, errors)
+# --------------------
+
+# --------------------
+def _percentiles(latencies:list):
+    ''' Summarize a list of durations.\n
+    `latencies` (list): Durations in seconds.\n
+    return (tuple): The p50 and p95 in milliseconds, `None` if empty.\n
+    '''
+    if (not latencies):
+        return(None, None)
+    latencies.sort()
+    return(1000*statistics.median(latencies), 1000*latencies[int(0.95*(len(latencies)-1))])
+# --------------------
+
+# --------------------
+def bench(backend_url:str, clients:int, duration:float, route:str='/validate', route_clients:int=4):
+    ''' Measure logins of concurrent clients while other clients use a
+    light route.\n
+    `backend_url` (str): The backend address.\n
+    `clients` (int): Number of clients logging in at the same time.\n
+    `duration` (float): Seconds to run.\n
+    `route` (str): The light route used during the logins.\n
+    `route_clients` (int): Number of concurrent clients of `route`.\n
+    return `result` (dict): Logins per second, latencies, refusals and the
+    `route` latencies.\n
+    '''
+    headers = login(backend_url)
+    login_lat = []
+    route_lat = []
+
+    start = time.monotonic()
+    deadline = start+duration
+    with ThreadPoolExecutor(max_workers=clients+route_clients) as pool:
+        lfut = [ pool.submit(_login_client, backend_url, 'admin', 'admin', deadline, login_lat)
+            for i in range(clients) ]
+        rfut = [ pool.submit(_client, backend_url+route, headers, deadline, route_lat)
+            for i in range(route_clients) ]
+        lres = [ f.result() for f in lfut ]
+        rerr = sum([ f.result() for f in rfut ])
+    # The logins started before the deadline end after it
+    elapsed = time.monotonic()-start
+
+    login_p50, login_p95 = _percentiles(login_lat)
+    route_p50, route_p95 = _percentiles(route_lat)
+    result = {
+        'clients': clients,
+        'logins/s': len(login_lat)/elapsed,
+        'login p50 (ms)': login_p50,
+        'login p95 (ms)': login_p95,
+        'refused': sum([ r[0] for r in lres ]),
+        'errors': sum([ r[1] for r in lres ])+rerr,
+        f'{route} requests/s': len(route_lat)/elapsed,
+        f'{route} p95 (ms)': route_p95,
+    }
+    return(result)
+# --------------------
+
+
+# Execute
+if __name__=='__main__':
+
+    # ----------------------------------------
+    # Set server path
+    backend_url = 'http://localhost:8000'
+    # Set the number of operators logging in at once
+    clients = [1, 8, 40]
+    duration = 10
+    # ----------------------------------------
+
+    # NOTE: Compare different `CONF_PASSWORD_WORKERS` and
+    #       `CONF_PASSWORD_QUEUE` values on the same machine.
+    for n in clients:
+        print(bench(backend_url, n, duration))
@@ -0,0 +1,136 @@
+'''
+This program measures the throughput of the
+backend under concurrent requests.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* requests
+'''
+
+# Import system libs
+from concurrent.futures import ThreadPoolExecutor
+import statistics
+import threading
+import requests
+import time
+
+#######################################
+
+# --------------------
+def login(backend_url:str):
+    ''' Get the authorization headers of the default user.\n
+    `backend_url` (str): The backend address.\n
+    return `headers` (dict): Request headers with the authorization.\n
+    '''
+    response = requests.post(backend_url+'/login',{'username':'admin','password':'admin'})
+    if (response.status_code!=200):
+        raise RuntimeError(f'Could not Login.')
+    validation = response.json()
+
+    headers = {
+        "Authorization": validation['token_type']+' '+validation['access_token'],
+    }
+    return(headers)
+# --------------------
+
+# --------------------
+def _client(url:str, headers:dict, deadline:float, latencies:list):
+    ''' Send requests one after the other until the deadline.\n
+    `url` (str): The route address.\n
+    `headers` (dict): Request headers with the authorization.\n
+    `deadline` (float): `time.monotonic` value to stop at.\n
+    `latencies` (list): Receives the duration of each successful request.\n
+    return `errors` (int): Number of failed requests.\n
+    '''
+    errors = 0
+    with requests.Session() as session:
+        while (time.monotonic()<deadline):
+            start = time.monotonic()
+            response = session.get(url, headers=headers)
+            if (response.status_code==200):
+                latencies.append(time.monotonic()-start)
+            else:
+                errors += 1
+    return(errors)
+# --------------------
+
+# --------------------
+def _background_load(url:str, headers:dict, stop:threading.Event):
+    ''' Keep a slow route busy, like exports or access checks of
+    unreachable collectors do in production.\n
+    `url` (str): The slow route address.\n
+    `headers` (dict): Request headers with the authorization.\n
+    `stop` (threading.Event): Set it to stop the load.\n
+    '''
+    with requests.Session() as session:
+        while (not stop.is_set()):
+            session.get(url, headers=headers)
+# --------------------
+
+# --------------------
+def bench(backend_url:str, route:str, clients:int, duration:float, slow_route:str=None, slow_clients:int=0):
+    ''' Measure the throughput of a route with concurrent clients.\n
+    `backend_url` (str): The backend address.\n
+    `route` (str): The route to measure.\n
+    `clients` (int): Number of concurrent clients.\n
+    `duration` (float): Seconds to run.\n
+    `slow_route` (str): A slow route loaded at the same time. Optional.\n
+    `slow_clients` (int): Number of concurrent clients of `slow_route`.\n
+    return `result` (dict): Requests per second, latency percentiles and errors.\n
+    '''
+    headers = login(backend_url)
+    latencies = []
+
+    stop = threading.Event()
+    slow = []
+    if (slow_route is not None):
+        for i in range(slow_clients):
+            slow.append(threading.Thread(target=_background_load,
+                args=(backend_url+slow_route, headers, stop), daemon=True))
+            slow[-1].start()
+
+    deadline = time.monotonic()+duration
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        futures = [ pool.submit(_client, backend_url+route, headers, deadline, latencies)
+            for i in range(clients) ]
+        errors = sum([ f.result() for f in futures ])
+
+    stop.set()
+
+    latencies.sort()
+    result = {
+        'route': route,
+        'clients': clients,
+        'requests/s': len(latencies)/duration,
+        'p50 (ms)': 1000*statistics.median(latencies) if latencies else None,
+        'p95 (ms)': 1000*latencies[int(0.95*(len(latencies)-1))] if latencies else None,
+        'errors': errors,
+    }
+    return(result)
+# --------------------
+
+
+# Execute
+if __name__=='__main__':
+
+    # ----------------------------------------
+    # Set server path
+    backend_url = 'http://localhost:8000'
+    # Set the routes to measure
+    routes = ['/collectors', '/datapoints/page?size=100', '/datasources']
+    # Set the concurrency levels and seconds for each measurement
+    clients = [1, 16, 64]
+    duration = 10
+    # Set a slow route to load at the same time, `None` to disable.
+    # With an unreachable collector the access check holds a worker
+    # for the whole SSH timeout.
+    slow_route = '/collector/1/check'
+    slow_clients = 40
+    # ----------------------------------------
+
+    # NOTE: Run it against the backend before and after a change, with
+    #       the same database and `uvicorn` options, and compare.
+    for route in routes:
+        for n in clients:
+            print(bench(backend_url, route, n, duration))
+            if (slow_route is not None):
+                print(bench(backend_url, route, n, duration, slow_route, slow_clients), '(with slow load)')
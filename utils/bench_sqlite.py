@@ -0,0 +1,122 @@
+'''
+This program measures the read and write
+throughput of the backend database under
+concurrent requests.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* requests
+'''
+
+# Import system libs
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import time
+import uuid
+
+# Import custom libs
+from bench_routes import login
+
+#######################################
+
+# --------------------
+def _writer(backend_url:str, headers:dict, ds_name:str, deadline:float):
+    ''' Create and delete datapoints until the deadline.\n
+    `backend_url` (str): The backend address.\n
+    `headers` (dict): Request headers with the authorization.\n
+    `ds_name` (str): The DataSource of the new datapoints.\n
+    `deadline` (float): `time.monotonic` value to stop at.\n
+    return `done, errors` (int, int): Successful and failed writes.\n
+    '''
+    done = 0
+    errors = 0
+    prefix = uuid.uuid4().hex[:8]
+    with requests.Session() as session:
+        i = 0
+        while (time.monotonic()<deadline):
+            dp = {
+                'name': f'bench_{prefix}_{i}',
+                'description': 'benchmark',
+                'num_type': 'REAL',
+                'datasource_name': ds_name,
+                'access': {'name':'Siemens', 'data':{'address':'DB1.DBD0'}},
+            }
+            response = session.post(backend_url+'/datapoint', json=dp, headers=headers)
+            if (response.status_code==200):
+                done += 1
+                response = session.delete(backend_url+f'/datapoint/{dp["name"]}', headers=headers)
+            if (response.status_code==200):
+                done += 1
+            else:
+                errors += 1
+            i += 1
+    return(done, errors)
+# --------------------
+
+# --------------------
+def _reader(backend_url:str, headers:dict, deadline:float):
+    ''' Read pages of datapoints until the deadline.\n
+    `backend_url` (str): The backend address.\n
+    `headers` (dict): Request headers with the authorization.\n
+    `deadline` (float): `time.monotonic` value to stop at.\n
+    return `done, errors` (int, int): Successful and failed reads.\n
+    '''
+    done = 0
+    errors = 0
+    with requests.Session() as session:
+        while (time.monotonic()<deadline):
+            response = session.get(backend_url+'/datapoints/page?size=100', headers=headers)
+            if (response.status_code==200):
+                done += 1
+            else:
+                errors += 1
+    return(done, errors)
+# --------------------
+
+# --------------------
+def bench(backend_url:str, ds_name:str, writers:int, readers:int, duration:float):
+    ''' Measure reads and writes running at the same time.\n
+    `backend_url` (str): The backend address.\n
+    `ds_name` (str): An existing Siemens DataSource for the test datapoints.\n
+    `writers` (int): Number of concurrent writing clients.\n
+    `readers` (int): Number of concurrent reading clients.\n
+    `duration` (float): Seconds to run.\n
+    return `result` (dict): Operations per second and errors.\n
+    '''
+    headers = login(backend_url)
+    deadline = time.monotonic()+duration
+
+    with ThreadPoolExecutor(max_workers=writers+readers) as pool:
+        wfut = [ pool.submit(_writer, backend_url, headers, ds_name, deadline) for i in range(writers) ]
+        rfut = [ pool.submit(_reader, backend_url, headers, deadline) for i in range(readers) ]
+        wres = [ f.result() for f in wfut ]
+        rres = [ f.result() for f in rfut ]
+
+    result = {
+        'writers': writers,
+        'readers': readers,
+        'writes/s': sum([ r[0] for r in wres ])/duration,
+        'write errors': sum([ r[1] for r in wres ]),
+        'reads/s': sum([ r[0] for r in rres ])/duration,
+        'read errors': sum([ r[1] for r in rres ]),
+    }
+    return(result)
+# --------------------
+
+
+# Execute
+if __name__=='__main__':
+
+    # ----------------------------------------
+    # Set server path
+    backend_url = 'http://localhost:8000'
+    # Set an existing Siemens DataSource
+    ds_name = 'PLC1'
+    # Set the concurrency levels and seconds for each measurement
+    levels = [(1, 8), (8, 8), (32, 32)]
+    duration = 10
+    # ----------------------------------------
+
+    # NOTE: Compare the backend started with `CONF_SQLITE_TUNING=false`
+    #       and `CONF_SQLITE_TUNING=true` on the same database file.
+    for writers, readers in levels:
+        print(bench(backend_url, ds_name, writers, readers, duration))
@@ -15,10 +15,31 @@ import requests
 #######################################
 
 # --------------------
-def db_set(data:dict, backend_url:str):
+def _post_bulk(url:str, items:list, headers:dict, batch:int):
+    ''' Send a list of items to a bulk route in batches.\n
+    `url` (str): The bulk route address.\n
+    `items` (list): Items to create.\n
+    `headers` (dict): Request headers with the authorization.\n
+    `batch` (int): Maximum number of items per request.\n
+    return `errors` (dict): The error message of each rejected item.\n
+    '''
+    errors = {}
+    for i in range(0, len(items), batch):
+        response = requests.post(url,json=items[i:i+batch],headers=headers)
+        if (response.status_code!=200):
+            print(response.json())
+            raise RuntimeError(f'Could not send batch to "{url}".')
+        errors.update(response.json()['errors'])
+
+    return(errors)
+# --------------------
+
+# --------------------
+def db_set(data:dict, backend_url:str, batch:int=5000):
     ''' Add the CSV content to the backend DB.\n
     `data` (dict): PLC Data informations.\n
     `backend_url` (str): The backend address.\n
+    `batch` (int): Maximum number of items per request.\n
     '''
     
     # Authenticate
@@ -30,22 +51,23 @@ def db_set(data:dict, backend_url:str):
     headers = {
         "Authorization": validation['token_type']+' '+validation['access_token'],
     }
-    # Get DataSources
+    # Separate DataSources from their DataPoints
+    dslist = []
+    dplist = []
     for ds in data['DataSources']:
-        # A POST request to the API
-        dplist = ds.pop('DataPoints', [])
+        dplist += ds.pop('DataPoints', [])
+        dslist.append(ds)
 
-        response = requests.post(backend_url+'/datasource',json=ds,headers=headers)
-        if (response.status_code!=200):
-            print(response.json())
-            raise RuntimeError(f'Could not create DataSource "{ds["name"]}".')
+    # Create all DataSources before their DataPoints
+    errors = _post_bulk(backend_url+'/datasources/bulk', dslist, headers, batch)
+    if (len(errors)>0):
+        print(errors)
+        raise RuntimeError(f'Could not create {len(errors)} DataSources.')
 
-        # Get all DataPoints in this DataSource
-        for dp in dplist:
-            # A POST request to the API
-            response = requests.post(backend_url+'/datapoint',json=dp,headers=headers)
-            if (response.status_code!=200):
-                raise RuntimeError(f'Could not create DataPoint"{dp["name"]}".')
+    errors = _post_bulk(backend_url+'/datapoints/bulk', dplist, headers, batch)
+    if (len(errors)>0):
+        print(errors)
+        raise RuntimeError(f'Could not create {len(errors)} DataPoints.')
                 
     return()
 # --------------------
@@ -73,14 +95,16 @@ def translate_datapoint(sr:pd.Series):
 # --------------------
 
 # --------------------
-def translate_datasource(df:pd.DataFrame):
+def translate_datasource(df:pd.DataFrame, collector_id:int):
     ''' Get a datasource group and parse it into
     a dictinary for pyfboot\n
     `df` (pandas.DataFrame): \n
+    `collector_id` (int): The Collector ID to associate the datasource to.\n
     return `ds` (dict): Datasource informations.\n
     '''
     ds={
         'name':df['PLC NAME'].unique()[0],
+        'collector_id': collector_id,
         'plc_ip': df['PLC IP'].unique()[0],
         'plc_port': 102,
         'protocol': {
@@ -113,6 +137,8 @@ if __name__=='__main__':
     table_path = './parsed_variables.csv'
     # Set server path
     backend_url = 'http://localhost:8000'
+    # Set the Collector ID that will read the PLCs
+    collector_id = 1
     # ----------------------------------------
 
     # Load inputs
@@ -124,7 +150,7 @@ if __name__=='__main__':
     plc_data ={'DataSources':[]}     
     for plc in gplc.groups:
         plc_data['DataSources'].append(
-            translate_datasource( gplc.get_group(plc) )
+            translate_datasource( gplc.get_group(plc), collector_id )
         )
     
     # Write the data into the DB